@@ -0,0 +1,122 @@
+from datetime import datetime
+from sqlalchemy import func, select
+from models import db, Agent, ChangeLog
+from change_feed import AGENT_ENTITY
+
+# Fields a client can request with fields=..., mapped to their columns
+AGENT_FIELDS = {
+    'id': Agent.id,
+    'name': Agent.name,
+    'division': Agent.division,
+    'manager': Agent.manager,
+    'queue_type': Agent.queue_type,
+    'is_active': Agent.is_active,
+    'created_at': Agent.created_at,
+    'last_updated': Agent.last_updated
+}
+
+# Largest page a client can ask for with limit=...
+MAX_PAGE_SIZE = 1000
+
+
+class AgentListingError(ValueError):
+    """Raised for invalid fields, limit, cursor or updated_since parameters"""
+
+
+def parse_listing_args(args, default_fields):
+    """
+    Read the pagination, projection and change-filter parameters of an agent listing
+
+    Args:
+        args (MultiDict): Request query parameters
+        default_fields (list): Fields returned when fields= is not given
+
+    Returns:
+        dict: fields, limit (None for no paging), cursor and updated_since
+
+    Raises:
+        AgentListingError: If a parameter is invalid
+    """
+    fields = default_fields
+    if args.get('fields'):
+        fields = [field.strip() for field in args['fields'].split(',') if field.strip()]
+        unknown = [field for field in fields if field not in AGENT_FIELDS]
+        if unknown:
+            raise AgentListingError(f'Unknown fields: {", ".join(unknown)}')
+
+    try:
+        limit = int(args['limit']) if args.get('limit') else None
+        cursor = int(args['cursor']) if args.get('cursor') else None
+    except ValueError:
+        raise AgentListingError('limit and cursor must be integers')
+    if limit is not None and not 1 <= limit <= MAX_PAGE_SIZE:
+        raise AgentListingError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+
+    updated_since = None
+    if args.get('updated_since'):
+        try:
+            updated_since = datetime.fromisoformat(args['updated_since'])
+        except ValueError:
+            raise AgentListingError('updated_since must be an ISO 8601 timestamp')
+
+    return {'fields': fields, 'limit': limit, 'cursor': cursor, 'updated_since': updated_since}
+
+
+def last_modified():
+    """
+    When any agent was last added, changed or deleted (one query)
+
+    Covers every agent, not just the ones a listing matches: an agent that
+    leaves a filtered listing (deactivated, moved to another division or
+    manager, or deleted by a reset) changes none of the agents left in it.
+    """
+    updated, deleted = db.session.query(
+        select(func.max(Agent.last_updated)).scalar_subquery(),
+        select(func.max(ChangeLog.created_at)).where(ChangeLog.entity == AGENT_ENTITY).scalar_subquery()
+    ).one()
+    return max((value for value in (updated, deleted) if value is not None), default=None)
+
+
+def agent_page(query, fields, limit=None, cursor=None, updated_since=None):
+    """
+    One page of agents, loading only the requested columns
+
+    Pages are keyed on id: each page starts after the cursor (the last id of
+    the previous page), so later pages cost the same as the first.
+
+    Args:
+        query (Query): Agent query with the endpoint's filters applied
+        fields (list): Fields to return (see AGENT_FIELDS)
+        limit (int, optional): Page size; all matching agents when None
+        cursor (int, optional): Return agents with an id greater than this
+        updated_since (datetime, optional): Only agents changed after this time
+
+    Returns:
+        tuple: (list of dicts, next cursor or None when this is the last page)
+    """
+    columns = [AGENT_FIELDS[field] for field in fields]
+    if 'id' not in fields:
+        columns.append(Agent.id)
+
+    if cursor is not None:
+        query = query.filter(Agent.id > cursor)
+    if updated_since is not None:
+        query = query.filter(Agent.last_updated > updated_since)
+    query = query.with_entities(*columns).order_by(Agent.id)
+    if limit is not None:
+        query = query.limit(limit + 1)
+
+    rows = query.all()
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1].id
+
+    agents = []
+    for row in rows:
+        agent = {field: getattr(row, field) for field in fields}
+        for field in ('created_at', 'last_updated'):
+            if field in agent and agent[field] is not None:
+                agent[field] = agent[field].isoformat()
+        agents.append(agent)
+    return agents, next_cursor
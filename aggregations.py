@@ -0,0 +1,125 @@
+from itertools import groupby
+from sqlalchemy import func
+from models import db, DailyPerformance, AgentDailyRollup
+from metrics import compute_metrics
+
+
+def ppl_expression(source=DailyPerformance):
+    """SQL expression for Placed Premium per Lead, matching DailyPerformance.calculate_ppl()"""
+    return (source.close_rate / 100.0) * (source.place_rate / 100.0) * source.avg_premium
+
+
+def summarize_performance(agent_ids, start_date, end_date):
+    """
+    Aggregate daily performance for a set of agents with grouped SQL queries
+
+    Reads the per-agent daily rollup (see rollups.py): per-agent averages and
+    totals come from a GROUP BY agent_id query and the daily trend from a
+    GROUP BY date query, so the cost scales with groups rather than raw rows.
+
+    Args:
+        agent_ids (list): IDs of the agents to include
+        start_date (date): First day of the range (inclusive)
+        end_date (date): Last day of the range (inclusive)
+
+    Returns:
+        dict: {
+            'agents': {agent_id: {row_count, close_rate, place_rate, avg_premium,
+                                  ppl, leads_taken, total_premium}},
+            'row_count', 'ppl_sum', 'above_target', 'at_break_even', 'below_break_even',
+            'trend': [(date, avg_ppl), ...] ordered by date
+        }
+    """
+    rollup = AgentDailyRollup
+    filters = (
+        rollup.agent_id.in_(agent_ids),
+        rollup.date >= start_date,
+        rollup.date <= end_date
+    )
+
+    agent_rows = db.session.query(
+        rollup.agent_id,
+        func.sum(rollup.row_count).label('row_count'),
+        func.sum(rollup.close_rate_sum).label('close_rate_sum'),
+        func.sum(rollup.place_rate_sum).label('place_rate_sum'),
+        func.sum(rollup.avg_premium_sum).label('avg_premium_sum'),
+        func.sum(rollup.leads_sum).label('leads_sum'),
+        func.sum(rollup.ppl_sum).label('ppl_sum'),
+        func.sum(rollup.total_premium_sum).label('total_premium'),
+        func.sum(rollup.above_target).label('above_target'),
+        func.sum(rollup.at_break_even).label('at_break_even'),
+        func.sum(rollup.below_break_even).label('below_break_even')
+    ).filter(*filters).group_by(rollup.agent_id).all()
+
+    trend_rows = db.session.query(
+        rollup.date,
+        func.sum(rollup.ppl_sum).label('ppl_sum'),
+        func.sum(rollup.row_count).label('row_count')
+    ).filter(*filters).group_by(rollup.date).order_by(rollup.date).all()
+
+    summary = {
+        'agents': {},
+        'row_count': 0,
+        'ppl_sum': 0,
+        'above_target': 0,
+        'at_break_even': 0,
+        'below_break_even': 0,
+        'trend': [(row.date, row.ppl_sum / row.row_count) for row in trend_rows]
+    }
+
+    for row in agent_rows:
+        summary['agents'][row.agent_id] = {
+            'row_count': row.row_count,
+            'close_rate': row.close_rate_sum / row.row_count,
+            'place_rate': row.place_rate_sum / row.row_count,
+            'avg_premium': row.avg_premium_sum / row.row_count,
+            'ppl': row.ppl_sum / row.row_count,
+            'leads_taken': row.leads_sum / row.row_count,
+            'total_premium': row.total_premium
+        }
+        summary['row_count'] += row.row_count
+        summary['ppl_sum'] += row.ppl_sum
+        summary['above_target'] += row.above_target
+        summary['at_break_even'] += row.at_break_even
+        summary['below_break_even'] += row.below_break_even
+
+    return summary
+
+
+def agents_series(agent_ids, start_date, end_date):
+    """
+    Daily performance rows for several agents with a single query
+
+    Rows are read ordered by (agent_id, date), which the (agent_id, date)
+    index serves directly, and grouped by agent here.
+
+    Args:
+        agent_ids (list): IDs of the agents to include
+        start_date (date): First day of the range (inclusive)
+        end_date (date): Last day of the range (inclusive)
+
+    Returns:
+        dict: {agent_id: [(date, leads, close_rate, place_rate, avg_premium, ppl), ...]}
+              for the agents that have rows in the range
+    """
+    rows = db.session.query(
+        DailyPerformance.agent_id, DailyPerformance.date, DailyPerformance.leads_taken,
+        DailyPerformance.close_rate, DailyPerformance.place_rate, DailyPerformance.avg_premium
+    ).filter(
+        DailyPerformance.agent_id.in_(agent_ids),
+        DailyPerformance.date.between(start_date, end_date)
+    ).order_by(DailyPerformance.agent_id, DailyPerformance.date).all()
+
+    ppls = compute_metrics(
+        [row.close_rate for row in rows], [row.place_rate for row in rows],
+        [row.avg_premium for row in rows], [row.leads_taken for row in rows]
+    )['ppl'].tolist()
+
+    series = {}
+    rows_with_ppl = zip(rows, ppls)
+    for agent_id, group in groupby(rows_with_ppl, key=lambda item: item[0].agent_id):
+        series[agent_id] = [
+            (row.date, row.leads_taken, row.close_rate, row.place_rate, row.avg_premium, ppl)
+            for row, ppl in group
+        ]
+    return series
@@ -0,0 +1,166 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from sqlalchemy import delete, func
+from models import db, AIAnswerCache
+from sequences import current_values
+from response_cache import backend
+
+logger = logging.getLogger(__name__)
+
+# How long a stored answer may be reused, in seconds
+AI_CACHE_TTL = int(os.environ.get('AI_CACHE_TTL', 6 * 60 * 60))
+
+# Answers kept in each worker's in-process LRU
+AI_CACHE_SIZE = int(os.environ.get('AI_CACHE_SIZE', 256))
+
+# Rows kept in the ai_answer_cache table; the least recently used are dropped
+AI_CACHE_MAX_ROWS = int(os.environ.get('AI_CACHE_MAX_ROWS', 5000))
+
+_lock = threading.Lock()
+_local = OrderedDict()  # key -> (monotonic expiry, answer dict)
+
+
+def answer_key(query_info, data_results, versions=None):
+    """
+    Canonical cache key for an AI answer
+
+    Questions that parse to the same intent, run against the same query
+    results and data version on the same day, share a key however they were
+    worded.
+
+    Args:
+        query_info (dict): Result of intent_parser.parse_question()
+        data_results (list): Rows returned by the generated SQL
+        versions (dict, optional): current_values(), when the caller has already read them
+
+    Returns:
+        str: Hex SHA-256 digest
+    """
+    fingerprint = hashlib.sha256(json.dumps(data_results, sort_keys=True, default=str).encode()).hexdigest()
+    raw = json.dumps({
+        'intent': query_info,
+        'data': fingerprint,
+        'versions': versions if versions is not None else current_values(),
+        'day': date.today().isoformat()
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _remember(key, entry, ttl):
+    with _lock:
+        _local[key] = (time.monotonic() + ttl, entry)
+        _local.move_to_end(key)
+        while len(_local) > AI_CACHE_SIZE:
+            _local.popitem(last=False)
+
+
+def get_cached_answer(key):
+    """
+    Stored answer for a key, checking this worker's LRU and then the table
+
+    Returns:
+        dict: {'answer', 'chart_data', 'query_type'}, or None on a miss
+    """
+    with _lock:
+        cached = _local.get(key)
+        if cached and cached[0] > time.monotonic():
+            _local.move_to_end(key)
+            return cached[1]
+        if cached:
+            del _local[key]
+
+    try:
+        row = db.session.get(AIAnswerCache, key)
+        now = datetime.utcnow()
+        if row is None or row.expires_at <= now:
+            return None
+        row.hits += 1
+        row.last_used_at = now
+        entry = {
+            'answer': row.answer,
+            'chart_data': json.loads(row.chart_data) if row.chart_data else None,
+            'query_type': row.query_type
+        }
+        ttl = (row.expires_at - now).total_seconds()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error reading the AI answer cache: {str(e)}")
+        return None
+
+    _remember(key, entry, ttl)
+    return entry
+
+
+def store_answer(key, query_type, answer, chart_data):
+    """Save an answer in this worker's LRU and the ai_answer_cache table"""
+    entry = {'answer': answer, 'chart_data': chart_data, 'query_type': query_type}
+    _remember(key, entry, AI_CACHE_TTL)
+
+    now = datetime.utcnow()
+    try:
+        db.session.merge(AIAnswerCache(
+            key=key,
+            query_type=query_type,
+            answer=answer,
+            chart_data=json.dumps(chart_data) if chart_data is not None else None,
+            hits=0,
+            created_at=now,
+            last_used_at=now,
+            expires_at=now + timedelta(seconds=AI_CACHE_TTL)
+        ))
+        _prune(now)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error storing AI answer in the cache: {str(e)}")
+
+
+def _prune(now):
+    """Drop expired rows, then the least recently used rows beyond AI_CACHE_MAX_ROWS"""
+    db.session.execute(delete(AIAnswerCache).where(AIAnswerCache.expires_at <= now))
+    excess = db.session.query(func.count(AIAnswerCache.key)).scalar() - AI_CACHE_MAX_ROWS
+    if excess > 0:
+        oldest = db.session.query(AIAnswerCache.key).order_by(AIAnswerCache.last_used_at).limit(excess)
+        db.session.execute(
+            delete(AIAnswerCache).where(AIAnswerCache.key.in_(oldest.scalar_subquery())),
+            execution_options={'synchronize_session': False}
+        )
+
+
+def summary_key(versions):
+    """Cache key for the prompt data summary at these data versions, rolled over daily"""
+    raw = json.dumps({'versions': versions, 'day': date.today().isoformat()}, sort_keys=True)
+    return 'ai_summary:' + hashlib.sha256(raw.encode()).hexdigest()
+
+
+def get_cached_summary(key):
+    """
+    Data summary stored under a key by any worker
+
+    Kept in the response cache backend, so it is shared through Redis when
+    RESPONSE_CACHE_REDIS_URL is set.
+
+    Returns:
+        str: The summary, or None on a miss
+    """
+    try:
+        entry = backend.get(key)
+    except Exception as e:
+        logger.error(f"Error reading the AI summary cache: {str(e)}")
+        return None
+    return entry['summary'] if entry else None
+
+
+def store_summary(key, summary):
+    """Save a data summary for get_cached_summary()"""
+    try:
+        backend.set(key, {'summary': summary}, AI_CACHE_TTL)
+    except Exception as e:
+        logger.error(f"Error storing the AI summary: {str(e)}")
@@ -1,16 +1,22 @@
-from flask import Blueprint, jsonify, request, render_template
-import re
+from flask import Blueprint, Response, current_app, jsonify, request, render_template, stream_with_context
+import time
 import json
 import random
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from sqlalchemy import text, func, desc
-from models import db, Agent, DailyPerformance
+from sqlalchemy import text, func, desc, true
+from models import db, Agent, DailyPerformance, DailyRollup
+from metrics import TARGET_PPL, BREAK_EVEN_PPL
+from ai_cache import answer_key, get_cached_answer, store_answer, summary_key, get_cached_summary, store_summary
+from sequences import current_values
+from llm_client import LLMError, create_message, stream_message
+from intent_parser import parse_intent
 import os
 import requests
 import logging
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -22,49 +28,12 @@ logger = logging.getLogger(__name__)
 
 ai_insights_bp = Blueprint('ai_insights', __name__)
 
-# Dictionary of patterns to match and their corresponding database queries
-QUERY_PATTERNS = {
-    r"(?i).*top.*(agent|performer).*": {
-        "query": "get_top_agents",
-        "description": "Shows top performing agents based on PPL"
-    },
-    r"(?i).*worst.*(agent|performer).*": {
-        "query": "get_bottom_agents",
-        "description": "Shows agents with the lowest PPL"
-    },
-    r"(?i).*average.*(ppl|per person lead).*": {
-        "query": "get_average_ppl",
-        "description": "Calculates average PPL across all agents"
-    },
-    r"(?i).*performance.*(trend|over time).*": {
-        "query": "get_performance_trend",
-        "description": "Shows performance trend over time"
-    },
-    r"(?i).*division.*(performance|comparison).*": {
-        "query": "get_division_comparison",
-        "description": "Compares performance across divisions"
-    },
-    r"(?i).*highest.*(close rate|conversion).*": {
-        "query": "get_highest_close_rate",
-        "description": "Identifies agents with highest close rates"
-    },
-    r"(?i).*(best|top|highest|best performing).*manager.*": {
-        "query": "get_top_managers",
-        "description": "Shows top performing managers based on team PPL"
-    },
-    r"(?i).*(worst|bottom|lowest|worst performing).*manager.*": {
-        "query": "get_bottom_managers",
-        "description": "Shows managers with the lowest team PPL"
-    },
-    r"(?i).*average.*team.*ppl.*manager.*": {
-        "query": "get_manager_ppl",
-        "description": "Calculates average PPL by manager"
-    },
-    r"(?i).*manager.*performance.*": {
-        "query": "get_manager_performance",
-        "description": "Analyzes performance metrics by manager"
-    }
-}
+ANTHROPIC_MODEL = "claude-3-opus-20240229"
+
+# Threads that run the SQL and data summary stages of AI queries side by side; each
+# holds a database connection, so app.py adds them to the connection pool size
+AI_STAGE_WORKERS = int(os.environ.get("AI_STAGE_WORKERS", 4))
+_stage_pool = ThreadPoolExecutor(max_workers=AI_STAGE_WORKERS, thread_name_prefix="ai-stage")
 
 # Sample follow-up questions for each query type
 FOLLOW_UP_QUESTIONS = {
@@ -120,6 +89,15 @@ FOLLOW_UP_QUESTIONS = {
     ]
 }
 
+class DegradedAnswer(str):
+    """Answer text returned when the AI service failed; shown to the user but never cached"""
+
+def pick_follow_ups(query_type):
+    """Up to 3 follow-up questions for a query type, in random order"""
+    followups = list(FOLLOW_UP_QUESTIONS.get(query_type) or [])
+    random.shuffle(followups)
+    return followups[:3]
+
 # Anthropic API Integration
 def call_anthropic_api(prompt, system_prompt=None):
     """
@@ -138,14 +116,6 @@ def call_anthropic_api(prompt, system_prompt=None):
         raise ValueError("API key not configured. Please set the ANTHROPIC_API_KEY environment variable.")
     
     if api_key.startswith("sk-"):
-        url = "https://api.anthropic.com/v1/messages"
-        
-        headers = {
-            "Content-Type": "application/json",
-            "x-api-key": api_key,
-            "anthropic-version": "2023-06-01"
-        }
-        
         # Default system prompt if none provided
         if not system_prompt:
             system_prompt = """You are an AI assistant for a call center analytics dashboard. 
@@ -155,7 +125,7 @@ def call_anthropic_api(prompt, system_prompt=None):
         
         # Format the payload with system as a top-level parameter, not as a message role
         payload = {
-            "model": "claude-3-opus-20240229",
+            "model": ANTHROPIC_MODEL,
             "system": system_prompt,
             "messages": [
                 {"role": "user", "content": prompt}
@@ -165,24 +135,21 @@ def call_anthropic_api(prompt, system_prompt=None):
         
         try:
             logger.info(f"Sending request to Anthropic API with key starting with: {api_key[:8]}...")
-            response = requests.post(url, headers=headers, json=payload, timeout=30)
-            
-            if response.status_code != 200:
-                logger.error(f"Anthropic API returned status code {response.status_code}")
-                logger.error(f"Response body: {response.text}")
-                # Fall back to a simple response when the API fails
-                return f"I encountered a problem with the AI service (status code: {response.status_code}). Here's what I can tell you: The average PPL is an important metric that measures the revenue generated per lead. It's calculated as close rate × place rate × average premium."
+            result = create_message(payload)
             
-            result = response.json()
             if "content" not in result or not result["content"] or not isinstance(result["content"], list):
                 logger.error(f"Unexpected response format from Anthropic API: {result}")
-                return "I received an unexpected response format from the AI service. Let me share a simpler insight: PPL is a key performance indicator for call center agents."
+                return DegradedAnswer("I received an unexpected response format from the AI service. Let me share a simpler insight: PPL is a key performance indicator for call center agents.")
             
             return result["content"][0]["text"]
+        except LLMError as e:
+            logger.error(str(e))
+            if e.body:
+                logger.error(f"Response body: {e.body}")
+            # Fall back to a simple response when the API fails
+            return DegradedAnswer(f"I encountered a problem with the AI service (status code: {e.status_code}). Here's what I can tell you: The average PPL is an important metric that measures the revenue generated per lead. It's calculated as close rate × place rate × average premium.")
         except requests.exceptions.RequestException as e:
             logger.error(f"Error calling Anthropic API: {str(e)}")
-            if response and hasattr(response, 'text'):
-                logger.error(f"Response: {response.text}")
             raise Exception(f"Error calling AI service: {str(e)}")
         except Exception as e:
             logger.error(f"Unexpected error in Anthropic API call: {str(e)}")
@@ -192,183 +159,116 @@ def call_anthropic_api(prompt, system_prompt=None):
         logger.error("Invalid API key format. API key should start with 'sk-'")
         raise ValueError("Invalid API key format. Please check your ANTHROPIC_API_KEY environment variable.")
 
-def get_agent_data_summary():
-    """Generate a summary of agent data for context in AI queries"""
-    # Import db here to avoid circular imports
-    
-    logger.info("Getting agent data summary")
+def stream_anthropic_api(prompt, system_prompt):
+    """
+    Call the Anthropic Messages API with stream: true
     
-    try:
-        # Get counts
-        agent_count = Agent.query.filter_by(is_active=True).count()
-        logger.info(f"Found {agent_count} active agents")
-        
-        division_counts = db.session.query(Agent.division, func.count(Agent.id)).\
-            filter_by(is_active=True).\
-            group_by(Agent.division).all()
-        logger.info(f"Division counts: {division_counts}")
-        
-        # Get performance summary
-        now = datetime.now().date()
-        thirty_days_ago = now - timedelta(days=30)
-        
-        # For PostgreSQL, explicitly cast the calculation
-        avg_ppl_query = db.session.query(
-            func.avg(
-                (DailyPerformance.close_rate/100.0) * 
-                (DailyPerformance.place_rate/100.0) * 
-                DailyPerformance.avg_premium
-            )
-        ).filter(DailyPerformance.date >= thirty_days_ago)
-        
-        logger.info(f"PPL query: {str(avg_ppl_query)}")
-        avg_ppl = avg_ppl_query.scalar() or 0
-        logger.info(f"Average PPL calculated: {avg_ppl}")
-        
-        # Get performance metrics summary
-        metrics_summary = db.session.query(
-            func.avg(DailyPerformance.close_rate).label('avg_close_rate'),
-            func.avg(DailyPerformance.place_rate).label('avg_place_rate'),
-            func.avg(DailyPerformance.avg_premium).label('avg_premium'),
-            func.avg(DailyPerformance.leads_taken).label('avg_leads')
-        ).filter(DailyPerformance.date >= thirty_days_ago).first()
-        
-        if metrics_summary:
-            avg_close_rate = metrics_summary.avg_close_rate or 0
-            avg_place_rate = metrics_summary.avg_place_rate or 0
-            avg_premium = metrics_summary.avg_premium or 0
-            avg_leads = metrics_summary.avg_leads or 0
-        else:
-            avg_close_rate = avg_place_rate = avg_premium = avg_leads = 0
+    Args:
+        prompt (str): The user's query
+        system_prompt (str): System instructions for Claude
         
-        # Create summary text
-        summary = f"""
+    Yields:
+        str: Text fragments as Claude generates them
+    """
+    api_key = os.getenv("ANTHROPIC_API_KEY")
+    if not api_key or not api_key.startswith("sk-"):
+        raise ValueError("Invalid API key format. Please check your ANTHROPIC_API_KEY environment variable.")
+    
+    payload = {
+        "model": ANTHROPIC_MODEL,
+        "system": system_prompt,
+        "messages": [
+            {"role": "user", "content": prompt}
+        ],
+        "max_tokens": 1000
+    }
+    
+    logger.info("Opening streaming request to Anthropic API")
+    for event in stream_message(payload):
+        if event.get("type") == "content_block_delta" and event["delta"].get("type") == "text_delta":
+            yield event["delta"]["text"]
+
+def build_agent_data_summary():
+    """
+    Generate a summary of agent data for context in AI queries
+    
+    Active agents per division and the last 30 days' averages come from one
+    query: the 30-day daily rollup totals, outer-joined to the division counts
+    so the totals are returned even with no active agents.
+    """
+    thirty_days_ago = datetime.now().date() - timedelta(days=30)
+    
+    totals = db.session.query(
+        func.sum(DailyRollup.row_count).label('row_count'),
+        func.sum(DailyRollup.ppl_sum).label('ppl_sum'),
+        func.sum(DailyRollup.close_rate_sum).label('close_rate_sum'),
+        func.sum(DailyRollup.place_rate_sum).label('place_rate_sum'),
+        func.sum(DailyRollup.avg_premium_sum).label('avg_premium_sum'),
+        func.sum(DailyRollup.leads_sum).label('leads_sum')
+    ).filter(DailyRollup.date >= thirty_days_ago).subquery()
+    
+    divisions = db.session.query(
+        Agent.division.label('division'),
+        func.count(Agent.id).label('agent_count')
+    ).filter(Agent.is_active == True).group_by(Agent.division).subquery()
+    
+    rows = db.session.query(totals, divisions.c.division, divisions.c.agent_count).\
+        select_from(totals).\
+        outerjoin(divisions, true()).\
+        order_by(divisions.c.division).all()
+    
+    division_counts = [(row.division, row.agent_count) for row in rows if row.agent_count]
+    agent_count = sum(count for _, count in division_counts)
+    
+    first = rows[0]
+    row_count = first.row_count or 0
+    
+    def average(total):
+        return (total or 0) / row_count if row_count else 0
+    
+    return f"""
         Current Data Summary (Last 30 Days):
         - Total Active Agents: {agent_count}
         - Divisions: {", ".join([f"{div[0]} ({div[1]} agents)" for div in division_counts])}
-        - Average PPL: ${avg_ppl:.2f}
-        - Average Close Rate: {avg_close_rate:.1f}%
-        - Average Place Rate: {avg_place_rate:.1f}%
-        - Average Premium: ${avg_premium:.2f}
-        - Average Leads per Day: {avg_leads:.1f}
-        - Target PPL: $164
-        - Break-even PPL: $130
+        - Average PPL: ${average(first.ppl_sum):.2f}
+        - Average Close Rate: {average(first.close_rate_sum):.1f}%
+        - Average Place Rate: {average(first.place_rate_sum):.1f}%
+        - Average Premium: ${average(first.avg_premium_sum):.2f}
+        - Average Leads per Day: {average(first.leads_sum):.1f}
+        - Target PPL: ${TARGET_PPL}
+        - Break-even PPL: ${BREAK_EVEN_PPL}
         - Daily Leads Goal: 8
         """
+
+def get_agent_data_summary(versions=None):
+    """
+    Summary of agent data for AI prompts, cached per data version
+    
+    The summary only changes when agents or performance rows are written, so
+    it is built once per change-sequence state (and day) and shared by all
+    workers through the AI summary cache.
+    
+    Args:
+        versions (dict, optional): current_values(), when the caller has already read them
         
-        logger.info("Successfully generated data summary")
+    Returns:
+        str: The summary text
+    """
+    try:
+        if versions is None:
+            versions = current_values()
+        key = summary_key(versions)
+        summary = get_cached_summary(key)
+        if summary is None:
+            logger.info("Building agent data summary")
+            summary = build_agent_data_summary()
+            store_summary(key, summary)
         return summary
     except Exception as e:
         logger.error(f"Error generating agent data summary: {str(e)}")
         logger.error(traceback.format_exc())
         return "Error generating data summary"
 
-# Helper function to analyze the question and generate a SQL query
-def analyze_question(question):
-    """
-    Analyze a natural language question and extract key information to generate a SQL query.
-    This is a basic implementation that can be improved with more advanced NLP techniques.
-    """
-    question = question.lower()
-    
-    # Dictionary to track what we've identified in the question
-    query_info = {
-        'target': None,         # What data we're looking for (agents, managers, performance metrics)
-        'metric': None,         # Which metric to analyze (PPL, close rate, etc.)
-        'filter_division': None, # Filter by division
-        'filter_manager': None, # Filter by manager
-        'filter_queue': None,   # Filter by queue type
-        'time_period': 30,      # Default to last 30 days
-        'comparison': None,     # Comparison type (above/below target, comparison between divisions)
-        'limit': 5,             # Default to top/bottom 5 results
-        'sort_direction': 'DESC'# Default to descending order (highest first)
-    }
-    
-    # Extract metrics
-    metrics = {
-        'ppl': ['ppl', 'placed premium per lead', 'placed premium', 'premium per lead'],
-        'close_rate': ['close rate', 'close percentage', 'closing percentage', 'close', 'closes'],
-        'place_rate': ['place rate', 'placement rate', 'place percentage', 'placement'],
-        'avg_premium': ['average premium', 'avg premium', 'premium', 'average policy premium'],
-        'leads': ['leads', 'lead count', 'number of leads', 'lead volume'],
-    }
-    
-    for metric_key, terms in metrics.items():
-        if any(term in question for term in terms):
-            query_info['metric'] = metric_key
-            break
-    
-    # If no specific metric found, default to PPL
-    if not query_info['metric']:
-        query_info['metric'] = 'ppl'
-    
-    # Extract target (what we're looking for)
-    if any(x in question for x in ['manager', 'team lead', 'supervisor', 'team']):
-        query_info['target'] = 'managers'
-    elif any(x in question for x in ['who', 'which agent', 'top agent', 'best agent', 'worst agent']):
-        query_info['target'] = 'agents'
-    elif any(x in question for x in ['division', 'location', 'site', 'charlotte', 'austin']):
-        query_info['target'] = 'divisions'
-    elif any(x in question for x in ['average', 'avg', 'mean']):
-        query_info['target'] = 'average'
-    else:
-        query_info['target'] = 'agents'  # Default
-    
-    # Extract time period
-    time_periods = {
-        7: ['week', 'last 7 days', '7 days'],
-        14: ['two weeks', 'last 14 days', '14 days', 'fortnight'],
-        30: ['month', 'last 30 days', '30 days', 'last month'],
-        90: ['quarter', 'last 90 days', '90 days', 'last quarter', 'three months']
-    }
-    
-    for days, terms in time_periods.items():
-        if any(term in question for term in terms):
-            query_info['time_period'] = days
-            break
-    
-    # Extract division filter
-    if 'charlotte' in question or 'cha' in question or 'clt' in question:
-        query_info['filter_division'] = 'CHA'
-    elif 'austin' in question or 'aus' in question or 'atx' in question:
-        query_info['filter_division'] = 'AUS'
-    
-    # Extract queue type filter
-    if 'training' in question or 'train' in question:
-        query_info['filter_queue'] = 'training'
-    elif 'performance' in question or 'perform' in question:
-        query_info['filter_queue'] = 'performance'
-    
-    # Extract comparison
-    if 'above target' in question or 'above break even' in question or 'exceeding' in question:
-        query_info['comparison'] = 'above_target'
-    elif 'below target' in question or 'below break even' in question or 'under' in question:
-        query_info['comparison'] = 'below_target'
-    elif 'compare' in question:
-        query_info['comparison'] = 'compare'
-        
-        # If comparing divisions
-        if 'charlotte' in question and 'austin' in question:
-            query_info['target'] = 'divisions'
-            query_info['comparison'] = 'compare_divisions'
-    
-    # Extract sort direction
-    if any(x in question for x in ['top', 'best', 'highest', 'most']):
-        query_info['sort_direction'] = 'DESC'
-    elif any(x in question for x in ['bottom', 'worst', 'lowest', 'least']):
-        query_info['sort_direction'] = 'ASC'
-    
-    # Extract limit (how many results to return)
-    limit_match = re.search(r'top (\d+)', question)
-    if limit_match:
-        query_info['limit'] = int(limit_match.group(1))
-    else:
-        limit_match = re.search(r'(\d+) best', question)
-        if limit_match:
-            query_info['limit'] = int(limit_match.group(1))
-    
-    return query_info
-
 # Generate dynamic SQL based on the question analysis
 def generate_sql(query_info):
     """Generate SQL based on the analyzed question"""
@@ -393,15 +293,15 @@ def generate_sql(query_info):
             a.manager,
             a.queue_type,
             a.is_active,
-            AVG(p.close_rate) as avg_close_rate,
-            AVG(p.place_rate) as avg_place_rate,
-            AVG(p.avg_premium) as avg_premium,
-            AVG(p.leads_taken) as avg_leads_taken,
-            SUM(p.leads_taken) as total_leads,
-            (AVG(p.close_rate / 100) * AVG(p.place_rate / 100) * AVG(p.avg_premium)) as ppl
+            SUM(r.close_rate_sum) / SUM(r.row_count) as avg_close_rate,
+            SUM(r.place_rate_sum) / SUM(r.row_count) as avg_place_rate,
+            SUM(r.avg_premium_sum) / SUM(r.row_count) as avg_premium,
+            SUM(r.leads_sum) / SUM(r.row_count) as avg_leads_taken,
+            SUM(r.leads_sum) as total_leads,
+            ((SUM(r.close_rate_sum) / SUM(r.row_count) / 100) * (SUM(r.place_rate_sum) / SUM(r.row_count) / 100) * (SUM(r.avg_premium_sum) / SUM(r.row_count))) as ppl
         FROM agent a
-        JOIN daily_performance p ON a.id = p.agent_id
-        WHERE p.date BETWEEN :start_date AND :end_date
+        JOIN agent_daily_rollup r ON a.id = r.agent_id
+        WHERE r.date BETWEEN :start_date AND :end_date
         """
         
         # Add filters
@@ -428,9 +328,9 @@ def generate_sql(query_info):
         
         # Add comparison conditions
         if query_info['comparison'] == 'above_target':
-            sql += " HAVING (AVG(p.close_rate / 100) * AVG(p.place_rate / 100) * AVG(p.avg_premium)) >= 164"
+            sql += f" HAVING ((SUM(r.close_rate_sum) / SUM(r.row_count) / 100) * (SUM(r.place_rate_sum) / SUM(r.row_count) / 100) * (SUM(r.avg_premium_sum) / SUM(r.row_count))) >= {TARGET_PPL}"
         elif query_info['comparison'] == 'below_target':
-            sql += " HAVING (AVG(p.close_rate / 100) * AVG(p.place_rate / 100) * AVG(p.avg_premium)) < 130"
+            sql += f" HAVING ((SUM(r.close_rate_sum) / SUM(r.row_count) / 100) * (SUM(r.place_rate_sum) / SUM(r.row_count) / 100) * (SUM(r.avg_premium_sum) / SUM(r.row_count))) < {BREAK_EVEN_PPL}"
         
         # Add sorting
         if query_info['metric'] == 'ppl':
@@ -453,21 +353,21 @@ def generate_sql(query_info):
         SELECT 
             a.manager,
             COUNT(DISTINCT a.id) as agent_count,
-            AVG(p.close_rate) as avg_close_rate,
-            AVG(p.place_rate) as avg_place_rate,
-            AVG(p.avg_premium) as avg_premium,
-            AVG(p.leads_taken) as avg_leads_taken,
-            SUM(p.leads_taken) as total_leads,
-            (AVG(p.close_rate / 100) * AVG(p.place_rate / 100) * AVG(p.avg_premium)) as ppl,
+            SUM(r.close_rate_sum) / SUM(r.row_count) as avg_close_rate,
+            SUM(r.place_rate_sum) / SUM(r.row_count) as avg_place_rate,
+            SUM(r.avg_premium_sum) / SUM(r.row_count) as avg_premium,
+            SUM(r.leads_sum) / SUM(r.row_count) as avg_leads_taken,
+            SUM(r.leads_sum) as total_leads,
+            ((SUM(r.close_rate_sum) / SUM(r.row_count) / 100) * (SUM(r.place_rate_sum) / SUM(r.row_count) / 100) * (SUM(r.avg_premium_sum) / SUM(r.row_count))) as ppl,
             -- Count agents per manager that are above target
-            SUM(CASE WHEN (p.close_rate / 100 * p.place_rate / 100 * p.avg_premium) >= 164 THEN 1 ELSE 0 END) as agents_above_target,
+            SUM(r.above_target) as agents_above_target,
             -- Count agents per manager that are at break even
-            SUM(CASE WHEN (p.close_rate / 100 * p.place_rate / 100 * p.avg_premium) BETWEEN 130 AND 163.99 THEN 1 ELSE 0 END) as agents_at_break_even,
+            SUM(r.at_break_even) as agents_at_break_even,
             -- Count agents per manager that are below break even  
-            SUM(CASE WHEN (p.close_rate / 100 * p.place_rate / 100 * p.avg_premium) < 130 THEN 1 ELSE 0 END) as agents_below_break_even
+            SUM(r.below_break_even) as agents_below_break_even
         FROM agent a
-        JOIN daily_performance p ON a.id = p.agent_id
-        WHERE p.date BETWEEN :start_date AND :end_date
+        JOIN agent_daily_rollup r ON a.id = r.agent_id
+        WHERE r.date BETWEEN :start_date AND :end_date
         AND a.is_active = True
         AND a.manager IS NOT NULL
         AND a.manager != ''
@@ -493,9 +393,9 @@ def generate_sql(query_info):
         
         # Add comparison conditions
         if query_info['comparison'] == 'above_target':
-            sql += " HAVING ppl >= 164"
+            sql += f" HAVING ppl >= {TARGET_PPL}"
         elif query_info['comparison'] == 'below_target':
-            sql += " HAVING ppl < 130"
+            sql += f" HAVING ppl < {BREAK_EVEN_PPL}"
         
         # Add sorting based on metric
         if query_info['metric'] == 'ppl':
@@ -521,14 +421,14 @@ def generate_sql(query_info):
         SELECT 
             a.division,
             COUNT(DISTINCT a.id) as agent_count,
-            AVG(p.close_rate) as avg_close_rate,
-            AVG(p.place_rate) as avg_place_rate,
-            AVG(p.avg_premium) as avg_premium,
-            SUM(p.leads_taken) as total_leads,
-            (AVG(p.close_rate / 100) * AVG(p.place_rate / 100) * AVG(p.avg_premium)) as ppl
+            SUM(r.close_rate_sum) / SUM(r.row_count) as avg_close_rate,
+            SUM(r.place_rate_sum) / SUM(r.row_count) as avg_place_rate,
+            SUM(r.avg_premium_sum) / SUM(r.row_count) as avg_premium,
+            SUM(r.leads_sum) as total_leads,
+            ((SUM(r.close_rate_sum) / SUM(r.row_count) / 100) * (SUM(r.place_rate_sum) / SUM(r.row_count) / 100) * (SUM(r.avg_premium_sum) / SUM(r.row_count))) as ppl
         FROM agent a
-        JOIN daily_performance p ON a.id = p.agent_id
-        WHERE p.date BETWEEN :start_date AND :end_date
+        JOIN agent_daily_rollup r ON a.id = r.agent_id
+        WHERE r.date BETWEEN :start_date AND :end_date
         AND a.is_active = 1
         """
         
@@ -564,14 +464,14 @@ def generate_sql(query_info):
         sql = """
         SELECT 
             COUNT(DISTINCT a.id) as agent_count,
-            AVG(p.close_rate) as avg_close_rate,
-            AVG(p.place_rate) as avg_place_rate,
-            AVG(p.avg_premium) as avg_premium,
-            SUM(p.leads_taken) as total_leads,
-            (AVG(p.close_rate / 100) * AVG(p.place_rate / 100) * AVG(p.avg_premium)) as ppl
+            SUM(r.close_rate_sum) / SUM(r.row_count) as avg_close_rate,
+            SUM(r.place_rate_sum) / SUM(r.row_count) as avg_place_rate,
+            SUM(r.avg_premium_sum) / SUM(r.row_count) as avg_premium,
+            SUM(r.leads_sum) as total_leads,
+            ((SUM(r.close_rate_sum) / SUM(r.row_count) / 100) * (SUM(r.place_rate_sum) / SUM(r.row_count) / 100) * (SUM(r.avg_premium_sum) / SUM(r.row_count))) as ppl
         FROM agent a
-        JOIN daily_performance p ON a.id = p.agent_id
-        WHERE p.date BETWEEN :start_date AND :end_date
+        JOIN agent_daily_rollup r ON a.id = r.agent_id
+        WHERE r.date BETWEEN :start_date AND :end_date
         AND a.is_active = 1
         """
         
@@ -587,97 +487,149 @@ def generate_sql(query_info):
     
     return sql, {'start_date': start_date, 'end_date': end_date}
 
-def process_ai_query(question):
+def error_response(message):
+    """Response dict for a question that could not be processed"""
+    return {
+        "answer": message,
+        "chart_data": None,
+        "follow_up_questions": [],
+        "type": "error"
+    }
+
+def run_query(query_info):
     """
-    Process a natural language question about agent data using Anthropic's Claude API
+    Run the SQL generated for a question on its own connection
+    
+    Returns:
+        tuple: (list of result dicts, whether the query succeeded)
+    """
+    # Get performance data based on the analysis
+    sql, params = generate_sql(query_info)
+    logger.info(f"Generated SQL: {sql}")
+    logger.info(f"SQL params: {params}")
+    
+    # Execute the query
+    data_results = []
+    try:
+        with db.engine.connect() as conn:
+            result = conn.execute(text(sql), params)
+            rows = result.fetchall()
+            
+            # Convert result to list of dicts
+            for row in rows:
+                result_dict = {}
+                for column, value in row._mapping.items():
+                    result_dict[column] = value
+                data_results.append(result_dict)
+            
+            logger.info(f"Query returned {len(data_results)} results")
+        return data_results, True
+    except Exception as e:
+        logger.error(f"Database query error: {str(e)}")
+        logger.error(traceback.format_exc())
+        return [], False
+
+def elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 1)
+
+def run_stage(app, timings, stage, func, *args):
+    """Run one pipeline stage in its own app context, so it gets its own session and connection"""
+    started = time.perf_counter()
+    try:
+        with app.app_context():
+            return func(*args)
+    finally:
+        timings[stage] = elapsed_ms(started)
+
+def retrieve_query_data(question):
+    """
+    Analyze a question, fetch its data and prompt context, and look up a cached answer
+    
+    The question's SQL and the data summary are independent, so they run at
+    the same time on the stage pool, each with its own connection.
     
     Args:
         question (str): The user's question about agent data
         
     Returns:
-        dict: Response containing answer and any visualization data
+        dict: query_type, query_info, data_results, data_summary, cache_key
+              (None when the answer must not be cached), cached (stored answer
+              or None) and timings (milliseconds per stage)
     """
-    # Import db here to avoid circular imports
+    started = time.perf_counter()
+    timings = {}
     
-    logger.info(f"Processing AI query: {question}")
+    # Determine the query type and what data to fetch
+    query_type, query_info = parse_intent(question)
     
     try:
-        # Check if ANTHROPIC_API_KEY is available
-        api_key = os.getenv("ANTHROPIC_API_KEY")
-        if not api_key:
-            logger.error("ANTHROPIC_API_KEY not found in environment variables")
-            return {
-                "answer": "Error: API key not configured. Please set the ANTHROPIC_API_KEY environment variable.",
-                "chart_data": None,
-                "follow_up_questions": [],
-                "type": "error"
-            }
-        
-        # First, try to match with our basic patterns to determine query type
-        query_type = None
-        for pattern, info in QUERY_PATTERNS.items():
-            if re.match(pattern, question):
-                query_type = info["query"]
-                description = info["description"]
-                break
-        
-        # Analyze the question to determine what data to fetch
-        query_info = analyze_question(question)
-        
-        # Get performance data based on the analysis
-        sql, params = generate_sql(query_info)
-        logger.info(f"Generated SQL: {sql}")
-        logger.info(f"SQL params: {params}")
-        
-        # Execute the query
-        data_results = []
+        versions = current_values()
+    except Exception as e:
+        logger.error(f"Could not read data versions: {str(e)}")
+        versions = None
+    # The stages use their own connections; don't hold this one while they run
+    db.session.remove()
+    
+    app = current_app._get_current_object()
+    query_future = _stage_pool.submit(run_stage, app, timings, "sql_ms", run_query, query_info)
+    summary_future = _stage_pool.submit(run_stage, app, timings, "summary_ms", get_agent_data_summary, versions)
+    data_results, query_succeeded = query_future.result()
+    data_summary = summary_future.result()
+    timings["retrieval_ms"] = elapsed_ms(started)
+    
+    # Equivalent questions over unchanged data get the stored answer without an API call
+    cache_key, cached = None, None
+    if query_succeeded and versions is not None:
         try:
-            with db.engine.connect() as conn:
-                result = conn.execute(text(sql), params)
-                rows = result.fetchall()
-                
-                # Convert result to list of dicts
-                for row in rows:
-                    result_dict = {}
-                    for column, value in row._mapping.items():
-                        result_dict[column] = value
-                    data_results.append(result_dict)
-                
-                logger.info(f"Query returned {len(data_results)} results")
+            cache_key = answer_key(query_info, data_results, versions)
+            cached = get_cached_answer(cache_key)
         except Exception as e:
-            logger.error(f"Database query error: {str(e)}")
-            logger.error(traceback.format_exc())
-            data_results = []
-    except Exception as e:
-        logger.error(f"Error analyzing question: {str(e)}")
-        logger.error(traceback.format_exc())
-        return {
-            "answer": f"An error occurred while analyzing your question: {str(e)}",
-            "chart_data": None,
-            "follow_up_questions": [],
-            "type": "error"
-        }
-    
-    # Get data summary for context
-    try:
-        data_summary = get_agent_data_summary()
-    except Exception as e:
-        logger.error(f"Error getting data summary: {str(e)}")
-        logger.error(traceback.format_exc())
-        data_summary = "Error getting data summary"
+            logger.error(f"AI answer cache unavailable: {str(e)}")
+            cache_key, cached = None, None
+    # Release the request's connection before the Claude call, which can take many seconds
+    db.session.remove()
+    
+    return {
+        "query_type": query_type,
+        "query_info": query_info,
+        "data_results": data_results,
+        "data_summary": data_summary,
+        "cache_key": cache_key,
+        "cached": cached,
+        "timings": timings
+    }
+
+def cached_response(cached):
+    """Response dict for an answer served from the AI answer cache"""
+    # The chart and follow-ups match the question the answer was generated for
+    logger.info("Answered from the AI answer cache")
+    return {
+        "answer": cached["answer"],
+        "chart_data": cached["chart_data"],
+        "follow_up_questions": pick_follow_ups(cached["query_type"]),
+        "type": cached["query_type"],
+        "cached": True
+    }
+
+def build_prompts(question, data_results, data_summary):
+    """
+    System prompt and user prompt for Claude, including the data summary
     
+    Returns:
+        tuple: (system_prompt, prompt)
+    """
     # Format the results for Claude
     formatted_results = json.dumps(data_results, indent=2, default=str)
     
     # Prepare the prompt for Claude
-    system_prompt = """You are an AI assistant for a call center analytics dashboard. 
+    system_prompt = f"""You are an AI assistant for a call center analytics dashboard. 
     You analyze performance data for sales agents, focusing on metrics like PPL (Placed Premium per Lead), 
     close rates, place rates, and average premiums.
 
     Important metrics and targets:
     - PPL (Placed Premium per Lead) = (close_rate/100 * place_rate/100 * avg_premium)
-    - Target PPL: $164
-    - Break-even PPL: $130
+    - Target PPL: ${TARGET_PPL}
+    - Break-even PPL: ${BREAK_EVEN_PPL}
     
     RESPONSE GUIDELINES - FOLLOW THESE EXACTLY:
     1. Keep responses concise - maximum 5-6 short sentences
@@ -712,77 +664,164 @@ def process_ai_query(question):
     Include relevant metrics, comparisons to targets, and any patterns or insights you observe.
     For follow-up suggestions, focus on logical next questions based on this analysis.
     """
-    
-    # Call Claude API for the response
-    try:
-        logger.info("Calling Anthropic API")
-        claude_response = call_anthropic_api(prompt, system_prompt)
-        logger.info("Received response from Anthropic API")
-        
-        # Determine chart data if applicable
-        chart_data = None
-        if len(data_results) > 0 and (query_type == "get_top_agents" or query_type == "get_bottom_agents"):
-            chart_data = {
-                'type': 'bar',
-                'data': {
-                    'labels': [record.get('name', '') for record in data_results[:5]],
-                    'datasets': [{
-                        'label': 'PPL ($)',
-                        'data': [float(record.get('ppl', 0)) for record in data_results[:5]],
-                        'backgroundColor': ['rgba(54, 162, 235, 0.7)'] * 5,
-                        'borderColor': ['rgba(54, 162, 235, 1)'] * 5,
-                        'borderWidth': 1
-                    }]
-                },
-                'options': {
-                    'scales': {
-                        'y': {
-                            'beginAtZero': True,
-                            'title': {
-                                'display': True,
-                                'text': 'Placed Premium per Lead ($)'
-                            }
-                        },
-                        'x': {
-                            'title': {
-                                'display': True,
-                                'text': 'Agents'
-                            }
+    return system_prompt, prompt
+
+def build_chart_data(query_type, data_results):
+    """Chart.js configuration for the query results, or None"""
+    chart_data = None
+    if len(data_results) > 0 and (query_type == "get_top_agents" or query_type == "get_bottom_agents"):
+        chart_data = {
+            'type': 'bar',
+            'data': {
+                'labels': [record.get('name', '') for record in data_results[:5]],
+                'datasets': [{
+                    'label': 'PPL ($)',
+                    'data': [float(record.get('ppl', 0)) for record in data_results[:5]],
+                    'backgroundColor': ['rgba(54, 162, 235, 0.7)'] * 5,
+                    'borderColor': ['rgba(54, 162, 235, 1)'] * 5,
+                    'borderWidth': 1
+                }]
+            },
+            'options': {
+                'scales': {
+                    'y': {
+                        'beginAtZero': True,
+                        'title': {
+                            'display': True,
+                            'text': 'Placed Premium per Lead ($)'
                         }
                     },
-                    'plugins': {
+                    'x': {
                         'title': {
                             'display': True,
-                            'text': f"Agent PPL Comparison",
-                            'font': {
-                                'size': 16
-                            }
+                            'text': 'Agents'
+                        }
+                    }
+                },
+                'plugins': {
+                    'title': {
+                        'display': True,
+                        'text': f"Agent PPL Comparison",
+                        'font': {
+                            'size': 16
                         }
                     }
                 }
             }
-        elif query_type == "get_performance_trend":
-            # Create line chart for performance trend
-            chart_data = {
-                'type': 'line',
-                'data': {
-                    'labels': [record.get('date', '') for record in data_results],
-                    'datasets': [{
-                        'label': 'PPL Trend',
-                        'data': [float(record.get('ppl', 0)) for record in data_results],
-                        'fill': False,
-                        'borderColor': 'rgba(75, 192, 192, 1)',
-                        'tension': 0.1
-                    }]
-                }
+        }
+    elif query_type == "get_performance_trend":
+        # Create line chart for performance trend
+        chart_data = {
+            'type': 'line',
+            'data': {
+                'labels': [record.get('date', '') for record in data_results],
+                'datasets': [{
+                    'label': 'PPL Trend',
+                    'data': [float(record.get('ppl', 0)) for record in data_results],
+                    'fill': False,
+                    'borderColor': 'rgba(75, 192, 192, 1)',
+                    'tension': 0.1
+                }]
             }
+        }
+    return chart_data
+
+def fallback_response(question, query_type, data_results):
+    """Basic response built from the query results when the Claude call fails"""
+    fallback_response = "I'm having trouble analyzing this data right now. Here are some basic insights:"
+    
+    if data_results:
+        if query_type and 'agents' in query_type:
+            agent_count = len(data_results)
+            fallback_response += f"\n\nI found {agent_count} agents matching your criteria."
+            if 'top' in question.lower():
+                top_agent = data_results[0] if data_results else None
+                if top_agent and 'name' in top_agent and 'ppl' in top_agent:
+                    fallback_response += f" The top performer is {top_agent['name']} with a PPL of ${top_agent['ppl']:.2f}."
+        elif query_type and 'average' in query_type:
+            if data_results and 'ppl' in data_results[0]:
+                avg_ppl = data_results[0]['ppl']
+                fallback_response += f"\n\nThe average PPL is ${avg_ppl:.2f}."
+                if avg_ppl >= TARGET_PPL:
+                    fallback_response += f" This is above the target of ${TARGET_PPL}."
+                elif avg_ppl >= BREAK_EVEN_PPL:
+                    fallback_response += f" This is below the target of ${TARGET_PPL}, but above the break-even point of ${BREAK_EVEN_PPL}."
+                else:
+                    fallback_response += f" This is below the break-even point of ${BREAK_EVEN_PPL}."
+    else:
+        fallback_response += "\n\nI couldn't find any data matching your query. Try broadening your search criteria or check if the filters are correct."
+    
+    # Get default follow-up questions
+    default_followups = [
+        "Who are the top performing agents?",
+        "What's the average PPL across all agents?",
+        "Compare Austin and Charlotte divisions"
+    ]
+    
+    return {
+        "answer": fallback_response,
+        "chart_data": None,
+        "follow_up_questions": default_followups,
+        "type": "fallback"
+    }
+
+def process_ai_query(question):
+    """
+    Process a natural language question about agent data using Anthropic's Claude API
+    
+    Args:
+        question (str): The user's question about agent data
+        
+    Returns:
+        dict: Response containing answer, any visualization data and the
+              time spent in each stage
+    """
+    logger.info(f"Processing AI query: {question}")
+    started = time.perf_counter()
+    
+    # Check if ANTHROPIC_API_KEY is available
+    if not os.getenv("ANTHROPIC_API_KEY"):
+        logger.error("ANTHROPIC_API_KEY not found in environment variables")
+        return error_response("Error: API key not configured. Please set the ANTHROPIC_API_KEY environment variable.")
+    
+    try:
+        retrieved = retrieve_query_data(question)
+    except Exception as e:
+        logger.error(f"Error analyzing question: {str(e)}")
+        logger.error(traceback.format_exc())
+        return error_response(f"An error occurred while analyzing your question: {str(e)}")
+    
+    timings = retrieved["timings"]
+    if retrieved["cached"]:
+        response = cached_response(retrieved["cached"])
+    else:
+        response = answer_query(question, retrieved)
+    timings["total_ms"] = elapsed_ms(started)
+    response["timings"] = timings
+    logger.info(f"AI query timings: {timings}")
+    return response
+
+def answer_query(question, retrieved):
+    """Ask Claude about retrieved data, falling back to a basic answer if the call fails"""
+    query_type = retrieved["query_type"]
+    data_results = retrieved["data_results"]
+    system_prompt, prompt = build_prompts(question, data_results, retrieved["data_summary"])
+    
+    # Call Claude API for the response
+    started = time.perf_counter()
+    try:
+        logger.info("Calling Anthropic API")
+        claude_response = call_anthropic_api(prompt, system_prompt)
+        logger.info("Received response from Anthropic API")
+        
+        # Determine chart data if applicable
+        chart_data = build_chart_data(query_type, data_results)
         
         # Get follow-up questions based on the query type
-        followups = []
-        if query_type and query_type in FOLLOW_UP_QUESTIONS:
-            followups = FOLLOW_UP_QUESTIONS[query_type]
-            random.shuffle(followups)
-            followups = followups[:3]  # Limit to 3 follow-ups
+        followups = pick_follow_ups(query_type)
+        
+        if retrieved["cache_key"] and not isinstance(claude_response, DegradedAnswer):
+            store_answer(retrieved["cache_key"], query_type, claude_response, chart_data)
         
         return {
             "answer": claude_response,
@@ -795,42 +834,9 @@ def process_ai_query(question):
         logger.error(traceback.format_exc())
         
         # Fall back to basic response if Claude fails
-        fallback_response = "I'm having trouble analyzing this data right now. Here are some basic insights:"
-        
-        if data_results:
-            if query_type and 'agents' in query_type:
-                agent_count = len(data_results)
-                fallback_response += f"\n\nI found {agent_count} agents matching your criteria."
-                if 'top' in question.lower():
-                    top_agent = data_results[0] if data_results else None
-                    if top_agent and 'name' in top_agent and 'ppl' in top_agent:
-                        fallback_response += f" The top performer is {top_agent['name']} with a PPL of ${top_agent['ppl']:.2f}."
-            elif query_type and 'average' in query_type:
-                if data_results and 'ppl' in data_results[0]:
-                    avg_ppl = data_results[0]['ppl']
-                    fallback_response += f"\n\nThe average PPL is ${avg_ppl:.2f}."
-                    if avg_ppl >= 164:
-                        fallback_response += " This is above the target of $164."
-                    elif avg_ppl >= 130:
-                        fallback_response += " This is below the target of $164, but above the break-even point of $130."
-                    else:
-                        fallback_response += " This is below the break-even point of $130."
-        else:
-            fallback_response += "\n\nI couldn't find any data matching your query. Try broadening your search criteria or check if the filters are correct."
-        
-        # Get default follow-up questions
-        default_followups = [
-            "Who are the top performing agents?",
-            "What's the average PPL across all agents?",
-            "Compare Austin and Charlotte divisions"
-        ]
-        
-        return {
-            "answer": fallback_response,
-            "chart_data": None,
-            "follow_up_questions": default_followups,
-            "type": "fallback"
-        }
+        return fallback_response(question, query_type, data_results)
+    finally:
+        retrieved["timings"]["llm_ms"] = elapsed_ms(started)
 
 @ai_insights_bp.route('/api/ai_insights', methods=['POST'])
 def process_ai_query_endpoint():
@@ -862,6 +868,114 @@ def process_ai_query_endpoint():
         logger.error(traceback.format_exc())
         return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
 
+def sse_event(event, data):
+    """Format one server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def answer_events(response):
+    """Events for an answer that is already complete (cached or an error)"""
+    response = dict(response)
+    answer = response.pop("answer")
+    yield sse_event("meta", response)
+    yield sse_event("delta", {"text": answer})
+    yield sse_event("done", {})
+
+def finish_timings(timings, started, llm_started):
+    """Payload of the final "done" event"""
+    timings["llm_ms"] = elapsed_ms(llm_started)
+    timings["total_ms"] = elapsed_ms(started)
+    logger.info(f"AI query timings: {timings}")
+    return {"timings": timings}
+
+def stream_ai_query(question):
+    """
+    Answer a question as a stream of server-sent events
+    
+    The query results and chart are sent in a "meta" event as soon as the SQL
+    has run, then Claude's answer follows as "delta" events while it is
+    generated and a final "done" event. Cached answers are sent in one delta.
+    
+    Args:
+        question (str): The user's question about agent data
+        
+    Yields:
+        str: Formatted server-sent events
+    """
+    logger.info(f"Streaming AI query: {question}")
+    started = time.perf_counter()
+    
+    if not os.getenv("ANTHROPIC_API_KEY"):
+        logger.error("ANTHROPIC_API_KEY not found in environment variables")
+        yield from answer_events(error_response("Error: API key not configured. Please set the ANTHROPIC_API_KEY environment variable."))
+        return
+    
+    try:
+        retrieved = retrieve_query_data(question)
+    except Exception as e:
+        logger.error(f"Error analyzing question: {str(e)}")
+        logger.error(traceback.format_exc())
+        yield from answer_events(error_response(f"An error occurred while analyzing your question: {str(e)}"))
+        return
+    
+    timings = retrieved["timings"]
+    if retrieved["cached"]:
+        response = cached_response(retrieved["cached"])
+        timings["total_ms"] = elapsed_ms(started)
+        response["timings"] = timings
+        yield from answer_events(response)
+        return
+    
+    query_type = retrieved["query_type"]
+    data_results = retrieved["data_results"]
+    chart_data = build_chart_data(query_type, data_results)
+    yield sse_event("meta", {
+        "chart_data": chart_data,
+        "follow_up_questions": pick_follow_ups(query_type),
+        "type": query_type,
+        "results": data_results,
+        "timings": dict(timings)
+    })
+    
+    system_prompt, prompt = build_prompts(question, data_results, retrieved["data_summary"])
+    parts = []
+    llm_started = time.perf_counter()
+    try:
+        for fragment in stream_anthropic_api(prompt, system_prompt):
+            if not parts:
+                timings["first_token_ms"] = elapsed_ms(llm_started)
+            parts.append(fragment)
+            yield sse_event("delta", {"text": fragment})
+    except Exception as e:
+        logger.error(f"Error streaming from Claude API: {str(e)}")
+        logger.error(traceback.format_exc())
+        if parts:
+            yield sse_event("error", {"message": "The answer was interrupted. Please try again."})
+        else:
+            # Nothing has been shown yet, so the basic answer can stand in for Claude's
+            fallback = fallback_response(question, query_type, data_results)
+            yield sse_event("delta", {"text": fallback["answer"], "type": "fallback"})
+        yield sse_event("done", finish_timings(timings, started, llm_started))
+        return
+    
+    if retrieved["cache_key"]:
+        store_answer(retrieved["cache_key"], query_type, "".join(parts), chart_data)
+    yield sse_event("done", finish_timings(timings, started, llm_started))
+
+@ai_insights_bp.route('/api/ai_insights/stream', methods=['POST'])
+def stream_ai_query_endpoint():
+    """API endpoint that streams the answer to an AI query as server-sent events."""
+    data = request.get_json(silent=True) or {}
+    question = data.get('question', '')
+    
+    if not question:
+        return jsonify({"error": "No question provided"}), 400
+    
+    response = Response(stream_with_context(stream_ai_query(question)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop proxies from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 # Add route for AI Insights page
 @ai_insights_bp.route('/ai_insights')
 def ai_insights_page():
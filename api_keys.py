@@ -0,0 +1,107 @@
+import os
+import time
+import atexit
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import bindparam
+from models import db, APIKey
+
+# How long a validated key is trusted before it is checked against the database again.
+# Deactivating or deleting a key invalidates it immediately in this process; other
+# worker processes pick the change up within this many seconds.
+API_KEY_CACHE_TTL = int(os.environ.get('API_KEY_CACHE_TTL', 60))
+API_KEY_CACHE_SIZE = int(os.environ.get('API_KEY_CACHE_SIZE', 1024))
+
+# last_used_at is written at most once per key per interval
+LAST_USED_FLUSH_SECONDS = int(os.environ.get('API_KEY_LAST_USED_FLUSH_SECONDS', 60))
+
+_lock = threading.Lock()
+_cache = OrderedDict()  # key -> (key id, expiry time)
+_pending = {}  # key id -> latest use
+_flusher = None
+
+
+def lookup_api_key(key):
+    """
+    Return the id of an active API key, using the in-process cache
+
+    Args:
+        key (str): Key sent by the client
+
+    Returns:
+        int: The key's id, or None if the key is unknown or inactive
+    """
+    now = time.monotonic()
+    with _lock:
+        entry = _cache.get(key)
+        if entry and entry[1] > now:
+            _cache.move_to_end(key)
+            return entry[0]
+
+    key_record = APIKey.query.filter_by(key=key, is_active=True).first()
+    if not key_record:
+        with _lock:
+            _cache.pop(key, None)
+        return None
+
+    with _lock:
+        _cache[key] = (key_record.id, now + API_KEY_CACHE_TTL)
+        _cache.move_to_end(key)
+        while len(_cache) > API_KEY_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return key_record.id
+
+
+def invalidate_api_key(key=None):
+    """Drop one key (or every key) from the cache"""
+    with _lock:
+        if key is None:
+            _cache.clear()
+        else:
+            _cache.pop(key, None)
+
+
+def record_api_key_use(key_id):
+    """Remember that a key was used; the timestamp is written by the background flusher"""
+    with _lock:
+        _pending[key_id] = datetime.utcnow()
+    _start_flusher(current_app._get_current_object())
+
+
+def flush_last_used(app):
+    """Write pending last_used_at values in a single batch"""
+    with _lock:
+        if not _pending:
+            return 0
+        rows = [{'key_id': key_id, 'used_at': used_at} for key_id, used_at in _pending.items()]
+        _pending.clear()
+
+    table = APIKey.__table__
+    stmt = table.update().where(table.c.id == bindparam('key_id')).values(last_used_at=bindparam('used_at'))
+    try:
+        with app.app_context():
+            with db.engine.begin() as conn:
+                conn.execute(stmt, rows)
+    except Exception as e:
+        print(f"Error updating API key last_used_at: {str(e)}")
+    return len(rows)
+
+
+def _start_flusher(app):
+    global _flusher
+    if _flusher is not None:
+        return
+    with _lock:
+        if _flusher is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(LAST_USED_FLUSH_SECONDS)
+                flush_last_used(app)
+
+        _flusher = threading.Thread(target=run, name='api-key-last-used', daemon=True)
+        _flusher.start()
+        atexit.register(flush_last_used, app)
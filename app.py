@@ -4,7 +4,6 @@ from datetime import datetime, timedelta
 import plotly.express as px
 import plotly.utils
 import json
-import pandas as pd
 import os
 from werkzeug.utils import secure_filename
 import uuid
@@ -14,7 +13,7 @@ from functools import wraps
 from looker_api import register_looker_api
 
 # Register the AI Insights Blueprint
-from ai_insights import register_ai_insights
+from ai_insights import register_ai_insights, AI_STAGE_WORKERS
 
 app = Flask(__name__)
 
@@ -36,8 +35,39 @@ else:
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 # Initialize the db
-from models import db, Agent, DailyPerformance, APIKey
+from models import db, Agent, DailyPerformance, DailyRollup, APIKey, ImportJob, ChangeSequence
+from aggregations import summarize_performance, agents_series
+from trends import parse_windows, rolling_trend
+from ingest import upsert_performance, ingest_performance_batch, backfill_derived_fields, database_error_message
+from importer import run_import, ImportValidationError
+from import_jobs import enqueue_import, job_status, fail_stale_jobs, IMPORT_WORKERS
+from manager_names import seed_aliases
+from response_cache import cached_response, bump_data_version, AGENTS, PERFORMANCE
+from sequences import mark_reset, next_value, current_values
+from change_feed import (
+    ChangeFeedError, MAX_CHANGES, AGENT_ENTITY, PERFORMANCE_ENTITY,
+    parse_cursor, changes_since, record_deletes, record_reset
+)
+from columnar_store import get_store
+from metrics import compute_metrics, STATUS_LABELS
+from agent_listing import AgentListingError, parse_listing_args, last_modified, agent_page
+from response_format import install_json_provider, compressed, wants_columnar, columnar_series
+from api_keys import lookup_api_key, invalidate_api_key, record_api_key_use, flush_last_used
+from rollups import (
+    refresh_rollups, clear_rollups, rebuild_rollups,
+    summarize_days, summarize_agent
+)
+# Size the connection pool for every thread that can hold a connection at once: the
+# request threads (see gunicorn.conf.py), the AI query stage pool, the import pool
+# and the API key last-used flusher. The overflow is headroom, not capacity.
+REQUEST_THREADS = int(os.environ.get('GUNICORN_THREADS', 8))
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', REQUEST_THREADS + AI_STAGE_WORKERS + IMPORT_WORKERS + 1))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 5))
+if not (app.config['SQLALCHEMY_DATABASE_URI'] or '').startswith('sqlite'):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'pool_size': DB_POOL_SIZE, 'max_overflow': DB_MAX_OVERFLOW}
+
 db.init_app(app)
+install_json_provider(app)
 
 # Configure upload folder - for Vercel, use /tmp for file uploads
 if IS_VERCEL:
@@ -49,7 +79,8 @@ ALLOWED_EXTENSIONS = {'csv', 'xlsx', 'xls'}
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max
+# Uploads are imported in chunks, so large backfill files are fine
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_UPLOAD_MB', 512)) * 1024 * 1024
 
 # Configure secret key for sessions
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', '12345678900987654321')
@@ -69,13 +100,12 @@ def require_api_key(f):
         if not api_key:
             return jsonify({'error': 'API key is missing'}), 401
             
-        key_record = APIKey.query.filter_by(key=api_key, is_active=True).first()
-        if not key_record:
+        key_id = lookup_api_key(api_key)
+        if not key_id:
             return jsonify({'error': 'Invalid or inactive API key'}), 401
             
-        # Update last used timestamp
-        key_record.last_used_at = datetime.utcnow()
-        db.session.commit()
+        # Update last used timestamp (written in batches in the background)
+        record_api_key_use(key_id)
         
         return f(*args, **kwargs)
     return decorated_function
@@ -87,6 +117,8 @@ def api_keys_page():
 
 @app.route('/api/api_keys', methods=['GET'])
 def get_api_keys():
+    # Write pending last used timestamps so the list is current
+    flush_last_used(app)
     keys = APIKey.query.all()
     return jsonify([{
         'id': key.id,
@@ -130,6 +162,7 @@ def delete_api_key(key_id):
     key = APIKey.query.get_or_404(key_id)
     db.session.delete(key)
     db.session.commit()
+    invalidate_api_key(key.key)
     return jsonify({'message': 'API key deleted successfully'})
 
 @app.route('/api/api_keys/<int:key_id>/toggle', methods=['POST'])
@@ -137,6 +170,7 @@ def toggle_api_key(key_id):
     key = APIKey.query.get_or_404(key_id)
     key.is_active = not key.is_active
     db.session.commit()
+    invalidate_api_key(key.key)
     return jsonify({
         'message': f'API key {"activated" if key.is_active else "deactivated"} successfully',
         'is_active': key.is_active
@@ -146,15 +180,7 @@ def toggle_api_key(key_id):
 @app.route('/api/v1/agents', methods=['GET'])
 @require_api_key
 def api_v1_get_agents():
-    agents = Agent.query.all()
-    
-    return jsonify([{
-        'id': agent.id,
-        'name': agent.name,
-        'division': format_division(agent.division),
-        'manager': agent.manager,
-        'queue_type': agent.queue_type
-    } for agent in agents])
+    return agent_listing_response(Agent.query, ['id', 'name', 'division', 'manager', 'queue_type'])
 
 @app.route('/api/v1/performance/add', methods=['POST'])
 @require_api_key
@@ -180,69 +206,109 @@ def api_v1_add_performance():
         if not agent:
             return jsonify({'error': f'Agent with ID {data["agent_id"]} not found'}), 404
         
-        # Log agent information for debugging
-        print(f"Agent info - ID: {agent.id}, Name: {agent.name}, Division: {agent.division}, Formatted Division: {format_division(agent.division)}")
+        values = {
+            'date': date,
+            'agent_id': agent.id,
+            'leads_taken': float(data['leads_taken']),
+            'close_rate': float(data['close_rate']),
+            'place_rate': float(data['place_rate']),
+            'avg_premium': float(data['avg_premium'])
+        }
         
-        # Check if record already exists for this date and agent
-        existing = DailyPerformance.query.filter_by(
-            date=date,
-            agent_id=data['agent_id']
-        ).first()
+        # Optional fields
+        if 'talk_time_minutes' in data:
+            values['talk_time_minutes'] = int(data['talk_time_minutes'])
+        if 'notes' in data:
+            values['notes'] = data['notes']
         
-        if existing:
-            # Update existing record
-            existing.leads_taken = float(data['leads_taken'])
-            existing.close_rate = float(data['close_rate'])
-            existing.place_rate = float(data['place_rate'])
-            existing.avg_premium = float(data['avg_premium'])
-            
-            # Optional fields
-            if 'talk_time_minutes' in data:
-                existing.talk_time_minutes = int(data['talk_time_minutes'])
-            if 'notes' in data:
-                existing.notes = data['notes']
-            
-            # Calculate derived fields
-            existing.placed_premium_per_lead = existing.calculate_ppl()
-            existing.total_daily_premium = existing.calculate_daily_premium()
-            
-            db.session.commit()
-            
-            return jsonify({
-                'message': 'Performance record updated',
-                'id': existing.id
-            })
-        else:
-            # Create new record
-            performance = DailyPerformance(
-                date=date,
-                agent_id=data['agent_id'],
-                leads_taken=float(data['leads_taken']),
-                close_rate=float(data['close_rate']),
-                place_rate=float(data['place_rate']),
-                avg_premium=float(data['avg_premium'])
-            )
-            
-            # Optional fields
-            if 'talk_time_minutes' in data:
-                performance.talk_time_minutes = int(data['talk_time_minutes'])
-            if 'notes' in data:
-                performance.notes = data['notes']
-            
-            # Calculate derived fields
-            performance.placed_premium_per_lead = performance.calculate_ppl()
-            performance.total_daily_premium = performance.calculate_daily_premium()
-            
-            db.session.add(performance)
-            db.session.commit()
-            
-            return jsonify({
-                'message': 'Performance record created',
-                'id': performance.id
-            })
+        # Insert, or update the existing record for this date and agent
+        performance_id, created = upsert_performance(values)
+        refresh_rollups([date])
+        db.session.commit()
+        bump_data_version(PERFORMANCE)
+        
+        return jsonify({
+            'message': 'Performance record created' if created else 'Performance record updated',
+            'id': performance_id
+        })
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/v1/performance/changes', methods=['GET'])
+@require_api_key
+def api_v1_performance_changes():
+    """
+    Agent and performance changes after a cursor, oldest first
+
+    Query parameters: since (the cursor from the previous response; omit it
+    for a full sync) and limit (default and maximum 5000). Each change has
+    entity ('agent' or 'performance'), operation ('upsert', 'delete' or
+    'reset'), id and, for upserts, the row's current data. A reset means every
+    row of that entity was deleted. Keep requesting with the returned cursor
+    while has_more is true.
+    """
+    try:
+        cursor = parse_cursor(request.args.get('since'))
+        limit = int(request.args.get('limit') or MAX_CHANGES)
+        if not 1 <= limit <= MAX_CHANGES:
+            raise ChangeFeedError(f'limit must be between 1 and {MAX_CHANGES}')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    changes, next_cursor, has_more = changes_since(cursor, limit)
+    return jsonify({'changes': changes, 'cursor': next_cursor, 'has_more': has_more})
+
+@app.route('/api/v1/performance/batch', methods=['POST'])
+@require_api_key
+def api_v1_batch_performance():
+    """
+    Add or update many performance records in one request
+
+    Accepts a JSON array of records (same fields as /api/v1/performance/add) or
+    an NDJSON body (Content-Type: application/x-ndjson) with one record per line.
+    Valid records are written in a single transaction; the response reports
+    the outcome of each record by its position in the batch.
+    """
+    try:
+        if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+            records = []
+            for line_number, line in enumerate(request.stream, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    return jsonify({'error': f'Invalid JSON on line {line_number}'}), 400
+        else:
+            records = request.get_json(silent=True)
+            if not isinstance(records, list):
+                return jsonify({'error': 'Expected a JSON array of records'}), 400
+
+        if not records:
+            return jsonify({'error': 'No records provided'}), 400
+
+        results, dates = ingest_performance_batch(records)
+        refresh_rollups(dates)
+        db.session.commit()
+        bump_data_version(PERFORMANCE)
+
+        counts = {status: sum(1 for result in results if result['status'] == status) for status in ('created', 'updated', 'error')}
+        print(f"Batch performance import: {len(records)} records, {counts}")
+
+        return jsonify({
+            'message': f"Processed {len(records)} records: {counts['created']} created, {counts['updated']} updated, {counts['error']} errors",
+            'created': counts['created'],
+            'updated': counts['updated'],
+            'errors': counts['error'],
+            'results': results
+        })
+    except Exception as e:
+        db.session.rollback()
+        print(f"Batch performance import failed: {str(e)}")
+        return jsonify({'error': database_error_message(e)}), 500
+
 @app.route('/')
 def home():
     return render_template('home.html')
@@ -257,90 +323,124 @@ def get_performance_stats():
     start_date = request.args.get('start_date', default=datetime.now().date() - timedelta(days=30))
     end_date = request.args.get('end_date', default=datetime.now().date())
     
-    # Query performance data
-    performances = DailyPerformance.query.filter(
-        DailyPerformance.date.between(start_date, end_date)
-    ).all()
+    # Read the per-day rollups for the range
+    store = get_store()
+    totals = store.summarize_days(start_date, end_date) if store else summarize_days(start_date, end_date)
     
     # Calculate statistics
     stats = {
-        'total_agents': len(set(p.agent_id for p in performances)),
-        'avg_ppl': sum(p.calculate_ppl() for p in performances) / len(performances) if performances else 0,
-        'above_target': len([p for p in performances if p.calculate_ppl() >= 164]),
-        'at_break_even': len([p for p in performances if 130 <= p.calculate_ppl() < 164]),
-        'below_break_even': len([p for p in performances if p.calculate_ppl() < 130])
+        'total_agents': totals['total_agents'],
+        'avg_ppl': totals['ppl_sum'] / totals['row_count'] if totals['row_count'] else 0,
+        'above_target': totals['above_target'],
+        'at_break_even': totals['at_break_even'],
+        'below_break_even': totals['below_break_even']
     }
     
     return jsonify(stats)
 
 @app.route('/api/agent_performance/<int:agent_id>')
+@compressed
 def get_agent_performance(agent_id):
     agent = Agent.query.get_or_404(agent_id)
-    performances = DailyPerformance.query.filter_by(agent_id=agent_id).order_by(DailyPerformance.date.desc()).limit(30).all()
+    performances = db.session.query(
+        DailyPerformance.date, DailyPerformance.leads_taken, DailyPerformance.close_rate,
+        DailyPerformance.place_rate, DailyPerformance.avg_premium
+    ).filter_by(agent_id=agent_id).order_by(DailyPerformance.date.desc()).limit(30).all()
+    
+    # Derive PPL and status for all rows in one pass
+    metrics = compute_metrics(
+        [p.close_rate for p in performances], [p.place_rate for p in performances],
+        [p.avg_premium for p in performances], [p.leads_taken for p in performances]
+    )
+    
+    if wants_columnar():
+        return jsonify(columnar_series([p.date for p in performances], {
+            'ppl': metrics['ppl'].tolist(),
+            'leads': [p.leads_taken for p in performances],
+            'close_rate': [p.close_rate for p in performances],
+            'place_rate': [p.place_rate for p in performances],
+            'avg_premium': [p.avg_premium for p in performances],
+            'status': [STATUS_LABELS[status] for status in metrics['status'].tolist()]
+        }))
     
     data = [{
-        'date': p.date.strftime('%Y-%m-%d'),
-        'ppl': p.calculate_ppl(),
+        'date': p.date.isoformat(),
+        'ppl': ppl,
         'leads': p.leads_taken,
         'close_rate': p.close_rate,
         'place_rate': p.place_rate,
         'avg_premium': p.avg_premium,
-        'status': p.get_performance_status()
-    } for p in performances]
+        'status': STATUS_LABELS[status]
+    } for p, ppl, status in zip(performances, metrics['ppl'].tolist(), metrics['status'].tolist())]
     
     return jsonify(data)
 
 @app.route('/api/agents', methods=['GET'])
+@cached_response(AGENTS)
 def get_agents():
     # Get filter parameters
     division = request.args.get('division')
     queue = request.args.get('queue')
     manager = request.args.get('manager')
-    active_only_param = request.args.get('active_only', 'true').lower()
-    active_only = active_only_param == 'true'
-    
-    print(f"Filter params for /api/agents: division='{division}', queue='{queue}', manager='{manager}', active_only={active_only} (from {active_only_param})")
+    active_only = request.args.get('active_only', 'true').lower() == 'true'
     
     # Build query with filters
     query = Agent.query
     if division:
-        print(f"Filtering agents by division: '{division}'")
         # Get all possible database division codes that map to this display value
         division_codes = get_division_codes(division)
         if division_codes:
             # If we found database codes for this display value, filter using them
-            print(f"Found matching division codes for agents: {division_codes}")
             query = query.filter(Agent.division.in_(division_codes))
         else:
             # For other values, still use filter_by for exact match or like for partial
-            print(f"No exact match found for division '{division}', using LIKE filter")
             query = query.filter(Agent.division.ilike(f"%{division}%"))
     
     if queue:
-        print(f"Filtering agents by queue: '{queue}'")
         query = query.filter(Agent.queue_type.ilike(f"%{queue}%"))  # Case-insensitive comparison
     if manager:
-        print(f"Filtering agents by manager: '{manager}'")
         query = query.filter_by(manager=manager)
     if active_only:
-        print(f"Filtering to active agents only")
         query = query.filter_by(is_active=True)
     
-    agents = query.all()
-    print(f"Found {len(agents)} agents matching filters")
+    return agent_listing_response(query, ['id', 'name', 'division', 'manager', 'queue_type', 'is_active'])
+
+def agent_listing_response(query, default_fields):
+    """
+    Serialize an agent listing with paging, field selection and conditional GET support
     
-    if len(agents) > 0:
-        print(f"First agent: {agents[0].name}, Division: {agents[0].division}, Formatted: {format_division(agents[0].division)}")
+    Query parameters: fields (comma-separated), limit and cursor (keyset paging on id;
+    the next cursor is sent in X-Next-Cursor and a Link header) and updated_since
+    (only agents changed after that time). If-Modified-Since is answered with 304
+    when no agent was added, changed or deleted since, whether or not it matches
+    the listing's filters.
+    """
+    try:
+        options = parse_listing_args(request.args, default_fields)
+    except AgentListingError as e:
+        return jsonify({'error': str(e)}), 400
     
-    # Return agents with formatted division values using the helper function
-    return jsonify([{
-        'id': agent.id,
-        'name': agent.name,
-        'division': format_division(agent.division),
-        'manager': agent.manager,
-        'queue_type': agent.queue_type,
-        'is_active': agent.is_active
-    } for agent in agents])
+    modified = last_modified()
+    if modified and request.if_modified_since:
+        if modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None):
+            return '', 304
+    
+    agents, next_cursor = agent_page(query, **options)
+    
+    # Format each distinct division once
+    if 'division' in options['fields']:
+        formatted = {division: format_division(division) for division in {agent['division'] for agent in agents}}
+        for agent in agents:
+            agent['division'] = formatted[agent['division']]
+    
+    response = jsonify(agents)
+    if modified:
+        response.last_modified = modified
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = str(next_cursor)
+        next_url = url_for(request.endpoint, **{**request.args.to_dict(), 'cursor': next_cursor})
+        response.headers['Link'] = f'<{next_url}>; rel="next"'
+    return response
 
 @app.route('/api/add_agent', methods=['POST'])
 def add_agent():
@@ -375,6 +475,7 @@ def add_agent():
         )
         db.session.add(agent)
         db.session.commit()
+        bump_data_version(AGENTS)
         return jsonify({'message': 'Agent added successfully'})
     except Exception as e:
         return jsonify({'error': str(e)}), 400
@@ -383,23 +484,21 @@ def add_agent():
 def add_performance():
     try:
         data = request.form
-        performance = DailyPerformance(
-            date=datetime.strptime(data['date'], '%Y-%m-%d').date(),
-            agent_id=int(data['agent_id']),
-            leads_taken=float(data['leads_taken']),
-            close_rate=float(data['close_rate']),
-            place_rate=float(data['place_rate']),
-            avg_premium=float(data['avg_premium']),
-            talk_time_minutes=int(data['talk_time_minutes']) if data['talk_time_minutes'] else None,
-            notes=data['notes'] if data['notes'] else None
-        )
-        
-        # Calculate and set derived fields
-        performance.placed_premium_per_lead = performance.calculate_ppl()
-        performance.total_daily_premium = performance.calculate_daily_premium()
+        date = datetime.strptime(data['date'], '%Y-%m-%d').date()
+        upsert_performance({
+            'date': date,
+            'agent_id': int(data['agent_id']),
+            'leads_taken': float(data['leads_taken']),
+            'close_rate': float(data['close_rate']),
+            'place_rate': float(data['place_rate']),
+            'avg_premium': float(data['avg_premium']),
+            'talk_time_minutes': int(data['talk_time_minutes']) if data['talk_time_minutes'] else None,
+            'notes': data['notes'] if data['notes'] else None
+        })
         
-        db.session.add(performance)
+        refresh_rollups([date])
         db.session.commit()
+        bump_data_version(PERFORMANCE)
         return jsonify({'message': 'Performance data added successfully'})
     except Exception as e:
         return jsonify({'error': str(e)}), 400
@@ -412,15 +511,14 @@ def get_agent_stats(agent_id):
     end_date = datetime.now().date()
     start_date = end_date - timedelta(days=30)
     
-    performances = DailyPerformance.query.filter(
-        DailyPerformance.agent_id == agent_id,
-        DailyPerformance.date.between(start_date, end_date)
-    ).order_by(DailyPerformance.date.desc()).all()
+    store = get_store()
+    totals = store.summarize_agent(agent_id, start_date, end_date) if store else summarize_agent(agent_id, start_date, end_date)
+    days = totals['row_count']
     
     # Use the helper function to format the division
     formatted_division = format_division(agent.division)
     
-    if not performances:
+    if not days:
         return jsonify({
             'agent': {
                 'name': agent.name,
@@ -431,16 +529,16 @@ def get_agent_stats(agent_id):
         })
     
     # Calculate average metrics
-    avg_ppl = sum(p.calculate_ppl() for p in performances) / len(performances)
-    avg_close_rate = sum(p.close_rate for p in performances) / len(performances)
-    avg_place_rate = sum(p.place_rate for p in performances) / len(performances)
-    avg_premium = sum(p.avg_premium for p in performances) / len(performances)
-    avg_leads = sum(p.leads_taken for p in performances) / len(performances)
+    avg_ppl = totals['ppl_sum'] / days
+    avg_close_rate = totals['close_rate_sum'] / days
+    avg_place_rate = totals['place_rate_sum'] / days
+    avg_premium = totals['avg_premium_sum'] / days
+    avg_leads = totals['leads_sum'] / days
     
-    # Calculate performance distribution
-    above_target = len([p for p in performances if p.calculate_ppl() >= 164])
-    at_break_even = len([p for p in performances if 130 <= p.calculate_ppl() < 164])
-    below_break_even = len([p for p in performances if p.calculate_ppl() < 130])
+    # Performance distribution
+    above_target = totals['above_target']
+    at_break_even = totals['at_break_even']
+    below_break_even = totals['below_break_even']
     
     return jsonify({
         'agent': {
@@ -459,7 +557,7 @@ def get_agent_stats(agent_id):
                 'at_break_even': at_break_even,
                 'below_break_even': below_break_even
             },
-            'total_days': len(performances)
+            'total_days': days
         }
     })
 
@@ -472,6 +570,8 @@ def add_performance_page():
     return render_template('add_performance.html')
 
 @app.route('/api/dashboard_stats')
+@compressed
+@cached_response(AGENTS, PERFORMANCE)
 def get_dashboard_stats():
     # Get filter parameters
     division = request.args.get('division')
@@ -503,42 +603,7 @@ def get_dashboard_stats():
     print(f"Dashboard filters: division='{division}', queue='{queue}', agent_id='{agent_id}', manager='{manager}'")
     print(f"Date range: {start_date} to {end_date}")
 
-    # Build base query for agents
-    agent_query = Agent.query
-    if division:
-        print(f"Filtering by division: '{division}'")
-        # If division is a display name like "Charlotte (CLT)", convert to possible DB values
-        division_codes = get_division_codes(division)
-        if division_codes:
-            # If we found database codes for this display value, filter using them
-            print(f"Found matching division codes: {division_codes}")
-            agent_query = agent_query.filter(Agent.division.in_(division_codes))
-        else:
-            # For other values, still use LIKE for flexibility
-            print(f"No exact match found for division '{division}', using LIKE filter")
-            agent_query = agent_query.filter(Agent.division.ilike(f"%{division}%"))
-    
-    if queue:
-        print(f"Filtering by queue: '{queue}'")
-        if queue.lower() in ["training", "train", "t"]:
-            agent_query = agent_query.filter(Agent.queue_type.ilike("%training%"))
-        elif queue.lower() in ["performance", "perform", "p"]:
-            agent_query = agent_query.filter(Agent.queue_type.ilike("%performance%"))
-        else:
-            agent_query = agent_query.filter(Agent.queue_type.ilike(f"%{queue}%"))
-    
-    if agent_id:
-        print(f"Filtering by agent_id: '{agent_id}'")
-        agent_query = agent_query.filter_by(id=agent_id)
-    
-    if manager:
-        print(f"Filtering by manager: '{manager}'")
-        agent_query = agent_query.filter(Agent.manager.ilike(f"%{manager}%"))
-    
-    # Include only active agents by default
-    if 'active_only' not in request.args or request.args.get('active_only', 'true').lower() == 'true':
-        agent_query = agent_query.filter_by(is_active=True)
-        print("Filtering to active agents only")
+    agent_query = filter_dashboard_agents(request.args)
     
     agents = agent_query.all()
     print(f"Found {len(agents)} agents matching filters")
@@ -553,7 +618,7 @@ def get_dashboard_stats():
             'above_target': 0,
             'at_break_even': 0,
             'below_break_even': 0,
-            'trend': {
+            'trend': columnar_series([], {'ppls': []}) if wants_columnar() else {
                 'dates': [],
                 'ppls': []
             },
@@ -564,19 +629,13 @@ def get_dashboard_stats():
     agent_ids = [agent.id for agent in agents]
     print(f"Agent IDs: {agent_ids}")
 
-    # Get performance data for the filtered agents
-    # With PostgreSQL, we need to ensure date comparison works properly
-    performance_query = DailyPerformance.query.filter(
-        DailyPerformance.agent_id.in_(agent_ids),
-        DailyPerformance.date >= start_date,
-        DailyPerformance.date <= end_date
-    )
-    
-    # Debug the SQL query
-    print(f"Performance query: {str(performance_query)}")
-    
-    performances = performance_query.all()
-    print(f"Found {len(performances)} performance records")
+    # Aggregate performance data for the filtered agents in the database
+    store = get_store()
+    if store:
+        summary = store.summarize_performance(agent_ids, start_date, end_date)
+    else:
+        summary = summarize_performance(agent_ids, start_date, end_date)
+    print(f"Found {summary['row_count']} performance records")
 
     # Calculate statistics
     total_agents = len(agents)
@@ -585,25 +644,17 @@ def get_dashboard_stats():
     
     print(f"Agent counts - Total: {total_agents}, Training: {training_agents}, Performance: {performance_agents}")
 
-    if performances:
-        avg_ppl = sum(p.calculate_ppl() for p in performances) / len(performances)
-        above_target = len([p for p in performances if p.calculate_ppl() >= 164])
-        at_break_even = len([p for p in performances if 130 <= p.calculate_ppl() < 164])
-        below_break_even = len([p for p in performances if p.calculate_ppl() < 130])
+    if summary['row_count']:
+        avg_ppl = summary['ppl_sum'] / summary['row_count']
+        above_target = summary['above_target']
+        at_break_even = summary['at_break_even']
+        below_break_even = summary['below_break_even']
         
         print(f"Performance stats - Avg PPL: ${avg_ppl:.2f}, Above Target: {above_target}, Break Even: {at_break_even}, Below: {below_break_even}")
 
-        # Calculate trend data
-        trend_data = {}
-        for perf in performances:
-            date_str = perf.date.isoformat()
-            if date_str not in trend_data:
-                trend_data[date_str] = {'total_ppl': 0, 'count': 0}
-            trend_data[date_str]['total_ppl'] += perf.calculate_ppl()
-            trend_data[date_str]['count'] += 1
-
-        trend_dates = sorted(trend_data.keys())
-        trend_ppls = [trend_data[date]['total_ppl'] / trend_data[date]['count'] for date in trend_dates]
+        # Trend data comes back grouped by date and already sorted
+        trend_dates = [day for day, _ in summary['trend']]
+        trend_ppls = [ppl for _, ppl in summary['trend']]
         
         print(f"Trend data - {len(trend_dates)} dates from {trend_dates[0] if trend_dates else 'none'} to {trend_dates[-1] if trend_dates else 'none'}")
     else:
@@ -617,25 +668,17 @@ def get_dashboard_stats():
 
     # Calculate agent-level statistics
     agent_stats = []
+    empty_stats = {
+        'close_rate': 0,
+        'place_rate': 0,
+        'avg_premium': 0,
+        'ppl': 0,
+        'leads_taken': 0,
+        'total_premium': 0
+    }
     
     for agent in agents:
-        agent_perfs = [p for p in performances if p.agent_id == agent.id]
-        if agent_perfs:
-            avg_close_rate = sum(p.close_rate for p in agent_perfs) / len(agent_perfs)
-            avg_place_rate = sum(p.place_rate for p in agent_perfs) / len(agent_perfs)
-            avg_premium = sum(p.avg_premium for p in agent_perfs) / len(agent_perfs)
-            avg_agent_ppl = sum(p.calculate_ppl() for p in agent_perfs) / len(agent_perfs)
-            avg_leads_taken = sum(p.leads_taken for p in agent_perfs) / len(agent_perfs)
-            total_premium = sum(p.calculate_daily_premium() for p in agent_perfs)
-            print(f"Agent {agent.name} stats - PPL: ${avg_agent_ppl:.2f}, CR: {avg_close_rate:.1f}%, PR: {avg_place_rate:.1f}%, Leads: {avg_leads_taken:.1f}, Total Premium: ${total_premium:.2f}")
-        else:
-            avg_close_rate = 0
-            avg_place_rate = 0
-            avg_premium = 0
-            avg_agent_ppl = 0
-            avg_leads_taken = 0
-            total_premium = 0
-            print(f"No performance data for agent {agent.name}")
+        stats = summary['agents'].get(agent.id, empty_stats)
 
         # Use the helper function to format the division
         formatted_division = format_division(agent.division)
@@ -647,12 +690,12 @@ def get_dashboard_stats():
             'manager': agent.manager,
             'queue_type': agent.queue_type,
             'is_active': agent.is_active,
-            'close_rate': avg_close_rate,
-            'place_rate': avg_place_rate,
-            'avg_premium': avg_premium,
-            'ppl': avg_agent_ppl,
-            'leads_taken': avg_leads_taken,
-            'total_premium': total_premium
+            'close_rate': stats['close_rate'],
+            'place_rate': stats['place_rate'],
+            'avg_premium': stats['avg_premium'],
+            'ppl': stats['ppl'],
+            'leads_taken': stats['leads_taken'],
+            'total_premium': stats['total_premium']
         })
 
     # No need for second division filter - it was causing issues
@@ -666,36 +709,76 @@ def get_dashboard_stats():
         'above_target': above_target,
         'at_break_even': at_break_even,
         'below_break_even': below_break_even,
-        'trend': {
-            'dates': trend_dates,
+        'trend': columnar_series(trend_dates, {'ppls': trend_ppls}) if wants_columnar() else {
+            'dates': [day.isoformat() for day in trend_dates],
             'ppls': trend_ppls
         },
         'agents': agent_stats,
         'date_range': f"{start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}"
     })
 
+@app.route('/api/ppl_trend')
+@compressed
+@cached_response(AGENTS, PERFORMANCE)
+def get_ppl_trend():
+    """
+    Rolling PPL, close rate and place rate for each day in a date range
+
+    Query parameters: start_date and end_date (default: the last 30 days),
+    window (days; several as a comma-separated list, e.g. 7,14,30; default 7),
+    group_by ('none', 'agent', 'manager' or 'division'; default 'none') and,
+    for group_by=agent, an optional agent_ids list. All windows are computed
+    from one rollup query. Ungrouped results also include trend_data
+    (labels/values of the first window's PPL) for the dashboard chart.
+    """
+    try:
+        end_date = datetime.strptime(request.args['end_date'], '%Y-%m-%d').date() if request.args.get('end_date') else datetime.now().date()
+        start_date = datetime.strptime(request.args['start_date'], '%Y-%m-%d').date() if request.args.get('start_date') else end_date - timedelta(days=30)
+    except ValueError:
+        return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+    if start_date > end_date:
+        return jsonify({'error': 'start_date must not be after end_date'}), 400
+
+    group_by = request.args.get('group_by', 'none')
+    try:
+        agent_ids = [int(value) for value in request.args.get('agent_ids', '').split(',') if value.strip()]
+    except ValueError:
+        return jsonify({'error': 'agent_ids must be a comma-separated list of integers'}), 400
+    try:
+        windows = parse_windows(request.args.get('window'))
+        trend = rolling_trend(
+            group_by, windows, start_date, end_date, agent_ids=agent_ids,
+            label=format_division if group_by == 'division' else None
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    result = {
+        'group_by': group_by,
+        'windows': windows,
+        'dates': trend['dates'],
+        'series': trend['series'],
+        'date_range': f"{start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}"
+    }
+    if group_by == 'none':
+        result['trend_data'] = {
+            'labels': trend['dates'],
+            'values': trend['series'][0]['rolling'][str(windows[0])]['ppl']
+        }
+    return jsonify(result)
+
 @app.route('/api/agent_details/<int:agent_id>')
+@compressed
 def get_agent_details(agent_id):
     start_date = datetime.strptime(request.args.get('start_date', datetime.now().date().isoformat()), '%Y-%m-%d').date()
     end_date = datetime.strptime(request.args.get('end_date', datetime.now().date().isoformat()), '%Y-%m-%d').date()
 
     agent = Agent.query.get_or_404(agent_id)
-    performances = DailyPerformance.query.filter(
-        DailyPerformance.agent_id == agent_id,
-        DailyPerformance.date.between(start_date, end_date)
-    ).order_by(DailyPerformance.date).all()
 
     # Use the helper function to format the division
     formatted_division = format_division(agent.division)
 
-    daily_data = [{
-        'date': perf.date.strftime('%Y-%m-%d'),
-        'leads': perf.leads_taken,
-        'close_rate': perf.close_rate,
-        'place_rate': perf.place_rate,
-        'avg_premium': perf.avg_premium,
-        'ppl': perf.calculate_ppl()
-    } for perf in performances]
+    daily_data = agent_daily_data([agent_id], start_date, end_date, wants_columnar())[agent_id]
 
     return jsonify({
         'agent': {
@@ -707,6 +790,89 @@ def get_agent_details(agent_id):
         'performance_data': daily_data
     })
 
+@app.route('/api/agent_details')
+@compressed
+def get_agents_details():
+    """
+    Daily performance for several agents in one request
+
+    Query parameters: agent_ids (comma-separated) or the /api/dashboard_stats
+    agent filters (division, queue, manager, active_only), plus start_date and
+    end_date (both default to today). Every agent's rows come from a single
+    query instead of one /api/agent_details/<id> call per agent. With
+    format=columnar each agent's performance_data is a struct of arrays.
+    """
+    try:
+        start_date = datetime.strptime(request.args.get('start_date', datetime.now().date().isoformat()), '%Y-%m-%d').date()
+        end_date = datetime.strptime(request.args.get('end_date', datetime.now().date().isoformat()), '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+
+    if request.args.get('agent_ids'):
+        try:
+            agent_ids = [int(value) for value in request.args['agent_ids'].split(',') if value.strip()]
+        except ValueError:
+            return jsonify({'error': 'agent_ids must be a comma-separated list of integers'}), 400
+        agent_query = Agent.query.filter(Agent.id.in_(agent_ids))
+    else:
+        agent_query = filter_dashboard_agents(request.args)
+
+    agents = agent_query.with_entities(
+        Agent.id, Agent.name, Agent.division, Agent.manager, Agent.queue_type
+    ).order_by(Agent.id).all()
+    daily_data = agent_daily_data([agent.id for agent in agents], start_date, end_date, wants_columnar())
+
+    return jsonify({
+        'agents': [{
+            'id': agent.id,
+            'name': agent.name,
+            'division': format_division(agent.division),
+            'manager': agent.manager,
+            'queue_type': agent.queue_type,
+            'performance_data': daily_data[agent.id]
+        } for agent in agents],
+        'date_range': f"{start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}"
+    })
+
+def agent_daily_data(agent_ids, start_date, end_date, columnar=False):
+    """
+    Daily performance rows per agent, as returned by the agent details endpoints
+
+    Reads the columnar store when it is enabled, otherwise one SQL query for all agents.
+
+    Args:
+        columnar (bool): Return each agent's rows as a struct of arrays (see columnar_series)
+
+    Returns:
+        dict: {agent_id: [{date, leads, close_rate, place_rate, avg_premium, ppl}, ...]}
+              for every requested agent
+    """
+    series = {}
+    if agent_ids:
+        store = get_store()
+        if store:
+            series = store.agents_series(agent_ids, start_date, end_date)
+        else:
+            series = agents_series(agent_ids, start_date, end_date)
+
+    def format_rows(rows):
+        if columnar:
+            days, leads, close_rate, place_rate, avg_premium, ppl = (list(values) for values in zip(*rows)) if rows else ([],) * 6
+            return columnar_series(days, {
+                'leads': leads, 'close_rate': close_rate, 'place_rate': place_rate,
+                'avg_premium': avg_premium, 'ppl': ppl
+            })
+        return [{
+            'date': day.isoformat(),
+            'leads': leads,
+            'close_rate': close_rate,
+            'place_rate': place_rate,
+            'avg_premium': avg_premium,
+            'ppl': ppl
+        } for day, leads, close_rate, place_rate, avg_premium, ppl in rows]
+
+    return {agent_id: format_rows(series.get(agent_id, [])) for agent_id in agent_ids}
+
 @app.route('/agent_view')
 def agent_view():
     return render_template('agent_view.html')
@@ -729,320 +895,36 @@ def import_data():
     
     if file and allowed_file(file.filename):
         filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        # Prefix with a unique id so concurrent uploads of the same file don't collide
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{uuid.uuid4().hex}_{filename}")
         file.save(filepath)
         
+        options = {
+            'auto_create_agents': request.form.get('auto_create_agents') == 'true',
+            'agent_division': request.form.get('agent_division', 'Default Division'),
+            'agent_manager': request.form.get('agent_manager', 'Default Manager'),
+            'agent_queue': request.form.get('agent_queue', 'training'),
+            'update_existing_info': request.form.get('update_existing_info') == 'true'
+        }
+        
+        # By default the import runs in the background; poll /api/import_jobs/<id> for progress
+        if request.values.get('wait', 'false').lower() != 'true':
+            job = enqueue_import(app, filepath, filename, options)
+            return jsonify({
+                'message': 'Import queued',
+                'job_id': job.id,
+                'status_url': url_for('get_import_job', job_id=job.id)
+            }), 202
+        
         try:
             print(f"Processing file: {filename}")
-            # Determine file type and read accordingly
-            if filename.endswith('.csv'):
-                df = pd.read_csv(filepath)
-            else:
-                df = pd.read_excel(filepath)
-            
-            print(f"Original data shape: {df.shape}")
-            print(f"Original columns: {df.columns.tolist()}")
-            
-            # Clean data before processing
-            def clean_data(df):
-                # Remove rows that are likely headers or section dividers
-                # (rows where all numeric columns have non-numeric values)
-                numeric_cols = ['close_rate', 'place_rate', 'avg_premium', 'leads_taken']
-                
-                # First filter out rows where agent_name is empty or contains header-like text
-                df = df[df['agent_name'].notna()]  # Remove rows with empty agent_name
-                print(f"After removing empty agent_name rows: {df.shape}")
-                
-                df = df[~df['agent_name'].astype(str).str.contains('TRAINING|QUEUE|agent|name', case=False)]
-                print(f"After removing header-like rows: {df.shape}")
-                
-                # Rename columns to match expected names if needed
-                rename_map = {
-                    'Sales Agent': 'agent_name',
-                    'Close Rate': 'close_rate',
-                    'AP Per Sale': 'avg_premium',
-                    'Placed Rate': 'place_rate',
-                    'Leads Per Day': 'leads_taken'
-                }
-                df = df.rename(columns=rename_map)
-                print(f"After renaming columns: {df.columns.tolist()}")
-                
-                # Check if numeric columns contain column names
-                for col in numeric_cols:
-                    if col in df.columns:
-                        # Remove rows where the value is the same as the column name (header rows)
-                        df = df[~(df[col].astype(str).str.lower() == col.lower())]
-                        df = df[~(df[col].astype(str).str.lower().str.contains('rate|premium|leads|per'))]
-                
-                print(f"After removing header value rows: {df.shape}")
-                
-                # Remove % symbols and convert to float
-                if 'close_rate' in df.columns:
-                    print(f"close_rate before cleaning: {df['close_rate'].head().tolist()}")
-                    df['close_rate'] = df['close_rate'].astype(str).str.replace('%', '').str.strip()
-                    # Remove any non-numeric rows
-                    df = df[pd.to_numeric(df['close_rate'], errors='coerce').notna()]
-                    df['close_rate'] = df['close_rate'].astype(float)
-                    print(f"close_rate after cleaning: {df['close_rate'].head().tolist()}")
-                    
-                if 'place_rate' in df.columns:
-                    df['place_rate'] = df['place_rate'].astype(str).str.replace('%', '').str.strip()
-                    df = df[pd.to_numeric(df['place_rate'], errors='coerce').notna()]
-                    df['place_rate'] = df['place_rate'].astype(float)
-                
-                # Remove $ symbols and convert to float
-                if 'avg_premium' in df.columns:
-                    print(f"avg_premium before cleaning: {df['avg_premium'].head().tolist()}")
-                    df['avg_premium'] = df['avg_premium'].astype(str).str.replace('$', '').str.replace(',', '').str.strip()
-                    df = df[pd.to_numeric(df['avg_premium'], errors='coerce').notna()]
-                    df['avg_premium'] = df['avg_premium'].astype(float)
-                    print(f"avg_premium after cleaning: {df['avg_premium'].head().tolist()}")
-                
-                # Convert leads_taken to float
-                if 'leads_taken' in df.columns:
-                    print(f"leads_taken before cleaning: {df['leads_taken'].head().tolist()}")
-                    df['leads_taken'] = pd.to_numeric(df['leads_taken'], errors='coerce')
-                    df = df[df['leads_taken'].notna()]
-                    print(f"leads_taken after cleaning: {df['leads_taken'].head().tolist()}")
-                
-                print(f"Final data shape after cleaning: {df.shape}")
-                print(f"Final columns: {df.columns.tolist()}")
-                # Return the cleaned dataframe
-                return df
-            
-            # Clean data
-            df = clean_data(df)
-            
-            # Validate required columns
-            required_columns = ['date', 'agent_name', 'leads_taken', 'close_rate', 'place_rate', 'avg_premium']
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            if missing_columns:
-                return jsonify({'error': f'Missing required columns: {", ".join(missing_columns)}'}), 400
-            
-            # Check if auto-create agents is enabled
-            auto_create_agents = request.form.get('auto_create_agents') == 'true'
-            agent_division = request.form.get('agent_division', 'Default Division')
-            default_manager = request.form.get('agent_manager', 'Default Manager')
-            agent_queue = request.form.get('agent_queue', 'training')
-            update_existing_info = request.form.get('update_existing_info') == 'true'
-            
-            # Check if we have manager info in the data
-            has_manager_column = 'manager' in df.columns or 'MANAGER' in df.columns
-            manager_column = 'manager' if 'manager' in df.columns else ('MANAGER' if 'MANAGER' in df.columns else None)
-            
-            # Check if we have other agent info in the data
-            has_division_column = 'division' in df.columns or 'Site' in df.columns
-            division_column = 'division' if 'division' in df.columns else ('Site' if 'Site' in df.columns else None)
-            
-            has_queue_column = 'queue_type' in df.columns or 'Q' in df.columns
-            queue_column = 'queue_type' if 'queue_type' in df.columns else ('Q' if 'Q' in df.columns else None)
-            
-            # Function to normalize manager names
-            def normalize_manager_name(name):
-                if pd.isna(name) or not name:
-                    return ''
-                # Convert to string in case it's not
-                name = str(name).strip()
-                # Normalize case
-                name = name.title()
-                # Handle common variations
-                name_map = {
-                    'Fred Holguin': 'Frederick Holguin',
-                    'Fred': 'Frederick Holguin',
-                    'Holguin': 'Frederick Holguin',
-                    'Vince Blanchett': 'Vincent Blanchett',
-                    'Vince': 'Vincent Blanchett',
-                    'Blanchett': 'Vincent Blanchett',
-                    'Pat Lewis': 'Patricia Lewis',
-                    'Patty Lewis': 'Patricia Lewis',
-                    'Pat': 'Patricia Lewis',
-                    'Lewis': 'Patricia Lewis',
-                    'Hajmahmoud': 'Nisrin Hajmahmoud',
-                    'Nisrin': 'Nisrin Hajmahmoud'
-                    # Add other common variations here
-                }
-                # Check if this name matches any known variation
-                for variation, full_name in name_map.items():
-                    if variation.lower() in name.lower():
-                        return full_name
-                return name
-            
-            # Apply name normalization if we have manager column
-            if manager_column:
-                df[manager_column] = df[manager_column].apply(normalize_manager_name)
-            
-            # Handle possible inconsistent manager names by determining most common manager per agent
-            agent_managers = {}
-            if manager_column:
-                for agent_name, group in df.groupby('agent_name'):
-                    if manager_column in group.columns:
-                        # Count manager occurrences for this agent
-                        manager_counts = {}
-                        for manager in group[manager_column].dropna():
-                            if manager not in manager_counts:
-                                manager_counts[manager] = 0
-                            manager_counts[manager] += 1
-                        
-                        # Get the most common manager for this agent
-                        if manager_counts:
-                            most_common_manager = max(manager_counts.items(), key=lambda x: x[1])[0]
-                            agent_managers[agent_name] = most_common_manager
-            
-            # Process data
-            success_count = 0
-            error_count = 0
-            errors = []
-            created_agents = []
-            updated_info_agents = []
-            manager_changes = []
-            
-            for index, row in df.iterrows():
-                try:
-                    # Look up agent by name
-                    agent = Agent.query.filter_by(name=row['agent_name']).first()
-                    
-                    # Extract agent info from data if available
-                    agent_manager = default_manager
-                    if row['agent_name'] in agent_managers:
-                        # Use the most common manager for this agent
-                        agent_manager = agent_managers[row['agent_name']]
-                    elif manager_column and pd.notna(row.get(manager_column, '')):
-                        agent_manager = row[manager_column]
-                    
-                    agent_div = agent_division
-                    if division_column and pd.notna(row.get(division_column, '')):
-                        agent_div = row[division_column]
-                    
-                    agent_q = agent_queue
-                    if queue_column and pd.notna(row.get(queue_column, '')):
-                        # Map 'T' to 'training' and 'P' to 'performance'
-                        if row[queue_column] == 'T':
-                            agent_q = 'training'
-                        elif row[queue_column] == 'P':
-                            agent_q = 'performance'
-                        else:
-                            agent_q = row[queue_column]
-                    
-                    # Auto-create agent if enabled and agent not found
-                    if not agent and auto_create_agents:
-                        agent = Agent(
-                            name=row['agent_name'],
-                            division=agent_div,
-                            manager=agent_manager,
-                            queue_type=agent_q
-                        )
-                        db.session.add(agent)
-                        db.session.flush()  # Get ID without committing
-                        created_agents.append(f"{agent.name} (Manager: {agent.manager})")
-                    # Update existing agent information if the option is enabled
-                    elif agent and update_existing_info:
-                        updated_info = False
-                        manager_changed = False
-                        old_manager = agent.manager
-                        
-                        if agent.manager != agent_manager:
-                            agent.manager = agent_manager
-                            updated_info = True
-                            manager_changed = True
-                            manager_changes.append({
-                                'agent_name': agent.name,
-                                'change': f"{old_manager} → {agent.manager}"
-                            })
-                        if agent.division != agent_div:
-                            agent.division = agent_div
-                            updated_info = True
-                        if agent.queue_type != agent_q:
-                            agent.queue_type = agent_q
-                            updated_info = True
-                        
-                        if updated_info:
-                            update_info = agent.name
-                            if manager_changed:
-                                update_info = f"{agent.name} (Manager: {old_manager} → {agent.manager})"
-                            updated_info_agents.append(update_info)
-                    elif not agent:
-                        errors.append(f"Row {index+1}: Agent '{row['agent_name']}' not found")
-                        error_count += 1
-                        continue
-                    
-                    # Parse date
-                    try:
-                        if isinstance(row['date'], str):
-                            date = datetime.strptime(row['date'], '%Y-%m-%d').date()
-                        else:
-                            date = row['date'].date() if hasattr(row['date'], 'date') else row['date']
-                    except Exception as e:
-                        errors.append(f"Row {index+1}: Invalid date format. Use YYYY-MM-DD")
-                        error_count += 1
-                        continue
-                    
-                    # Check if data for this agent+date already exists
-                    existing = DailyPerformance.query.filter_by(agent_id=agent.id, date=date).first()
-                    if existing:
-                        # Update existing record
-                        existing.leads_taken = float(row['leads_taken'])
-                        existing.close_rate = float(row['close_rate'])
-                        existing.place_rate = float(row['place_rate'])
-                        existing.avg_premium = float(row['avg_premium'])
-                        existing.placed_premium_per_lead = existing.calculate_ppl()
-                        existing.total_daily_premium = existing.calculate_daily_premium()
-                        
-                        # Optional fields
-                        if 'talk_time_minutes' in row and not pd.isna(row['talk_time_minutes']):
-                            existing.talk_time_minutes = int(row['talk_time_minutes'])
-                        if 'notes' in row and not pd.isna(row['notes']):
-                            existing.notes = row['notes']
-                        
-                        success_count += 1
-                    else:
-                        # Create new record
-                        performance = DailyPerformance(
-                            date=date,
-                            agent_id=agent.id,
-                            leads_taken=float(row['leads_taken']),
-                            close_rate=float(row['close_rate']),
-                            place_rate=float(row['place_rate']),
-                            avg_premium=float(row['avg_premium'])
-                        )
-                        
-                        # Optional fields
-                        if 'talk_time_minutes' in row and not pd.isna(row['talk_time_minutes']):
-                            performance.talk_time_minutes = int(row['talk_time_minutes'])
-                        if 'notes' in row and not pd.isna(row['notes']):
-                            performance.notes = row['notes']
-                        
-                        # Calculate derived fields
-                        performance.placed_premium_per_lead = performance.calculate_ppl()
-                        performance.total_daily_premium = performance.calculate_daily_premium()
-                        
-                        db.session.add(performance)
-                        success_count += 1
-                
-                except Exception as e:
-                    errors.append(f"Row {index+1}: {str(e)}")
-                    error_count += 1
-            
-            db.session.commit()
-            
-            # Prepare response message
-            message = f'Import completed: {success_count} records imported successfully, {error_count} errors'
-            if created_agents:
-                message += f'. Created {len(created_agents)} new agents: {", ".join(created_agents[:5])}'
-                if len(created_agents) > 5:
-                    message += f' and {len(created_agents) - 5} more'
-            
-            if updated_info_agents:
-                message += f'. Updated info for {len(updated_info_agents)} agents: {", ".join(updated_info_agents[:5])}'
-                if len(updated_info_agents) > 5:
-                    message += f' and {len(updated_info_agents) - 5} more'
-            
-            return jsonify({
-                'message': message,
-                'errors': errors,
-                'manager_changes': manager_changes
-            })
-            
+            # Read, clean and commit the file in fixed-size chunks
+            return jsonify(run_import(filepath, options))
+        except ImportValidationError as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 400
         except Exception as e:
+            db.session.rollback()
             return jsonify({'error': f'Error processing file: {str(e)}'}), 500
         finally:
             # Clean up uploaded file
@@ -1051,6 +933,13 @@ def import_data():
     
     return jsonify({'error': 'Invalid file type. Please upload a CSV or Excel file'}), 400
 
+@app.route('/api/import_jobs/<job_id>')
+def get_import_job(job_id):
+    job = ImportJob.query.get_or_404(job_id)
+    if job.status in ('queued', 'running') and fail_stale_jobs(job_id):
+        db.session.refresh(job)
+    return jsonify(job_status(job))
+
 @app.route('/api/data/reset', methods=['POST'])
 def reset_data():
     try:
@@ -1062,18 +951,27 @@ def reset_data():
         
         if reset_type == 'performance_only':
             # Delete only performance data
+            clear_rollups()
+            mark_reset()
+            record_reset(PERFORMANCE_ENTITY)
             rows_deleted = db.session.query(DailyPerformance).delete()
             db.session.commit()
+            bump_data_version(PERFORMANCE)
             return jsonify({
                 'message': f'Successfully deleted all performance data ({rows_deleted} records)',
                 'reset_type': 'performance_only'
             })
         elif reset_type == 'complete':
             # Delete all data including agents and API keys
+            clear_rollups()
+            mark_reset()
+            record_reset(PERFORMANCE_ENTITY, AGENT_ENTITY)
             perf_rows = db.session.query(DailyPerformance).delete()
             agent_rows = db.session.query(Agent).delete()
             api_key_rows = db.session.query(APIKey).delete()
             db.session.commit()
+            invalidate_api_key()
+            bump_data_version(AGENTS, PERFORMANCE)
             return jsonify({
                 'message': f'Successfully deleted all data: {perf_rows} performance records, {agent_rows} agents, {api_key_rows} API keys',
                 'reset_type': 'complete'
@@ -1090,6 +988,7 @@ def toggle_agent_active(agent_id):
         agent = Agent.query.get_or_404(agent_id)
         agent.is_active = not agent.is_active
         db.session.commit()
+        bump_data_version(AGENTS)
         
         status = 'activated' if agent.is_active else 'deactivated'
         return jsonify({
@@ -1104,6 +1003,60 @@ def toggle_agent_active(agent_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+def filter_dashboard_agents(args):
+    """
+    Agent query with the dashboard filters applied
+
+    Args:
+        args (MultiDict): Request query parameters (division, queue, agent_id, manager, active_only)
+
+    Returns:
+        Query: Agent query; active agents only unless active_only=false
+    """
+    division = args.get('division')
+    queue = args.get('queue')
+    agent_id = args.get('agent_id')
+    manager = args.get('manager')
+    
+    # Build base query for agents
+    agent_query = Agent.query
+    if division:
+        print(f"Filtering by division: '{division}'")
+        # If division is a display name like "Charlotte (CLT)", convert to possible DB values
+        division_codes = get_division_codes(division)
+        if division_codes:
+            # If we found database codes for this display value, filter using them
+            print(f"Found matching division codes: {division_codes}")
+            agent_query = agent_query.filter(Agent.division.in_(division_codes))
+        else:
+            # For other values, still use LIKE for flexibility
+            print(f"No exact match found for division '{division}', using LIKE filter")
+            agent_query = agent_query.filter(Agent.division.ilike(f"%{division}%"))
+    
+    if queue:
+        print(f"Filtering by queue: '{queue}'")
+        if queue.lower() in ["training", "train", "t"]:
+            agent_query = agent_query.filter(Agent.queue_type.ilike("%training%"))
+        elif queue.lower() in ["performance", "perform", "p"]:
+            agent_query = agent_query.filter(Agent.queue_type.ilike("%performance%"))
+        else:
+            agent_query = agent_query.filter(Agent.queue_type.ilike(f"%{queue}%"))
+    
+    if agent_id:
+        print(f"Filtering by agent_id: '{agent_id}'")
+        agent_query = agent_query.filter_by(id=agent_id)
+    
+    if manager:
+        print(f"Filtering by manager: '{manager}'")
+        agent_query = agent_query.filter(Agent.manager.ilike(f"%{manager}%"))
+    
+    # Include only active agents by default
+    if 'active_only' not in args or args.get('active_only', 'true').lower() == 'true':
+        agent_query = agent_query.filter_by(is_active=True)
+        print("Filtering to active agents only")
+    
+    return agent_query
+
 # Define a helper function for division formatting
 def format_division(division_code):
     """
@@ -1155,38 +1108,159 @@ def get_division_codes(display_value):
     codes = [code for code, value in division_map.items() if value == display_value]
     return codes
 
+def add_missing_column(table, column, ddl):
+    """ALTER TABLE ... ADD COLUMN when the column does not exist yet"""
+    columns = [existing['name'] for existing in db.inspect(db.engine).get_columns(table)]
+    if column not in columns:
+        print(f"Adding {column} column to {table} table...")
+        with db.engine.begin() as conn:
+            conn.execute(db.text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+        print(f"{column} column added successfully.")
+
+def migrate_agent_columns():
+    add_missing_column('agent', 'is_active', 'BOOLEAN DEFAULT 1')
+    add_missing_column('agent', 'created_at', 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP')
+    add_missing_column('agent', 'last_updated', 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP')
+    add_missing_column('agent', 'change_seq', 'BIGINT')
+
+def migrate_performance_columns():
+    add_missing_column('daily_performance', 'change_seq', 'BIGINT')
+
+def migrate_import_job_columns():
+    add_missing_column('import_job', 'filepath', 'VARCHAR(500)')
+    add_missing_column('import_job', 'heartbeat_at', 'TIMESTAMP')
+
+def migrate_performance_indexes():
+    """
+    Add the (agent_id, date) unique index, the date index and the change_seq index if missing
+
+    Returns:
+        bool: True if duplicate rows were removed (the rollups were rebuilt with them)
+    """
+    removed = False
+    indexes = [index['name'] for index in db.inspect(db.engine).get_indexes('daily_performance')]
+    for index in DailyPerformance.__table__.indexes:
+        if index.name in indexes:
+            continue
+        if index.unique:
+            # Keep only the latest record for each agent and date before enforcing uniqueness
+            print("Removing duplicate agent/date performance records...")
+            duplicates = db.session.execute(db.text(
+                "SELECT id FROM daily_performance WHERE id NOT IN "
+                "(SELECT MAX(id) FROM daily_performance GROUP BY agent_id, date)"
+            )).scalars().all()
+            if duplicates:
+                record_deletes(PERFORMANCE_ENTITY, duplicates)
+                db.session.execute(db.text(
+                    "DELETE FROM daily_performance WHERE id NOT IN "
+                    "(SELECT MAX(id) FROM daily_performance GROUP BY agent_id, date)"
+                ))
+                rebuild_rollups()
+                mark_reset()
+                removed = True
+            db.session.commit()
+            print(f"Removed {len(duplicates)} duplicate records.")
+        print(f"Creating index {index.name}...")
+        index.create(bind=db.engine)
+        print(f"Index {index.name} created successfully.")
+    return removed
+
+def migrate_agent_indexes():
+    # The last_updated index used by agent listings' Last-Modified checks and the change_seq index
+    agent_indexes = [index['name'] for index in db.inspect(db.engine).get_indexes('agent')]
+    for index in Agent.__table__.indexes:
+        if index.name not in agent_indexes:
+            print(f"Creating index {index.name}...")
+            index.create(bind=db.engine)
+
+def stamp_change_sequences():
+    # Stamp rows written before change sequences existed so the change feed's full sync includes them
+    for table in (Agent.__table__, DailyPerformance.__table__):
+        if db.session.query(table.c.id).filter(table.c.change_seq.is_(None)).first():
+            print(f"Stamping {table.name} rows with a change sequence value...")
+            values = {'change_seq': next_value()}
+            if 'last_updated' in table.c:
+                # Not a real change, so keep Last-Modified / updated_since as they were
+                values['last_updated'] = table.c.last_updated
+            db.session.execute(table.update().where(table.c.change_seq.is_(None)).values(**values))
+            db.session.commit()
+
 def init_db():
+    """
+    Create missing tables and bring an existing database up to date
+
+    Each migration step runs on its own, so one failure does not skip the
+    independent steps after it. Steps that depend on a failed one are
+    skipped, and init_db raises once every step has been tried.
+    """
     with app.app_context():
+        existing_tables = db.inspect(db.engine).get_table_names()
         db.create_all()
         
-        # Add missing columns to agent table if they don't exist
-        try:
-            inspector = db.inspect(db.engine)
-            columns = [column['name'] for column in inspector.get_columns('agent')]
-            
-            # Add is_active column if missing
-            if 'is_active' not in columns:
-                print("Adding is_active column to agent table...")
-                with db.engine.begin() as conn:
-                    conn.execute(db.text("ALTER TABLE agent ADD COLUMN is_active BOOLEAN DEFAULT 1"))
-                print("is_active column added successfully.")
-                
-            # Add created_at column if missing
-            if 'created_at' not in columns:
-                print("Adding created_at column to agent table...")
-                with db.engine.begin() as conn:
-                    conn.execute(db.text("ALTER TABLE agent ADD COLUMN created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP"))
-                print("created_at column added successfully.")
-                
-            # Add last_updated column if missing
-            if 'last_updated' not in columns:
-                print("Adding last_updated column to agent table...")
-                with db.engine.begin() as conn:
-                    conn.execute(db.text("ALTER TABLE agent ADD COLUMN last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP"))
-                print("last_updated column added successfully.")
-                
-        except Exception as e:
-            print(f"Error during migration: {str(e)}")
+        # Seed the manager alias table with the built-in nicknames
+        if 'manager_alias' not in existing_tables:
+            seed_aliases()
+        
+        failed = []
+        
+        def step(name, func, requires=()):
+            blocked = [dependency for dependency in requires if dependency in failed]
+            if blocked:
+                print(f"Skipping migration step {name}: {', '.join(blocked)} failed")
+                failed.append(name)
+                return None
+            try:
+                return func()
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error during migration step {name}: {str(e)}")
+                failed.append(name)
+                return None
+        
+        step('agent columns', migrate_agent_columns)
+        step('performance columns', migrate_performance_columns)
+        
+        # The rollups read the calculated fields, so fill them before any rollup is built
+        backfilled = step('derived fields', backfill_derived_fields, requires=['performance columns'])
+        
+        deduplicated = step('performance indexes', migrate_performance_indexes,
+                            requires=['performance columns', 'derived fields'])
+        
+        # Build the rollups when they are missing (new tables, or an earlier build failed)
+        # or rebuild them for backfilled rows, unless removing duplicates just did
+        def build_rollups():
+            missing = (db.session.query(DailyRollup.date).first() is None
+                       and db.session.query(DailyPerformance.id).first() is not None)
+            if missing or (backfilled and not deduplicated):
+                print("Building performance rollups...")
+                rows = rebuild_rollups()
+                print(f"Rollups built from {rows} performance records.")
+        step('rollups', build_rollups, requires=['derived fields'])
+        
+        step('agent indexes', migrate_agent_indexes, requires=['agent columns'])
+        step('change sequences', stamp_change_sequences, requires=['agent columns', 'performance columns'])
+        step('import job columns', migrate_import_job_columns)
+        step('stale import jobs', fail_stale_jobs, requires=['import job columns'])
+        
+        bump_data_version(AGENTS, PERFORMANCE)
+        
+        if failed:
+            raise RuntimeError(f"Database migration incomplete; failed steps: {', '.join(failed)}")
+
+@app.cli.command('backfill-derived-fields')
+def backfill_derived_fields_command():
+    """Fill NULL placed_premium_per_lead / total_daily_premium values in batches."""
+    rows = backfill_derived_fields()
+    print(f"Backfilled {rows} performance records.")
+    if rows:
+        rows = rebuild_rollups()
+        print(f"Rollups rebuilt from {rows} performance records.")
+
+@app.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    """Rebuild the performance rollup tables from daily_performance."""
+    rows = rebuild_rollups()
+    print(f"Rollups rebuilt from {rows} performance records.")
 
 # Add a custom template filter for current year
 @app.template_filter('current_year')
@@ -1209,10 +1283,22 @@ def run_migration():
 def reset_database():
     try:
         with app.app_context():
+            # Keep the change sequences so change feed cursors stay valid
+            sequences = current_values()
+            db.session.commit()
             # Drop all tables
             db.drop_all()
             # Recreate all tables
             db.create_all()
+            if sequences:
+                db.session.execute(ChangeSequence.__table__.insert(), [
+                    {'name': name, 'value': value} for name, value in sequences.items()
+                ])
+            mark_reset()
+            record_reset(PERFORMANCE_ENTITY, AGENT_ENTITY)
+            db.session.commit()
+            invalidate_api_key()
+            bump_data_version(AGENTS, PERFORMANCE)
             
         return jsonify({
             'message': 'Database has been completely reset. All existing data has been removed and tables recreated.'
@@ -1228,14 +1314,22 @@ def reset_data_redirect():
     
     if reset_type == "reset_performance":
         # Delete all performance data
+        clear_rollups()
+        mark_reset()
+        record_reset(PERFORMANCE_ENTITY)
         db.session.query(DailyPerformance).delete()
         db.session.commit()
+        bump_data_version(PERFORMANCE)
         flash("Performance data has been reset.", "success")
     elif reset_type == "reset_all":
         # Delete all data, including agents
+        clear_rollups()
+        mark_reset()
+        record_reset(PERFORMANCE_ENTITY, AGENT_ENTITY)
         db.session.query(DailyPerformance).delete()
         db.session.query(Agent).delete()
         db.session.commit()
+        bump_data_version(AGENTS, PERFORMANCE)
         flash("All data has been reset.", "success")
     
     return redirect(url_for("home"))
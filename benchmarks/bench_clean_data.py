@@ -0,0 +1,140 @@
+"""
+Micro-benchmark: data_cleaning.clean_data vs. the original per-request clean_data
+
+Builds a synthetic Looker export (with repeated header rows, section dividers
+and formatted numbers), checks both functions return the same rows and values,
+then times them.
+
+Usage:
+    python benchmarks/bench_clean_data.py [rows] [repeats]
+"""
+import os
+import sys
+import time
+import contextlib
+import io
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_cleaning import clean_data
+
+
+def legacy_clean_data(df):
+    """clean_data as it was nested in app.import_data, kept as the benchmark baseline"""
+    # Remove rows that are likely headers or section dividers
+    # (rows where all numeric columns have non-numeric values)
+    numeric_cols = ['close_rate', 'place_rate', 'avg_premium', 'leads_taken']
+
+    # First filter out rows where agent_name is empty or contains header-like text
+    df = df[df['agent_name'].notna()]  # Remove rows with empty agent_name
+    print(f"After removing empty agent_name rows: {df.shape}")
+
+    df = df[~df['agent_name'].astype(str).str.contains('TRAINING|QUEUE|agent|name', case=False)]
+    print(f"After removing header-like rows: {df.shape}")
+
+    # Rename columns to match expected names if needed
+    rename_map = {
+        'Sales Agent': 'agent_name',
+        'Close Rate': 'close_rate',
+        'AP Per Sale': 'avg_premium',
+        'Placed Rate': 'place_rate',
+        'Leads Per Day': 'leads_taken'
+    }
+    df = df.rename(columns=rename_map)
+    print(f"After renaming columns: {df.columns.tolist()}")
+
+    # Check if numeric columns contain column names
+    for col in numeric_cols:
+        if col in df.columns:
+            # Remove rows where the value is the same as the column name (header rows)
+            df = df[~(df[col].astype(str).str.lower() == col.lower())]
+            df = df[~(df[col].astype(str).str.lower().str.contains('rate|premium|leads|per'))]
+
+    print(f"After removing header value rows: {df.shape}")
+
+    # Remove % symbols and convert to float
+    if 'close_rate' in df.columns:
+        print(f"close_rate before cleaning: {df['close_rate'].head().tolist()}")
+        df['close_rate'] = df['close_rate'].astype(str).str.replace('%', '').str.strip()
+        # Remove any non-numeric rows
+        df = df[pd.to_numeric(df['close_rate'], errors='coerce').notna()]
+        df['close_rate'] = df['close_rate'].astype(float)
+        print(f"close_rate after cleaning: {df['close_rate'].head().tolist()}")
+
+    if 'place_rate' in df.columns:
+        df['place_rate'] = df['place_rate'].astype(str).str.replace('%', '').str.strip()
+        df = df[pd.to_numeric(df['place_rate'], errors='coerce').notna()]
+        df['place_rate'] = df['place_rate'].astype(float)
+
+    # Remove $ symbols and convert to float
+    if 'avg_premium' in df.columns:
+        print(f"avg_premium before cleaning: {df['avg_premium'].head().tolist()}")
+        df['avg_premium'] = df['avg_premium'].astype(str).str.replace('$', '').str.replace(',', '').str.strip()
+        df = df[pd.to_numeric(df['avg_premium'], errors='coerce').notna()]
+        df['avg_premium'] = df['avg_premium'].astype(float)
+        print(f"avg_premium after cleaning: {df['avg_premium'].head().tolist()}")
+
+    # Convert leads_taken to float
+    if 'leads_taken' in df.columns:
+        print(f"leads_taken before cleaning: {df['leads_taken'].head().tolist()}")
+        df['leads_taken'] = pd.to_numeric(df['leads_taken'], errors='coerce')
+        df = df[df['leads_taken'].notna()]
+        print(f"leads_taken after cleaning: {df['leads_taken'].head().tolist()}")
+
+    print(f"Final data shape after cleaning: {df.shape}")
+    print(f"Final columns: {df.columns.tolist()}")
+    # Return the cleaned dataframe
+    return df
+
+
+def synthetic_export(rows, seed=0):
+    """A Looker-style export with a header row repeated every 500 rows and TRAINING dividers"""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'date': pd.date_range('2024-01-01', periods=rows, freq='min').strftime('%Y-%m-%d'),
+        'agent_name': [f"Rep {i}" for i in rng.integers(0, 300, rows)],
+        'leads_taken': rng.integers(4, 10, rows),
+        'close_rate': [f"{value:.1f}%" for value in rng.uniform(10, 30, rows)],
+        'place_rate': [f"{value:.1f}%" for value in rng.uniform(50, 75, rows)],
+        'avg_premium': [f"${value:,.2f}" for value in rng.uniform(900, 1400, rows)],
+        'manager': rng.choice(['Fred', 'Vince Blanchett', 'Pat Lewis', 'Nisrin'], rows)
+    })
+    df = df.astype(object)
+    header = ['date', 'agent_name', 'leads_taken', 'close_rate', 'place_rate', 'avg_premium', 'manager']
+    df.iloc[::500] = header
+    df.iloc[250::500, 1] = 'TRAINING QUEUE'
+    df.iloc[125::1000, 1] = None
+    return df
+
+
+def best_of(function, df, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = function(df)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    df = synthetic_export(rows)
+
+    legacy_time, expected = best_of(legacy_clean_data, df, repeats)
+    engine_time, actual = best_of(clean_data, df, repeats)
+
+    pd.testing.assert_frame_equal(
+        actual.astype({'leads_taken': float}), expected.astype({'leads_taken': float})
+    )
+
+    print(f"rows={rows} kept={len(actual)}")
+    print(f"legacy clean_data:  {legacy_time * 1000:8.1f} ms")
+    print(f"compiled plan:      {engine_time * 1000:8.1f} ms  ({legacy_time / engine_time:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
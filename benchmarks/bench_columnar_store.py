@@ -0,0 +1,90 @@
+"""
+Micro-benchmark: columnar_store.ColumnarStore queries on a synthetic dataset
+
+Loads the store directly from generated column arrays (no database) and times
+the dashboard, performance and agent queries. The target for the dashboard
+summary is under 10 ms at 1M rows.
+
+Usage:
+    python benchmarks/bench_columnar_store.py [rows] [agents] [repeats]
+"""
+import os
+import sys
+import time
+from datetime import date, timedelta
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from columnar_store import ColumnarStore
+from metrics import calculate_ppl
+
+
+def synthetic_columns(rows, agents, seed=7):
+    """One row per agent per day, ending today, with plausible metric ranges"""
+    rng = np.random.default_rng(seed)
+    days = -(-rows // agents)
+    end = date.today().toordinal()
+    day = np.repeat(np.arange(end - days + 1, end + 1), agents)[:rows]
+    agent_id = np.tile(np.arange(1, agents + 1), days)[:rows]
+    columns = {
+        'row_id': rng.permutation(rows).astype(np.int64) + 1,
+        'agent_id': agent_id.astype(np.int64),
+        'day': day.astype(np.int64),
+        'leads': rng.uniform(3, 12, rows).round(),
+        'close_rate': rng.uniform(10, 40, rows),
+        'place_rate': rng.uniform(50, 90, rows),
+        'avg_premium': rng.uniform(800, 1800, rows)
+    }
+    columns['ppl'] = calculate_ppl(columns['close_rate'], columns['place_rate'], columns['avg_premium'])
+    return columns
+
+
+def best_of(function, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    agents = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    repeats = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+
+    columns = synthetic_columns(rows, agents)
+    store = ColumnarStore()
+    load_time, _ = best_of(lambda: store.load(dict(columns)), 1)
+
+    today = date.today()
+    month = today - timedelta(days=30)
+    first = date.fromordinal(int(columns['day'].min()))
+    half = list(range(1, agents + 1, 2))
+
+    cases = [
+        ('dashboard, 30 days, all agents', lambda: store.summarize_performance(range(1, agents + 1), month, today)),
+        ('dashboard, 30 days, half the agents', lambda: store.summarize_performance(half, month, today)),
+        ('dashboard, full history', lambda: store.summarize_performance(range(1, agents + 1), first, today)),
+        ('performance stats, 30 days', lambda: store.summarize_days(month, today)),
+        ('agent stats, 30 days', lambda: store.summarize_agent(1, month, today)),
+        ('agent details, full history', lambda: store.agent_series(1, first, today))
+    ]
+
+    print(f"rows={rows} agents={agents} days={len(np.unique(columns['day']))}")
+    print(f"{'load (sort + index)':40s} {load_time * 1000:8.1f} ms")
+    for name, function in cases:
+        elapsed, _ = best_of(function, repeats)
+        print(f"{name:40s} {elapsed * 1000:8.2f} ms")
+
+    # Full-history check against a plain NumPy computation
+    summary = store.summarize_performance(range(1, agents + 1), first, today)
+    ppl = (columns['close_rate'] / 100) * (columns['place_rate'] / 100) * columns['avg_premium']
+    assert summary['row_count'] == rows
+    assert np.isclose(summary['ppl_sum'], ppl.sum())
+    assert summary['above_target'] == np.count_nonzero(ppl >= 164)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+"""
+Micro-benchmark: intent_parser against the original keyword scans in ai_insights
+
+Checks the parser against the golden corpus in intent_corpus.json (query type
+and query_info for each question), then times both implementations on the
+corpus questions and on every prefix of them, as autocomplete would send
+while the user types.
+
+Usage:
+    python benchmarks/bench_intent_parser.py [repeats]
+    python benchmarks/bench_intent_parser.py --update-corpus
+        Rewrites the expected values from the original implementation
+"""
+import os
+import re
+import sys
+import json
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intent_parser import parse_intent
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'intent_corpus.json')
+
+
+LEGACY_QUERY_PATTERNS = {
+    r"(?i).*top.*(agent|performer).*": {
+        "query": "get_top_agents",
+        "description": "Shows top performing agents based on PPL"
+    },
+    r"(?i).*worst.*(agent|performer).*": {
+        "query": "get_bottom_agents",
+        "description": "Shows agents with the lowest PPL"
+    },
+    r"(?i).*average.*(ppl|per person lead).*": {
+        "query": "get_average_ppl",
+        "description": "Calculates average PPL across all agents"
+    },
+    r"(?i).*performance.*(trend|over time).*": {
+        "query": "get_performance_trend",
+        "description": "Shows performance trend over time"
+    },
+    r"(?i).*division.*(performance|comparison).*": {
+        "query": "get_division_comparison",
+        "description": "Compares performance across divisions"
+    },
+    r"(?i).*highest.*(close rate|conversion).*": {
+        "query": "get_highest_close_rate",
+        "description": "Identifies agents with highest close rates"
+    },
+    r"(?i).*(best|top|highest|best performing).*manager.*": {
+        "query": "get_top_managers",
+        "description": "Shows top performing managers based on team PPL"
+    },
+    r"(?i).*(worst|bottom|lowest|worst performing).*manager.*": {
+        "query": "get_bottom_managers",
+        "description": "Shows managers with the lowest team PPL"
+    },
+    r"(?i).*average.*team.*ppl.*manager.*": {
+        "query": "get_manager_ppl",
+        "description": "Calculates average PPL by manager"
+    },
+    r"(?i).*manager.*performance.*": {
+        "query": "get_manager_performance",
+        "description": "Analyzes performance metrics by manager"
+    }
+}
+
+
+def legacy_analyze_question(question):
+    """ai_insights.analyze_question as it was before intent_parser, kept as the benchmark baseline"""
+    question = question.lower()
+
+    # Dictionary to track what we've identified in the question
+    query_info = {
+        'target': None,         # What data we're looking for (agents, managers, performance metrics)
+        'metric': None,         # Which metric to analyze (PPL, close rate, etc.)
+        'filter_division': None, # Filter by division
+        'filter_manager': None, # Filter by manager
+        'filter_queue': None,   # Filter by queue type
+        'time_period': 30,      # Default to last 30 days
+        'comparison': None,     # Comparison type (above/below target, comparison between divisions)
+        'limit': 5,             # Default to top/bottom 5 results
+        'sort_direction': 'DESC'# Default to descending order (highest first)
+    }
+
+    # Extract metrics
+    metrics = {
+        'ppl': ['ppl', 'placed premium per lead', 'placed premium', 'premium per lead'],
+        'close_rate': ['close rate', 'close percentage', 'closing percentage', 'close', 'closes'],
+        'place_rate': ['place rate', 'placement rate', 'place percentage', 'placement'],
+        'avg_premium': ['average premium', 'avg premium', 'premium', 'average policy premium'],
+        'leads': ['leads', 'lead count', 'number of leads', 'lead volume'],
+    }
+
+    for metric_key, terms in metrics.items():
+        if any(term in question for term in terms):
+            query_info['metric'] = metric_key
+            break
+
+    # If no specific metric found, default to PPL
+    if not query_info['metric']:
+        query_info['metric'] = 'ppl'
+
+    # Extract target (what we're looking for)
+    if any(x in question for x in ['manager', 'team lead', 'supervisor', 'team']):
+        query_info['target'] = 'managers'
+    elif any(x in question for x in ['who', 'which agent', 'top agent', 'best agent', 'worst agent']):
+        query_info['target'] = 'agents'
+    elif any(x in question for x in ['division', 'location', 'site', 'charlotte', 'austin']):
+        query_info['target'] = 'divisions'
+    elif any(x in question for x in ['average', 'avg', 'mean']):
+        query_info['target'] = 'average'
+    else:
+        query_info['target'] = 'agents'  # Default
+
+    # Extract time period
+    time_periods = {
+        7: ['week', 'last 7 days', '7 days'],
+        14: ['two weeks', 'last 14 days', '14 days', 'fortnight'],
+        30: ['month', 'last 30 days', '30 days', 'last month'],
+        90: ['quarter', 'last 90 days', '90 days', 'last quarter', 'three months']
+    }
+
+    for days, terms in time_periods.items():
+        if any(term in question for term in terms):
+            query_info['time_period'] = days
+            break
+
+    # Extract division filter
+    if 'charlotte' in question or 'cha' in question or 'clt' in question:
+        query_info['filter_division'] = 'CHA'
+    elif 'austin' in question or 'aus' in question or 'atx' in question:
+        query_info['filter_division'] = 'AUS'
+
+    # Extract queue type filter
+    if 'training' in question or 'train' in question:
+        query_info['filter_queue'] = 'training'
+    elif 'performance' in question or 'perform' in question:
+        query_info['filter_queue'] = 'performance'
+
+    # Extract comparison
+    if 'above target' in question or 'above break even' in question or 'exceeding' in question:
+        query_info['comparison'] = 'above_target'
+    elif 'below target' in question or 'below break even' in question or 'under' in question:
+        query_info['comparison'] = 'below_target'
+    elif 'compare' in question:
+        query_info['comparison'] = 'compare'
+
+        # If comparing divisions
+        if 'charlotte' in question and 'austin' in question:
+            query_info['target'] = 'divisions'
+            query_info['comparison'] = 'compare_divisions'
+
+    # Extract sort direction
+    if any(x in question for x in ['top', 'best', 'highest', 'most']):
+        query_info['sort_direction'] = 'DESC'
+    elif any(x in question for x in ['bottom', 'worst', 'lowest', 'least']):
+        query_info['sort_direction'] = 'ASC'
+
+    # Extract limit (how many results to return)
+    limit_match = re.search(r'top (\d+)', question)
+    if limit_match:
+        query_info['limit'] = int(limit_match.group(1))
+    else:
+        limit_match = re.search(r'(\d+) best', question)
+        if limit_match:
+            query_info['limit'] = int(limit_match.group(1))
+
+    return query_info
+
+
+def legacy_parse_intent(question):
+    """Query type and query_info as process_ai_query computed them before intent_parser"""
+    query_type = None
+    for pattern, info in LEGACY_QUERY_PATTERNS.items():
+        if re.match(pattern, question):
+            query_type = info["query"]
+            break
+    return query_type, legacy_analyze_question(question)
+
+
+def load_corpus():
+    with open(CORPUS_PATH) as f:
+        return json.load(f)
+
+
+def update_corpus():
+    corpus = load_corpus()
+    for entry in corpus:
+        entry['query_type'], entry['query_info'] = legacy_parse_intent(entry['question'])
+    with open(CORPUS_PATH, 'w') as f:
+        json.dump(corpus, f, indent=2)
+        f.write('\n')
+    print(f"Updated {len(corpus)} entries in {CORPUS_PATH}")
+
+
+def check_corpus(corpus):
+    failures = 0
+    for entry in corpus:
+        expected = (entry['query_type'], entry['query_info'])
+        for name, parse in (('intent_parser', parse_intent), ('legacy', legacy_parse_intent)):
+            actual = parse(entry['question'])
+            if actual != expected:
+                failures += 1
+                print(f"{name} mismatch for {entry['question']!r}:\n  expected {expected}\n  actual   {actual}")
+    return failures
+
+
+def best_of(function, questions, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for question in questions:
+            function(question)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    if '--update-corpus' in sys.argv:
+        update_corpus()
+        return
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    corpus = load_corpus()
+    failures = check_corpus(corpus)
+    if failures:
+        sys.exit(f"{failures} golden corpus mismatches")
+
+    questions = [entry['question'] for entry in corpus]
+    keystrokes = [question[:length] for question in questions for length in range(1, len(question) + 1)]
+
+    print(f"corpus={len(questions)} questions, {len(keystrokes)} keystroke prefixes, all match")
+    for label, inputs in (('questions', questions), ('keystrokes', keystrokes)):
+        legacy_time = best_of(legacy_parse_intent, inputs, repeats)
+        parser_time = best_of(parse_intent, inputs, repeats)
+        print(f"{label}:")
+        print(f"  legacy keyword scans: {len(inputs) / legacy_time:10.0f} /s  ({legacy_time / len(inputs) * 1e6:6.1f} us each)")
+        print(f"  intent_parser:        {len(inputs) / parser_time:10.0f} /s  ({parser_time / len(inputs) * 1e6:6.1f} us each, "
+              f"{legacy_time / parser_time:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
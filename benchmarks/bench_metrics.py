@@ -0,0 +1,94 @@
+"""
+Micro-benchmark: metrics.compute_metrics vs. the per-object DailyPerformance methods
+
+Builds unsaved DailyPerformance objects, computes PPL, daily premium, annual
+comp and status with calculate_ppl() / calculate_daily_premium() /
+calculate_annual_comp() / get_performance_status() per object, then with one
+compute_metrics() call, checks the results agree and prints the timings.
+
+Usage:
+    python benchmarks/bench_metrics.py [rows] [repeats]
+"""
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import DailyPerformance
+from metrics import compute_metrics, STATUS_LABELS
+
+
+def synthetic_rows(rows, seed=7):
+    rng = np.random.default_rng(seed)
+    return {
+        'leads_taken': rng.uniform(3, 12, rows).round(),
+        'close_rate': rng.uniform(10, 40, rows),
+        'place_rate': rng.uniform(50, 90, rows),
+        'avg_premium': rng.uniform(800, 1800, rows)
+    }
+
+
+def per_object(performances):
+    """The pattern the endpoints used: one method call per metric per row"""
+    return (
+        [p.calculate_ppl() for p in performances],
+        [p.calculate_daily_premium() for p in performances],
+        [p.calculate_annual_comp() for p in performances],
+        [p.get_performance_status() for p in performances]
+    )
+
+
+def batched(columns):
+    metrics = compute_metrics(
+        columns['close_rate'], columns['place_rate'], columns['avg_premium'], columns['leads_taken']
+    )
+    return metrics['ppl'], metrics['daily_premium'], metrics['annual_comp'], metrics['status']
+
+
+def best_of(function, argument, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function(argument)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    columns = synthetic_rows(rows)
+    performances = [
+        DailyPerformance(leads_taken=leads, close_rate=close_rate, place_rate=place_rate, avg_premium=avg_premium)
+        for leads, close_rate, place_rate, avg_premium in zip(
+            columns['leads_taken'].tolist(), columns['close_rate'].tolist(),
+            columns['place_rate'].tolist(), columns['avg_premium'].tolist()
+        )
+    ]
+
+    object_time, expected = best_of(per_object, performances, repeats)
+    batch_time, actual = best_of(batched, columns, repeats)
+
+    # Includes pulling the columns out of the objects, as an endpoint reading ORM rows would
+    def from_objects(performances):
+        return batched({
+            column: [getattr(p, column) for p in performances]
+            for column in ('leads_taken', 'close_rate', 'place_rate', 'avg_premium')
+        })
+    extract_time, _ = best_of(from_objects, performances, repeats)
+
+    for expected_values, actual_values in zip(expected[:3], actual[:3]):
+        assert np.allclose(expected_values, actual_values)
+    assert expected[3] == [STATUS_LABELS[code] for code in actual[3]]
+
+    print(f"rows={rows}")
+    print(f"per-object methods:          {object_time * 1000:8.1f} ms")
+    print(f"compute_metrics (arrays):    {batch_time * 1000:8.1f} ms  ({object_time / batch_time:.0f}x)")
+    print(f"compute_metrics (from ORM):  {extract_time * 1000:8.1f} ms  ({object_time / extract_time:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+import heapq
+from sqlalchemy import select, insert, or_, and_
+from models import db, Agent, DailyPerformance, ChangeLog
+from sequences import next_value, current_values, PERFORMANCE_SEQUENCE
+
+# Entities reported by the feed
+AGENT_ENTITY = 'agent'
+PERFORMANCE_ENTITY = 'performance'
+
+# Largest page a client can ask for with limit=...
+MAX_CHANGES = 5000
+
+# Within one sequence value, deletes come first, then agents, then performance rows
+LOG_RANK, AGENT_RANK, PERFORMANCE_RANK = 0, 1, 2
+
+AGENT_COLUMNS = ['id', 'name', 'division', 'manager', 'queue_type', 'is_active', 'created_at', 'last_updated']
+
+PERFORMANCE_COLUMNS = [
+    'id', 'date', 'agent_id', 'leads_taken', 'close_rate', 'place_rate', 'avg_premium',
+    'talk_time_minutes', 'notes', 'placed_premium_per_lead', 'total_daily_premium'
+]
+
+
+class ChangeFeedError(ValueError):
+    """Raised for an invalid since cursor or limit"""
+
+
+def record_deletes(entity, ids):
+    """Add delete entries for rows removed in the current transaction"""
+    ids = list(ids)
+    if ids:
+        seq = next_value()
+        db.session.execute(insert(ChangeLog), [
+            {'seq': seq, 'entity': entity, 'operation': 'delete', 'entity_id': entity_id} for entity_id in ids
+        ])
+
+
+def record_reset(*entities):
+    """Add reset entries for tables emptied in the current transaction"""
+    seq = next_value()
+    db.session.execute(insert(ChangeLog), [
+        {'seq': seq, 'entity': entity, 'operation': 'reset', 'entity_id': None} for entity in entities
+    ])
+
+
+def parse_cursor(value):
+    """
+    Read a since= cursor
+
+    Cursors returned by the feed look like "seq.rank.id". A plain number N
+    means "everything after sequence value N"; a missing cursor starts from
+    the beginning.
+
+    Returns:
+        tuple: (seq, rank, id)
+
+    Raises:
+        ChangeFeedError: If the cursor is malformed
+    """
+    if not value:
+        return (0, PERFORMANCE_RANK + 1, 0)
+    try:
+        parts = [int(part) for part in value.split('.')]
+    except ValueError:
+        raise ChangeFeedError('Invalid since cursor')
+    if len(parts) == 1:
+        return (parts[0], PERFORMANCE_RANK + 1, 0)
+    if len(parts) != 3:
+        raise ChangeFeedError('Invalid since cursor')
+    return tuple(parts)
+
+
+def format_cursor(position):
+    return '.'.join(str(part) for part in position)
+
+
+def _window(seq_column, id_column, rank, cursor, upper):
+    """Rows of the source with this rank that sort after the cursor, up to sequence value upper"""
+    seq, cursor_rank, cursor_id = cursor
+    if rank < cursor_rank:
+        after = seq_column > seq
+    elif rank > cursor_rank:
+        after = seq_column >= seq
+    else:
+        after = or_(seq_column > seq, and_(seq_column == seq, id_column > cursor_id))
+    return and_(after, seq_column <= upper)
+
+
+def _serialize(row, columns):
+    values = {}
+    for column in columns:
+        value = getattr(row, column)
+        values[column] = value.isoformat() if hasattr(value, 'isoformat') else value
+    return values
+
+
+def changes_since(cursor, limit):
+    """
+    Inserts, updates and deletes after the cursor, in commit order
+
+    Agents and performance rows that still exist are read through their
+    change_seq, so each appears once with its current values however often it
+    changed. Deletes and resets come from the change log. Changes that share a
+    sequence value (one import chunk, say) are ordered by rank and id, so a
+    page can end in the middle of one.
+
+    Sequence values are committed in order, so reading the current value
+    first and stopping there means no later query can see a commit that an
+    earlier one missed.
+
+    Args:
+        cursor (tuple): (seq, rank, id) from parse_cursor
+        limit (int): Maximum number of changes to return
+
+    Returns:
+        tuple: (list of change dicts, cursor to resume from, whether more changes remain)
+    """
+    upper = current_values().get(PERFORMANCE_SEQUENCE, 0)
+    sources = [
+        (LOG_RANK, select(ChangeLog.id, ChangeLog.seq, ChangeLog.entity, ChangeLog.operation, ChangeLog.entity_id)
+         .where(_window(ChangeLog.seq, ChangeLog.id, LOG_RANK, cursor, upper))
+         .order_by(ChangeLog.seq, ChangeLog.id), lambda row: (row.seq, {
+             'entity': row.entity, 'operation': row.operation, 'id': row.entity_id
+         })),
+        (AGENT_RANK, select(*[getattr(Agent, column) for column in AGENT_COLUMNS], Agent.change_seq)
+         .where(_window(Agent.change_seq, Agent.id, AGENT_RANK, cursor, upper))
+         .order_by(Agent.change_seq, Agent.id), lambda row: (row.change_seq, {
+             'entity': AGENT_ENTITY, 'operation': 'upsert', 'id': row.id, 'data': _serialize(row, AGENT_COLUMNS)
+         })),
+        (PERFORMANCE_RANK, select(*[getattr(DailyPerformance, column) for column in PERFORMANCE_COLUMNS],
+                                  DailyPerformance.change_seq)
+         .where(_window(DailyPerformance.change_seq, DailyPerformance.id, PERFORMANCE_RANK, cursor, upper))
+         .order_by(DailyPerformance.change_seq, DailyPerformance.id), lambda row: (row.change_seq, {
+             'entity': PERFORMANCE_ENTITY, 'operation': 'upsert', 'id': row.id, 'data': _serialize(row, PERFORMANCE_COLUMNS)
+         }))
+    ]
+
+    # Each source is already in (seq, id) order; read at most limit + 1 from each and merge
+    streams = []
+    for rank, query, convert in sources:
+        entries = []
+        for row in db.session.execute(query.limit(limit + 1)):
+            seq, change = convert(row)
+            entries.append(((seq, rank, row.id), change))
+        streams.append(entries)
+
+    changes = []
+    position = cursor
+    merged = heapq.merge(*streams, key=lambda entry: entry[0])
+    for key, change in merged:
+        if len(changes) == limit:
+            return changes, format_cursor(position), True
+        change['seq'] = key[0]
+        changes.append(change)
+        position = key
+    return changes, format_cursor(position), False
@@ -0,0 +1,310 @@
+import os
+import threading
+from collections import namedtuple
+from datetime import date
+import numpy as np
+from sqlalchemy import select
+from models import db, DailyPerformance
+from sequences import current_values, PERFORMANCE_SEQUENCE, PERFORMANCE_RESET
+from metrics import bucket_counts
+
+# Set ANALYTICS_ENGINE=columnar to answer the dashboard analytics from memory.
+# Each worker process keeps its own copy (about 60 bytes per performance row).
+ANALYTICS_ENGINE = os.environ.get('ANALYTICS_ENGINE', 'sql')
+
+# Rows fetched per round trip when loading the store
+LOAD_BATCH_SIZE = 50000
+
+COLUMNS = ['row_id', 'agent_id', 'day', 'leads', 'close_rate', 'place_rate', 'avg_premium', 'ppl']
+
+# Immutable view of the store; refreshes build a new one and swap it in
+Snapshot = namedtuple('Snapshot', [
+    'row_id', 'agent_code', 'day', 'leads', 'close_rate', 'place_rate', 'avg_premium', 'ppl',
+    'agent_ids', 'id_order', 'hwm', 'reset'
+])
+
+
+def _ordinal(value):
+    """Date, datetime or YYYY-MM-DD string as a proleptic Gregorian ordinal"""
+    if isinstance(value, str):
+        value = date.fromisoformat(value[:10])
+    return value.toordinal()
+
+
+def _to_arrays(rows):
+    """Column arrays from (id, agent_id, date, leads, close, place, premium, ppl) tuples"""
+    if not rows:
+        return {column: np.empty(0, dtype=np.int64 if column in ('row_id', 'agent_id', 'day') else np.float64)
+                for column in COLUMNS}
+    row_id, agent_id, day, leads, close_rate, place_rate, avg_premium, ppl = zip(*rows)
+    return {
+        'row_id': np.array(row_id, dtype=np.int64),
+        'agent_id': np.array(agent_id, dtype=np.int64),
+        'day': np.fromiter((d.toordinal() for d in day), dtype=np.int64, count=len(day)),
+        'leads': np.array(leads, dtype=np.float64),
+        'close_rate': np.array(close_rate, dtype=np.float64),
+        'place_rate': np.array(place_rate, dtype=np.float64),
+        'avg_premium': np.array(avg_premium, dtype=np.float64),
+        'ppl': np.array(ppl, dtype=np.float64)
+    }
+
+
+def _concat(parts):
+    return {column: np.concatenate([part[column] for part in parts]) for column in COLUMNS}
+
+
+class ColumnarStore:
+    """
+    daily_performance held as NumPy column arrays sorted by date
+
+    Date ranges become a binary search over the day column and per-agent or
+    per-day groups are reduced with np.bincount. The store catches up with
+    the database from the 'performance' change sequence high-water mark:
+    only rows stamped after the last refresh are fetched. A reset (bulk
+    delete) forces a full reload.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    # Loading
+
+    def load(self, columns, hwm=0, reset=0):
+        """Replace the contents with the given column arrays (see COLUMNS)"""
+        order = np.lexsort((columns['row_id'], columns['day']))
+        columns = {column: values[order] for column, values in columns.items()}
+        self._snapshot = self._build(columns, hwm, reset)
+
+    def _build(self, columns, hwm, reset):
+        agent_ids = np.unique(columns['agent_id'])
+        return Snapshot(
+            row_id=columns['row_id'],
+            agent_code=np.searchsorted(agent_ids, columns['agent_id']),
+            day=columns['day'],
+            leads=columns['leads'],
+            close_rate=columns['close_rate'],
+            place_rate=columns['place_rate'],
+            avg_premium=columns['avg_premium'],
+            ppl=columns['ppl'],
+            agent_ids=agent_ids,
+            id_order=np.argsort(columns['row_id'], kind='stable'),
+            hwm=hwm,
+            reset=reset
+        )
+
+    def _fetch(self, *filters):
+        """Read performance rows in batches and return them as column arrays"""
+        query = select(
+            DailyPerformance.id, DailyPerformance.agent_id, DailyPerformance.date,
+            DailyPerformance.leads_taken, DailyPerformance.close_rate,
+            DailyPerformance.place_rate, DailyPerformance.avg_premium, DailyPerformance.placed_premium_per_lead
+        ).where(*filters).execution_options(yield_per=LOAD_BATCH_SIZE)
+        parts = [_to_arrays(rows) for rows in db.session.execute(query).partitions()]
+        return _concat(parts) if parts else _to_arrays([])
+
+    def refresh(self):
+        """Bring the store up to date with the database (one small query when nothing changed)"""
+        sequences = current_values()
+        hwm = sequences.get(PERFORMANCE_SEQUENCE, 0)
+        reset = sequences.get(PERFORMANCE_RESET, 0)
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.reset == reset and snapshot.hwm == hwm:
+                return
+            if snapshot is None or snapshot.reset != reset or hwm < snapshot.hwm:
+                print("Loading columnar performance store...")
+                self.load(self._fetch(), hwm, reset)
+                print(f"Columnar store loaded {len(self._snapshot.row_id)} rows")
+                return
+
+            changed = self._fetch(DailyPerformance.change_seq > snapshot.hwm)
+            self._snapshot = self._merge(snapshot, changed, hwm, reset)
+
+    def _merge(self, snapshot, changed, hwm, reset):
+        """New snapshot with changed rows applied: updates in place, inserts merged by date"""
+        columns = {
+            'row_id': snapshot.row_id, 'agent_id': snapshot.agent_ids[snapshot.agent_code], 'day': snapshot.day,
+            'leads': snapshot.leads, 'close_rate': snapshot.close_rate,
+            'place_rate': snapshot.place_rate, 'avg_premium': snapshot.avg_premium, 'ppl': snapshot.ppl
+        }
+
+        # Rows already in the store keep their position (agent and date never change)
+        sorted_ids = snapshot.row_id[snapshot.id_order]
+        found = np.searchsorted(sorted_ids, changed['row_id'])
+        known = found < len(sorted_ids)
+        known[known] = sorted_ids[found[known]] == changed['row_id'][known]
+        if known.any():
+            positions = snapshot.id_order[found[known]]
+            columns = {column: values.copy() for column, values in columns.items()}
+            for column in ('leads', 'close_rate', 'place_rate', 'avg_premium', 'ppl'):
+                columns[column][positions] = changed[column][known]
+
+        if known.all():
+            # Updates only: the ordering, agent codes and id index are unchanged
+            return snapshot._replace(
+                leads=columns['leads'], close_rate=columns['close_rate'], place_rate=columns['place_rate'],
+                avg_premium=columns['avg_premium'], ppl=columns['ppl'], hwm=hwm, reset=reset
+            )
+
+        columns = _concat([columns, {column: values[~known] for column, values in changed.items()}])
+        order = np.lexsort((columns['row_id'], columns['day']))
+        columns = {column: values[order] for column, values in columns.items()}
+        return self._build(columns, hwm, reset)
+
+    # Queries
+
+    def _range(self, snapshot, start_date, end_date):
+        """Slice of rows between two dates (inclusive)"""
+        lo, hi = np.searchsorted(snapshot.day, [_ordinal(start_date), _ordinal(end_date) + 1])
+        return slice(lo, hi)
+
+    def _agent_mask(self, snapshot, rows, agent_ids):
+        """Boolean mask over rows for the given agent ids"""
+        wanted = np.isin(snapshot.agent_ids, np.fromiter(agent_ids, dtype=np.int64))
+        return wanted[snapshot.agent_code[rows]]
+
+    def _totals(self, snapshot, rows, mask=None):
+        """Metric totals named like rollups.METRIC_COLUMNS"""
+        def pick(values):
+            values = values[rows]
+            return values if mask is None else values[mask]
+
+        ppl = pick(snapshot.ppl)
+        leads = pick(snapshot.leads)
+        return {
+            'row_count': int(len(ppl)),
+            'leads_sum': float(leads.sum()),
+            'close_rate_sum': float(pick(snapshot.close_rate).sum()),
+            'place_rate_sum': float(pick(snapshot.place_rate).sum()),
+            'avg_premium_sum': float(pick(snapshot.avg_premium).sum()),
+            'ppl_sum': float(ppl.sum()),
+            'total_premium_sum': float((leads * ppl).sum()),
+            **bucket_counts(ppl)
+        }
+
+    def summarize_performance(self, agent_ids, start_date, end_date):
+        """Same result as aggregations.summarize_performance, computed in memory"""
+        snapshot = self._snapshot
+        rows = self._range(snapshot, start_date, end_date)
+        mask = self._agent_mask(snapshot, rows, agent_ids)
+
+        everyone = mask.all()
+
+        def pick(values):
+            # Slices are views; only copy when some agents are filtered out
+            return values[rows] if everyone else values[rows][mask]
+
+        codes = pick(snapshot.agent_code)
+        ppl = pick(snapshot.ppl)
+        leads = pick(snapshot.leads)
+        size = len(snapshot.agent_ids)
+
+        counts = np.bincount(codes, minlength=size)
+        sums = {
+            name: np.bincount(codes, weights=values, minlength=size)
+            for name, values in (
+                ('close_rate', pick(snapshot.close_rate)),
+                ('place_rate', pick(snapshot.place_rate)),
+                ('avg_premium', pick(snapshot.avg_premium)),
+                ('ppl', ppl),
+                ('leads_taken', leads),
+                ('total_premium', leads * ppl)
+            )
+        }
+
+        agents = {}
+        for code in np.flatnonzero(counts):
+            count = counts[code]
+            agents[int(snapshot.agent_ids[code])] = {
+                'row_count': int(count),
+                'close_rate': float(sums['close_rate'][code] / count),
+                'place_rate': float(sums['place_rate'][code] / count),
+                'avg_premium': float(sums['avg_premium'][code] / count),
+                'ppl': float(sums['ppl'][code] / count),
+                'leads_taken': float(sums['leads_taken'][code] / count),
+                'total_premium': float(sums['total_premium'][code])
+            }
+
+        days = pick(snapshot.day)
+        trend = []
+        if len(days):
+            first = days[0]
+            day_counts = np.bincount(days - first)
+            day_ppl = np.bincount(days - first, weights=ppl)
+            trend = [
+                (date.fromordinal(int(first + offset)), float(day_ppl[offset] / day_counts[offset]))
+                for offset in np.flatnonzero(day_counts)
+            ]
+
+        return {
+            'agents': agents,
+            'row_count': int(len(ppl)),
+            'ppl_sum': float(ppl.sum()),
+            **bucket_counts(ppl),
+            'trend': trend
+        }
+
+    def summarize_days(self, start_date, end_date):
+        """Same result as rollups.summarize_days, computed in memory"""
+        snapshot = self._snapshot
+        rows = self._range(snapshot, start_date, end_date)
+        totals = self._totals(snapshot, rows)
+        totals['total_agents'] = int(np.count_nonzero(np.bincount(snapshot.agent_code[rows], minlength=1)))
+        return totals
+
+    def summarize_agent(self, agent_id, start_date, end_date):
+        """Same result as rollups.summarize_agent, computed in memory"""
+        snapshot = self._snapshot
+        rows = self._range(snapshot, start_date, end_date)
+        return self._totals(snapshot, rows, self._agent_mask(snapshot, rows, [agent_id]))
+
+    def agent_series(self, agent_id, start_date, end_date):
+        """
+        One agent's daily rows in date order
+
+        Returns:
+            list: (date, leads, close_rate, place_rate, avg_premium, ppl) tuples
+        """
+        return self.agents_series([agent_id], start_date, end_date).get(agent_id, [])
+
+    def agents_series(self, agent_ids, start_date, end_date):
+        """
+        Daily rows for several agents, grouped by agent and in date order
+
+        Returns:
+            dict: {agent_id: [(date, leads, close_rate, place_rate, avg_premium, ppl), ...]}
+                  for the agents that have rows in the range
+        """
+        snapshot = self._snapshot
+        rows = self._range(snapshot, start_date, end_date)
+        mask = self._agent_mask(snapshot, rows, agent_ids)
+        codes = snapshot.agent_code[rows][mask]
+        # Rows are in date order, so a stable sort by agent keeps each agent's rows in date order
+        order = np.argsort(codes, kind='stable')
+        columns = [
+            values[rows][mask][order].tolist() for values in (
+                snapshot.day, snapshot.leads, snapshot.close_rate,
+                snapshot.place_rate, snapshot.avg_premium, snapshot.ppl
+            )
+        ]
+        series = {}
+        for agent_id, row in zip(snapshot.agent_ids[codes[order]].tolist(), zip(*columns)):
+            series.setdefault(agent_id, []).append((date.fromordinal(row[0]),) + row[1:])
+        return series
+
+
+_store = ColumnarStore()
+
+
+def get_store():
+    """
+    The refreshed in-memory store, or None when ANALYTICS_ENGINE is not 'columnar'
+
+    Callers fall back to the SQL rollups when this returns None.
+    """
+    if ANALYTICS_ENGINE != 'columnar':
+        return None
+    _store.refresh()
+    return _store
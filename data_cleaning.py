@@ -0,0 +1,117 @@
+import re
+from collections import namedtuple
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+# Looker export headers and the column names the importer expects
+RENAME_MAP = {
+    'Sales Agent': 'agent_name',
+    'Close Rate': 'close_rate',
+    'AP Per Sale': 'avg_premium',
+    'Placed Rate': 'place_rate',
+    'Leads Per Day': 'leads_taken'
+}
+
+# Characters stripped from each numeric column before it is coerced
+NUMERIC_COLUMNS = {
+    'close_rate': '%',
+    'place_rate': '%',
+    'avg_premium': '$,',
+    'leads_taken': None  # coerced as-is
+}
+
+# Agent names that mark repeated header rows or section dividers
+HEADER_AGENT_PATTERN = re.compile('TRAINING|QUEUE|agent|name', re.IGNORECASE)
+
+# Values in a numeric column that show the row is a repeated header
+HEADER_VALUE_WORDS = 'rate|premium|leads|per'
+
+CleaningPlan = namedtuple('CleaningPlan', ['rename_map', 'has_agent_name', 'numeric_steps'])
+NumericStep = namedtuple('NumericStep', ['column', 'header_pattern', 'strip_pattern'])
+
+
+@lru_cache(maxsize=64)
+def build_plan(columns):
+    """
+    Compile the normalization plan for one header signature
+
+    Cached per tuple of column names, so repeated imports of the same export
+    layout (and every chunk of a streamed file) reuse the compiled plan.
+
+    Args:
+        columns (tuple): Column names as they appear in the file
+
+    Returns:
+        CleaningPlan: Renames to apply, whether agent_name is present and, for each
+            numeric column present, its header-row pattern and the characters to strip
+    """
+    rename_map = {old: new for old, new in RENAME_MAP.items() if old in columns}
+    renamed = [rename_map.get(column, column) for column in columns]
+
+    numeric_steps = []
+    for column, strip_chars in NUMERIC_COLUMNS.items():
+        if column not in renamed:
+            continue
+        header_pattern = re.compile(f"^{re.escape(column)}$|{HEADER_VALUE_WORDS}")
+        strip_pattern = f"[{re.escape(strip_chars)}]" if strip_chars else None
+        numeric_steps.append(NumericStep(column, header_pattern, strip_pattern))
+
+    return CleaningPlan(rename_map, 'agent_name' in renamed, tuple(numeric_steps))
+
+
+def _factorize(series):
+    """Split a column into integer codes and its distinct values (missing values get code -1)"""
+    codes, uniques = pd.factorize(series)
+    return codes, pd.Series(uniques, dtype=object)
+
+
+def _take(codes, values, missing):
+    """Expand per-distinct-value results back to one entry per row"""
+    values = np.append(np.asarray(values), missing)
+    return values[codes]  # code -1 picks the appended missing value
+
+
+def clean_data(df):
+    """
+    Drop header-like and divider rows, rename Looker columns and coerce the numeric columns
+
+    Exports repeat the same agent names and rates on many rows, so each column
+    is factorized and the string work (one conversion, one header check and one
+    numeric coercion) runs once per distinct value. Every row filter is
+    row-local, so the per-column masks are combined and applied in a single
+    selection at the end.
+    """
+    plan = build_plan(tuple(df.columns))
+    if plan.rename_map:
+        df = df.rename(columns=plan.rename_map)
+
+    keep = np.ones(len(df), dtype=bool)
+    if plan.has_agent_name:
+        # Remove rows with an empty agent_name or header-like text
+        codes, names = _factorize(df['agent_name'])
+        header_like = names.astype(str).str.contains(HEADER_AGENT_PATTERN).to_numpy()
+        keep &= _take(codes, ~header_like, False)
+
+    converted = {}
+    for step in plan.numeric_steps:
+        codes, uniques = _factorize(df[step.column])
+        text = uniques.astype(str).str.lower()
+
+        # Remove rows where the value repeats the column name or a header word
+        header_like = text.str.contains(step.header_pattern).to_numpy()
+
+        if step.strip_pattern:
+            values = pd.to_numeric(text.str.replace(step.strip_pattern, '', regex=True).str.strip(), errors='coerce')
+            values = values.astype(float)
+        else:
+            values = pd.to_numeric(uniques, errors='coerce')
+        values = _take(codes, values.to_numpy(), np.nan)
+
+        keep &= _take(codes, ~header_like, False) & ~pd.isna(values)
+        converted[step.column] = values
+
+    df = df[keep].assign(**{column: values[keep] for column, values in converted.items()})
+
+    print(f"Data shape after cleaning: {df.shape}, columns: {df.columns.tolist()}")
+    return df
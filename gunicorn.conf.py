@@ -0,0 +1,11 @@
+# Loaded automatically by gunicorn from the working directory.
+import os
+
+# Streamed AI answers keep a request open for the whole Claude call, so use
+# threaded workers: a stream then holds one thread instead of a whole worker.
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+
+# Longer than the 30 second Anthropic API timeout
+timeout = 60
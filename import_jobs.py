@@ -0,0 +1,146 @@
+import os
+import json
+import uuid
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from models import db, ImportJob
+from importer import run_import
+
+# Imports run on this pool so request workers are never held by a long import
+IMPORT_WORKERS = int(os.environ.get('IMPORT_WORKERS', 2))
+
+_executor = ThreadPoolExecutor(max_workers=IMPORT_WORKERS, thread_name_prefix='import')
+_swept = False
+_sweep_lock = threading.Lock()
+
+# Queued or running jobs not touched for this long belong to a worker that is gone
+# (restarted, timed out or replaced by a deploy); running jobs touch theirs after every chunk
+IMPORT_JOB_STALE_MINUTES = int(os.environ.get('IMPORT_JOB_STALE_MINUTES', 30))
+
+STALE_JOB_MESSAGE = 'Import interrupted: the worker running it stopped (restart or deploy). Please upload the file again.'
+
+
+def enqueue_import(app, filepath, filename, options):
+    """
+    Record an import job and run it in the background
+
+    Args:
+        app (Flask): The application, used to give the worker an app context
+        filepath (str): Path of the saved upload; deleted when the job finishes
+        filename (str): Original file name, for display
+        options (dict): Import options (see importer.run_import)
+
+    Returns:
+        ImportJob: The queued job
+    """
+    _sweep_once()
+    job = ImportJob(id=uuid.uuid4().hex, filename=filename, status='queued',
+                    filepath=filepath, heartbeat_at=datetime.utcnow())
+    db.session.add(job)
+    db.session.commit()
+
+    _executor.submit(_run_job, app, job.id, filepath, options)
+    return job
+
+
+def _sweep_once():
+    """Fail jobs left behind by stopped workers the first time this process queues an import"""
+    global _swept
+    with _sweep_lock:
+        if not _swept:
+            fail_stale_jobs()
+            _swept = True
+
+
+def _run_job(app, job_id, filepath, options):
+    """Worker body: run the import and keep the job row up to date"""
+    with app.app_context():
+        job = db.session.get(ImportJob, job_id)
+        if job.status != 'queued':
+            # Given up on while it waited for a free import worker
+            db.session.remove()
+            return
+        job.status = 'running'
+        job.started_at = job.heartbeat_at = datetime.utcnow()
+        db.session.commit()
+
+        def on_progress(progress):
+            # Called after each chunk has been committed
+            job.rows_read = progress['rows_read']
+            job.rows_imported = progress['rows_imported']
+            job.error_count = progress['error_count']
+            job.heartbeat_at = datetime.utcnow()
+            db.session.commit()
+
+        try:
+            result = run_import(filepath, options, on_progress=on_progress)
+            job.status = 'completed'
+            job.message = result['message']
+            job.errors = json.dumps(result['errors'])
+            job.manager_changes = json.dumps(result['manager_changes'])
+        except Exception as e:
+            print(f"Import job {job_id} failed: {str(e)}")
+            traceback.print_exc()
+            db.session.rollback()
+            job.status = 'failed'
+            job.message = f'Error processing file: {str(e)}'
+        finally:
+            job.finished_at = job.heartbeat_at = datetime.utcnow()
+            db.session.commit()
+            db.session.remove()
+            if os.path.exists(filepath):
+                os.remove(filepath)
+
+
+def fail_stale_jobs(job_id=None):
+    """
+    Mark queued and running jobs whose worker is gone as failed, and delete their uploads
+
+    Args:
+        job_id (str, optional): Only check this job
+
+    Returns:
+        int: Number of jobs marked as failed
+    """
+    now = datetime.utcnow()
+    cutoff = now - timedelta(minutes=IMPORT_JOB_STALE_MINUTES)
+    query = ImportJob.query.filter(
+        ImportJob.status.in_(['queued', 'running']),
+        db.func.coalesce(ImportJob.heartbeat_at, ImportJob.started_at, ImportJob.created_at) < cutoff
+    )
+    if job_id is not None:
+        query = query.filter(ImportJob.id == job_id)
+    jobs = query.all()
+    for job in jobs:
+        print(f"Import job {job.id} stopped reporting progress; marking it failed")
+        job.status = 'failed'
+        job.message = STALE_JOB_MESSAGE
+        job.finished_at = now
+        if job.filepath and os.path.exists(job.filepath):
+            os.remove(job.filepath)
+    db.session.commit()
+    return len(jobs)
+
+
+def job_status(job):
+    """Serialize an import job for the status endpoint"""
+    end = job.finished_at or datetime.utcnow()
+    elapsed = (end - job.started_at).total_seconds() if job.started_at else 0
+    return {
+        'id': job.id,
+        'filename': job.filename,
+        'status': job.status,
+        'rows_read': job.rows_read or 0,
+        'rows_imported': job.rows_imported or 0,
+        'error_count': job.error_count or 0,
+        'errors': json.loads(job.errors) if job.errors else [],
+        'manager_changes': json.loads(job.manager_changes) if job.manager_changes else [],
+        'message': job.message,
+        'elapsed_seconds': elapsed,
+        'rows_per_second': (job.rows_read or 0) / elapsed if elapsed else 0,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    }
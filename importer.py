@@ -0,0 +1,323 @@
+import numpy as np
+import pandas as pd
+from models import db, Agent
+from ingest import resolve_agents, parse_dates, derive_fields, bulk_upsert_performance, INTEGER_MAX
+from rollups import refresh_rollups, refresh_agent_rollups
+from data_cleaning import clean_data
+from response_cache import bump_data_version
+from manager_names import normalize_managers, count_managers, merge_manager_counts, most_common_managers
+
+# Rows read, cleaned and committed at a time
+IMPORT_CHUNK_SIZE = 5000
+
+REQUIRED_COLUMNS = ['date', 'agent_name', 'leads_taken', 'close_rate', 'place_rate', 'avg_premium']
+
+
+class ImportValidationError(ValueError):
+    """Raised when an uploaded file cannot be imported (e.g. missing columns)"""
+
+
+def read_chunks(filepath, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Read an uploaded CSV or Excel file as a sequence of DataFrames
+
+    CSV files are read with pandas' chunksize and .xlsx files with openpyxl's
+    read-only row iterator, so memory stays bounded by the chunk size. Legacy
+    .xls files have no streaming reader and are loaded whole, then sliced.
+    Row index labels continue across chunks, matching a whole-file read.
+    """
+    if filepath.endswith('.csv'):
+        yield from pd.read_csv(filepath, chunksize=chunk_size)
+    elif filepath.endswith('.xlsx'):
+        from openpyxl import load_workbook
+        workbook = load_workbook(filepath, read_only=True, data_only=True)
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            columns = [f"Unnamed: {i}" if name is None else name for i, name in enumerate(header)]
+            batch = []
+            offset = 0
+            for row in rows:
+                if all(value is None for value in row):
+                    continue
+                batch.append(row)
+                if len(batch) == chunk_size:
+                    yield pd.DataFrame(batch, columns=columns, index=range(offset, offset + len(batch)))
+                    offset += len(batch)
+                    batch = []
+            if batch or offset == 0:
+                yield pd.DataFrame(batch, columns=columns, index=range(offset, offset + len(batch)))
+        finally:
+            workbook.close()
+    else:
+        df = pd.read_excel(filepath)
+        for start in range(0, max(len(df), 1), chunk_size):
+            yield df.iloc[start:start + chunk_size]
+
+
+def _find_column(df, *names):
+    """Return the first of names that is a column of df, or None"""
+    return next((name for name in names if name in df.columns), None)
+
+
+def _agent_info(agent_name, row, columns, agent_managers, options):
+    """Manager, division and queue for an agent based on one of its rows"""
+    manager_column, division_column, queue_column = columns
+
+    agent_manager = options['agent_manager']
+    if agent_name in agent_managers:
+        # Use the most common manager for this agent
+        agent_manager = agent_managers[agent_name]
+    elif manager_column and pd.notna(row.get(manager_column, '')):
+        agent_manager = row[manager_column]
+
+    agent_div = options['agent_division']
+    if division_column and pd.notna(row.get(division_column, '')):
+        agent_div = row[division_column]
+
+    agent_q = options['agent_queue']
+    if queue_column and pd.notna(row.get(queue_column, '')):
+        # Map 'T' to 'training' and 'P' to 'performance'
+        if row[queue_column] == 'T':
+            agent_q = 'training'
+        elif row[queue_column] == 'P':
+            agent_q = 'performance'
+        else:
+            agent_q = row[queue_column]
+
+    return agent_manager, agent_div, agent_q
+
+
+def run_import(filepath, options, on_progress=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Import a performance export chunk by chunk
+
+    Each chunk is cleaned, upserted and committed (together with its rollups)
+    before the next one is read, so peak memory does not grow with the file.
+    Agent details that depend on the whole file (most common manager, the
+    values in an agent's last row) are accumulated per agent and applied once
+    all chunks have been imported.
+
+    Args:
+        filepath (str): Path of the saved upload (.csv, .xlsx or .xls)
+        options (dict): auto_create_agents, agent_division, agent_manager,
+            agent_queue and update_existing_info from the import form
+        on_progress (callable, optional): Called after every chunk with a dict of
+            chunk, rows_read, rows_imported and error_count
+        chunk_size (int): Rows per chunk
+
+    Returns:
+        dict: message, errors and manager_changes for the API response
+
+    Raises:
+        ImportValidationError: If the file is missing required columns
+    """
+    success_count = 0
+    error_count = 0
+    rows_read = 0
+    errors = []
+    columns = None
+    agents_by_name = {}
+    missing_names = set()
+    created_names = []
+    manager_counts = None
+    last_rows = {}
+
+    for chunk_number, chunk in enumerate(read_chunks(filepath, chunk_size), start=1):
+        rows_read += len(chunk)
+        df = clean_data(chunk)
+
+        if columns is None:
+            # Validate required columns
+            missing_columns = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+            if missing_columns:
+                raise ImportValidationError(f'Missing required columns: {", ".join(missing_columns)}')
+
+            # Check if we have manager, division or queue info in the data
+            columns = (
+                _find_column(df, 'manager', 'MANAGER'),
+                _find_column(df, 'division', 'Site'),
+                _find_column(df, 'queue_type', 'Q')
+            )
+        manager_column = columns[0]
+
+        # Apply name normalization and count managers per agent across the file
+        if manager_column:
+            df[manager_column] = normalize_managers(df[manager_column])
+            manager_counts = merge_manager_counts(manager_counts, count_managers(df, 'agent_name', manager_column))
+
+        # Resolve agents not seen in earlier chunks with a single query
+        new_names = [name for name in df['agent_name'].unique() if name not in agents_by_name and name not in missing_names]
+        agents_by_name.update(resolve_agents(new_names))
+
+        chunk_managers = most_common_managers(manager_counts)
+        first_rows = df.drop_duplicates('agent_name', keep='first').set_index('agent_name')
+        for agent_name in new_names:
+            if agent_name in agents_by_name:
+                continue
+            if options['auto_create_agents']:
+                # Auto-create agent; its manager is settled once the whole file is read
+                agent_manager, agent_div, agent_q = _agent_info(
+                    agent_name, first_rows.loc[agent_name], columns, chunk_managers, options
+                )
+                agent = Agent(name=agent_name, division=agent_div, manager=agent_manager, queue_type=agent_q)
+                db.session.add(agent)
+                agents_by_name[agent_name] = agent
+                created_names.append(agent_name)
+            else:
+                missing_names.add(agent_name)
+        db.session.flush()  # Get IDs without committing
+
+        if options['update_existing_info']:
+            for agent_name, row in df.drop_duplicates('agent_name', keep='last').set_index('agent_name').iterrows():
+                last_rows[agent_name] = row
+
+        chunk_errors = []
+        missing_mask = df['agent_name'].isin(missing_names)
+        for index, agent_name in df.loc[missing_mask, 'agent_name'].items():
+            chunk_errors.append((index, f"Row {index+1}: Agent '{agent_name}' not found"))
+        df = df[~missing_mask]
+
+        # Parse dates in one vectorized pass
+        dates = parse_dates(df['date'])
+        for index in df.index[dates.isna()]:
+            chunk_errors.append((index, f"Row {index+1}: Invalid date format. Use YYYY-MM-DD"))
+        df = df[dates.notna()]
+
+        # Talk time is stored as an INTEGER; inf or huge values cannot be converted or stored
+        talk_time = None
+        if 'talk_time_minutes' in df.columns:
+            talk_time = pd.to_numeric(df['talk_time_minutes'], errors='coerce').astype(float)
+            # Blank cells are fine; text, inf and overflowing numbers (coerced to NaN or inf) are not
+            valid = np.isfinite(talk_time) & (talk_time.abs() <= INTEGER_MAX)
+            invalid = df['talk_time_minutes'].notna() & ~valid
+            for index in df.index[invalid]:
+                chunk_errors.append((index, f"Row {index+1}: Invalid talk_time_minutes value"))
+            df = df[~invalid]
+            talk_time = talk_time[~invalid]
+
+        records = pd.DataFrame({
+            'date': dates[dates.notna()].dt.date,
+            'agent_id': df['agent_name'].map({name: agent.id for name, agent in agents_by_name.items()}),
+            'leads_taken': df['leads_taken'].astype(float),
+            'close_rate': df['close_rate'].astype(float),
+            'place_rate': df['place_rate'].astype(float),
+            'avg_premium': df['avg_premium'].astype(float)
+        }, index=df.index)
+        records = derive_fields(records)
+
+        # Optional fields
+        if talk_time is not None:
+            records['talk_time_minutes'] = talk_time.map(lambda value: None if pd.isna(value) else int(value))
+        if 'notes' in df.columns:
+            records['notes'] = df['notes'].where(df['notes'].notna(), None)
+
+        # A later row for the same agent+date replaces an earlier one
+        row_count = len(records)
+        records = records.drop_duplicates(['agent_id', 'date'], keep='last')
+
+        # Insert new records and update existing ones in batches
+        record_dicts = records.astype(object).where(records.notna(), None).to_dict('records')
+        row_error_count = len(chunk_errors)
+        failed_positions = set()
+        for position, message in bulk_upsert_performance(record_dicts):
+            chunk_errors.append((records.index[position], f"Row {records.index[position]+1}: {message}"))
+            failed_positions.add(position)
+
+        # Commit the chunk together with its rollups
+        refresh_rollups(
+            record['date'] for position, record in enumerate(record_dicts) if position not in failed_positions
+        )
+        db.session.commit()
+        bump_data_version()
+
+        success_count += row_count - len(failed_positions)
+        error_count += row_error_count + len(failed_positions)
+        errors.extend(message for _, message in sorted(chunk_errors, key=lambda error: error[0]))
+
+        progress = {
+            'chunk': chunk_number,
+            'rows_read': rows_read,
+            'rows_imported': success_count,
+            'error_count': error_count
+        }
+        if on_progress:
+            on_progress(progress)
+        else:
+            print(f"Import progress: chunk {chunk_number}, {rows_read} rows read, {success_count} imported, {error_count} errors")
+
+    if columns is None:
+        raise ImportValidationError(f'Missing required columns: {", ".join(REQUIRED_COLUMNS)}')
+
+    # Settle agent details that depend on the whole file
+    agent_managers = most_common_managers(manager_counts)
+    created_agents = []
+    reassigned_agent_ids = set()
+    for agent_name in created_names:
+        agent = agents_by_name[agent_name]
+        if agent.manager != agent_managers.get(agent_name, agent.manager):
+            # Created with a provisional manager from an earlier chunk
+            agent.manager = agent_managers[agent_name]
+            reassigned_agent_ids.add(agent.id)
+        created_agents.append(f"{agent.name} (Manager: {agent.manager})")
+
+    updated_info_agents = []
+    manager_changes = []
+    created = set(created_names)
+    for agent_name, row in last_rows.items():
+        agent = agents_by_name.get(agent_name)
+        if not agent or agent_name in created:
+            continue
+
+        # The agent's last row in the file wins, as it did with row-by-row updates
+        agent_manager, agent_div, agent_q = _agent_info(agent_name, row, columns, agent_managers, options)
+        updated_info = False
+        manager_changed = False
+        old_manager = agent.manager
+
+        if agent.manager != agent_manager:
+            agent.manager = agent_manager
+            updated_info = True
+            manager_changed = True
+            reassigned_agent_ids.add(agent.id)
+            manager_changes.append({
+                'agent_name': agent.name,
+                'change': f"{old_manager} → {agent.manager}"
+            })
+        if agent.division != agent_div:
+            agent.division = agent_div
+            updated_info = True
+            reassigned_agent_ids.add(agent.id)
+        if agent.queue_type != agent_q:
+            agent.queue_type = agent_q
+            updated_info = True
+
+        if updated_info:
+            update_info = agent.name
+            if manager_changed:
+                update_info = f"{agent.name} (Manager: {old_manager} → {agent.manager})"
+            updated_info_agents.append(update_info)
+
+    refresh_agent_rollups(reassigned_agent_ids)
+    db.session.commit()
+    bump_data_version()
+
+    # Prepare response message
+    message = f'Import completed: {success_count} records imported successfully, {error_count} errors'
+    if created_agents:
+        message += f'. Created {len(created_agents)} new agents: {", ".join(created_agents[:5])}'
+        if len(created_agents) > 5:
+            message += f' and {len(created_agents) - 5} more'
+
+    if updated_info_agents:
+        message += f'. Updated info for {len(updated_info_agents)} agents: {", ".join(updated_info_agents[:5])}'
+        if len(updated_info_agents) > 5:
+            message += f' and {len(updated_info_agents) - 5} more'
+
+    return {
+        'message': message,
+        'errors': errors,
+        'manager_changes': manager_changes
+    }
@@ -0,0 +1,357 @@
+import math
+from datetime import datetime
+import pandas as pd
+from sqlalchemy import literal_column, func, tuple_, select
+from models import db, Agent, DailyPerformance
+from sequences import next_value, mark_pending
+from aggregations import ppl_expression
+from metrics import calculate_ppl
+
+# Columns that identify a performance record (backed by a unique index)
+PERFORMANCE_KEY = ['agent_id', 'date']
+
+# Optional columns that bulk imports only overwrite when the file has a value
+OPTIONAL_COLUMNS = ['talk_time_minutes', 'notes']
+
+# Rows per INSERT ... ON CONFLICT batch during bulk imports
+UPSERT_CHUNK_SIZE = 1000
+
+# Largest value an INTEGER column holds on PostgreSQL
+INTEGER_MAX = 2 ** 31 - 1
+
+# Rows updated per statement when backfilling the calculated fields
+BACKFILL_BATCH_SIZE = 5000
+
+# Fields every API performance record must include
+REQUIRED_FIELDS = ['date', 'agent_id', 'leads_taken', 'close_rate', 'place_rate', 'avg_premium']
+
+
+def _dialect_insert():
+    """Return the INSERT construct with ON CONFLICT support for the active database"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise RuntimeError(f"Upserts are not supported for the {dialect} dialect")
+    return dialect, insert
+
+
+def with_derived_fields(values):
+    """Fill placed_premium_per_lead and total_daily_premium from the core metrics"""
+    ppl = calculate_ppl(values['close_rate'], values['place_rate'], values['avg_premium'])
+    values['placed_premium_per_lead'] = ppl
+    values['total_daily_premium'] = values['leads_taken'] * ppl
+    return values
+
+
+def upsert_performance(values):
+    """
+    Insert a performance record or update the existing one for the same agent and date
+
+    Uses INSERT ... ON CONFLICT (agent_id, date) DO UPDATE, so there is no
+    read-before-write and concurrent posts cannot create duplicate rows.
+    Only the columns present in values are overwritten on conflict.
+
+    Args:
+        values (dict): Column values; must include agent_id, date and the core metrics
+
+    Returns:
+        tuple: (record id, True if a new record was created)
+    """
+    dialect, insert = _dialect_insert()
+    values = with_derived_fields(dict(values))
+    # Stamped when the transaction commits
+    values['change_seq'] = None
+    mark_pending()
+    table = DailyPerformance.__table__
+
+    stmt = insert(table).values(**values)
+    update_columns = {column: stmt.excluded[column] for column in values if column not in PERFORMANCE_KEY}
+
+    if dialect == 'postgresql':
+        # xmax is 0 for freshly inserted tuples, non-zero for updated ones
+        stmt = stmt.on_conflict_do_update(index_elements=PERFORMANCE_KEY, set_=update_columns)
+        row = db.session.execute(
+            stmt.returning(table.c.id, literal_column('(xmax = 0)').label('created'))
+        ).one()
+        return row.id, row.created
+
+    # SQLite cannot tell inserts from updates in RETURNING, so try the insert first
+    row = db.session.execute(
+        stmt.on_conflict_do_nothing(index_elements=PERFORMANCE_KEY).returning(table.c.id)
+    ).first()
+    if row:
+        return row.id, True
+
+    row = db.session.execute(
+        table.update()
+        .where(table.c.agent_id == values['agent_id'], table.c.date == values['date'])
+        .values(**{column: values[column] for column in update_columns})
+        .returning(table.c.id)
+    ).one()
+    return row.id, False
+
+
+def resolve_agents(names):
+    """Look up agents for a collection of names with a single query"""
+    names = [name for name in set(names) if name]
+    if not names:
+        return {}
+    return {agent.name: agent for agent in Agent.query.filter(Agent.name.in_(names)).all()}
+
+
+def parse_dates(series):
+    """
+    Vectorized version of the import date parsing
+
+    Strings must be YYYY-MM-DD; datetime-like values (e.g. from Excel) are
+    truncated to their date. Values that cannot be parsed become NaT.
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.dt.normalize()
+
+    is_string = series.map(lambda value: isinstance(value, str))
+    parsed = pd.to_datetime(series.where(is_string), format='%Y-%m-%d', errors='coerce')
+    others = pd.to_datetime(series.where(~is_string), errors='coerce')
+    return parsed.fillna(others).dt.normalize()
+
+
+def derive_fields(df):
+    """Add placed_premium_per_lead and total_daily_premium columns in one vectorized pass"""
+    ppl = calculate_ppl(df['close_rate'], df['place_rate'], df['avg_premium'])
+    return df.assign(placed_premium_per_lead=ppl, total_daily_premium=df['leads_taken'] * ppl)
+
+
+def bulk_upsert_performance(records, chunk_size=UPSERT_CHUNK_SIZE, coalesce_optional=True):
+    """
+    Upsert many performance records with chunked executemany statements
+
+    Each chunk runs in its own savepoint. When the database rejects a chunk,
+    it is split in halves (each in a nested savepoint) until the rejected rows
+    are isolated, so one bad row does not cost its neighbours. Unless
+    coalesce_optional is False, optional columns keep their stored value when
+    the incoming value is NULL.
+
+    Args:
+        records (list): Dicts with identical keys, at most one per (agent_id, date)
+        chunk_size (int): Rows per statement
+        coalesce_optional (bool): Keep stored optional values over incoming NULLs
+
+    Returns:
+        list: (position, error message) for each row the database rejected
+    """
+    if not records:
+        return []
+
+    _, insert = _dialect_insert()
+    # Stamped when the transaction commits, after the rollups are refreshed
+    records = [dict(record, change_seq=None) for record in records]
+    mark_pending()
+    table = DailyPerformance.__table__
+    stmt = insert(table)
+    update_columns = {}
+    for column in records[0]:
+        if column in PERFORMANCE_KEY:
+            continue
+        if coalesce_optional and column in OPTIONAL_COLUMNS:
+            update_columns[column] = func.coalesce(stmt.excluded[column], table.c[column])
+        else:
+            update_columns[column] = stmt.excluded[column]
+    stmt = stmt.on_conflict_do_update(index_elements=PERFORMANCE_KEY, set_=update_columns)
+
+    failures = []
+    for start in range(0, len(records), chunk_size):
+        _execute_rows(stmt, records[start:start + chunk_size], start, failures)
+    return failures
+
+
+def _execute_rows(stmt, rows, start, failures):
+    """Run stmt for rows in a savepoint, bisecting on failure; appends (position, message) to failures"""
+    try:
+        with db.session.begin_nested():
+            db.session.execute(stmt, rows)
+    except Exception as e:
+        if len(rows) == 1:
+            print(f"Performance upsert rejected record {start}: {str(e)}")
+            failures.append((start, database_error_message(e)))
+            return
+        middle = len(rows) // 2
+        _execute_rows(stmt, rows[:middle], start, failures)
+        _execute_rows(stmt, rows[middle:], start + middle, failures)
+
+
+def database_error_message(error):
+    """The database's own message for a failed statement, without the SQL text or parameters"""
+    error = getattr(error, 'orig', None) or error
+    lines = str(error).strip().splitlines()
+    return lines[0] if lines else error.__class__.__name__
+
+
+def parse_performance_record(data):
+    """
+    Validate one API performance record and convert it to column values
+
+    Args:
+        data (dict): Record as posted to the API
+
+    Returns:
+        dict: Column values for upsert_performance / bulk_upsert_performance
+
+    Raises:
+        ValueError: With the same messages the single-record endpoint returns
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Record must be a JSON object')
+    for field in REQUIRED_FIELDS:
+        if field not in data:
+            raise ValueError(f'Missing required field: {field}')
+
+    try:
+        date = datetime.strptime(str(data['date']), '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError('Invalid date format. Use YYYY-MM-DD')
+
+    try:
+        values = {
+            'date': date,
+            'agent_id': int(data['agent_id']),
+            'leads_taken': float(data['leads_taken']),
+            'close_rate': float(data['close_rate']),
+            'place_rate': float(data['place_rate']),
+            'avg_premium': float(data['avg_premium'])
+        }
+        # Optional fields
+        if 'talk_time_minutes' in data:
+            values['talk_time_minutes'] = int(data['talk_time_minutes'])
+        if 'notes' in data:
+            values['notes'] = data['notes']
+    except (TypeError, ValueError, OverflowError) as e:
+        raise ValueError(f'Invalid value: {str(e)}')
+
+    # NaN and Infinity parse as floats but cannot be stored or aggregated
+    for field in ['leads_taken', 'close_rate', 'place_rate', 'avg_premium']:
+        if not math.isfinite(values[field]):
+            raise ValueError(f'Invalid value: {field} must be a finite number')
+    if abs(values.get('talk_time_minutes', 0)) > INTEGER_MAX:
+        raise ValueError('Invalid value: talk_time_minutes is out of range')
+    return values
+
+
+def _existing_ids(keys):
+    """Map (agent_id, date) keys that already have a record to the record id"""
+    keys = list(keys)
+    ids = {}
+    for start in range(0, len(keys), UPSERT_CHUNK_SIZE):
+        rows = db.session.query(DailyPerformance.agent_id, DailyPerformance.date, DailyPerformance.id).filter(
+            tuple_(DailyPerformance.agent_id, DailyPerformance.date).in_(keys[start:start + UPSERT_CHUNK_SIZE])
+        ).all()
+        ids.update({(row.agent_id, row.date): row.id for row in rows})
+    return ids
+
+
+def ingest_performance_batch(items):
+    """
+    Validate and upsert a batch of API performance records in the current transaction
+
+    Records behave as if they were posted one at a time: a record creates the
+    agent's row for that date or updates it, and only the optional fields it
+    includes are overwritten. Several records for the same agent and date are
+    merged in order before writing, so the last value of each field wins.
+
+    Args:
+        items (list): Records as posted to the API
+
+    Returns:
+        tuple: (list of per-record results with index, status ('created',
+            'updated' or 'error'), id and error; set of dates written)
+    """
+    results = [{'index': index, 'status': 'error', 'id': None, 'error': None} for index in range(len(items))]
+
+    # Validate everything before touching the database
+    parsed = {}
+    for index, data in enumerate(items):
+        try:
+            parsed[index] = parse_performance_record(data)
+        except ValueError as e:
+            results[index]['error'] = str(e)
+
+    # Resolve all agents with a single query
+    agent_ids = {values['agent_id'] for values in parsed.values()}
+    known_ids = {agent.id for agent in Agent.query.filter(Agent.id.in_(agent_ids)).all()} if agent_ids else set()
+    for index, values in list(parsed.items()):
+        if values['agent_id'] not in known_ids:
+            results[index]['error'] = f'Agent with ID {values["agent_id"]} not found'
+            del parsed[index]
+
+    # Merge records for the same agent and date, remembering which inputs fed each one
+    merged = {}
+    sources = {}
+    for index, values in parsed.items():
+        key = (values['agent_id'], values['date'])
+        merged[key] = {**merged.get(key, {}), **values}
+        sources.setdefault(key, []).append(index)
+
+    ids = _existing_ids(merged)
+
+    # Records with the same fields share one statement; missing optional fields are left untouched
+    groups = {}
+    for key, values in merged.items():
+        groups.setdefault(tuple(sorted(values)), []).append(key)
+
+    failed = {}
+    for keys in groups.values():
+        records = [with_derived_fields(dict(merged[key])) for key in keys]
+        for position, message in bulk_upsert_performance(records, coalesce_optional=False):
+            failed[keys[position]] = message
+
+    new_ids = _existing_ids(key for key in merged if key not in ids and key not in failed)
+
+    dates = set()
+    for key, indexes in sources.items():
+        if key in failed:
+            for index in indexes:
+                results[index]['error'] = failed[key]
+            continue
+        dates.add(key[1])
+        for position, index in enumerate(indexes):
+            # Later records for the same key update the row the first one wrote
+            created = position == 0 and key not in ids
+            results[index].update(status='created' if created else 'updated', id=ids.get(key) or new_ids.get(key))
+    return results, dates
+
+
+def backfill_derived_fields(batch_size=BACKFILL_BATCH_SIZE):
+    """
+    Fill placed_premium_per_lead and total_daily_premium where they are NULL
+
+    Rows written by older code or sample data scripts may be missing the
+    calculated fields. Each batch is one UPDATE over a set of ids and is
+    committed on its own, so the backfill can run on a live database.
+    Callers should rebuild the rollups afterwards if any rows were updated.
+
+    Returns:
+        int: Number of rows updated
+    """
+    table = DailyPerformance.__table__
+    missing = (table.c.placed_premium_per_lead.is_(None)) | (table.c.total_daily_premium.is_(None))
+    ppl = ppl_expression(table.c)
+    updated = 0
+    while True:
+        ids = [row.id for row in db.session.execute(
+            select(table.c.id).where(missing).order_by(table.c.id).limit(batch_size)
+        )]
+        if not ids:
+            break
+        db.session.execute(
+            table.update().where(table.c.id.in_(ids)).values(
+                placed_premium_per_lead=ppl,
+                total_daily_premium=table.c.leads_taken * ppl,
+                change_seq=next_value()
+            )
+        )
+        db.session.commit()
+        updated += len(ids)
+        print(f"Backfilled calculated fields for {updated} performance records")
+    return updated
@@ -0,0 +1,240 @@
+import re
+from bisect import bisect_left
+
+# Vocabularies, in priority order: the first entry with a term in the question wins.
+# Terms match as substrings of the lowercased question, like the original keyword scans.
+METRIC_TERMS = [
+    ('ppl', ['ppl', 'placed premium per lead', 'placed premium', 'premium per lead']),
+    ('close_rate', ['close rate', 'close percentage', 'closing percentage', 'close', 'closes']),
+    ('place_rate', ['place rate', 'placement rate', 'place percentage', 'placement']),
+    ('avg_premium', ['average premium', 'avg premium', 'premium', 'average policy premium']),
+    ('leads', ['leads', 'lead count', 'number of leads', 'lead volume'])
+]
+
+TARGET_TERMS = [
+    ('managers', ['manager', 'team lead', 'supervisor', 'team']),
+    ('agents', ['who', 'which agent', 'top agent', 'best agent', 'worst agent']),
+    ('divisions', ['division', 'location', 'site', 'charlotte', 'austin']),
+    ('average', ['average', 'avg', 'mean'])
+]
+
+TIME_PERIOD_TERMS = [
+    (7, ['week', 'last 7 days', '7 days']),
+    (14, ['two weeks', 'last 14 days', '14 days', 'fortnight']),
+    (30, ['month', 'last 30 days', '30 days', 'last month']),
+    (90, ['quarter', 'last 90 days', '90 days', 'last quarter', 'three months'])
+]
+
+DIVISION_TERMS = [
+    ('CHA', ['charlotte', 'cha', 'clt']),
+    ('AUS', ['austin', 'aus', 'atx'])
+]
+
+QUEUE_TERMS = [
+    ('training', ['training', 'train']),
+    ('performance', ['performance', 'perform'])
+]
+
+COMPARISON_TERMS = [
+    ('above_target', ['above target', 'above break even', 'exceeding']),
+    ('below_target', ['below target', 'below break even', 'under']),
+    ('compare', ['compare'])
+]
+
+SORT_TERMS = [
+    ('DESC', ['top', 'best', 'highest', 'most']),
+    ('ASC', ['bottom', 'worst', 'lowest', 'least'])
+]
+
+# Query types, in priority order. Each is a sequence of steps; a question matches
+# when one term of every step appears, in order and without overlapping, on its
+# first line (the original patterns were re.match(r"(?i).*a.*(b|c).*") checks).
+QUERY_INTENTS = [
+    ('get_top_agents', 'Shows top performing agents based on PPL',
+     [['top'], ['agent', 'performer']]),
+    ('get_bottom_agents', 'Shows agents with the lowest PPL',
+     [['worst'], ['agent', 'performer']]),
+    ('get_average_ppl', 'Calculates average PPL across all agents',
+     [['average'], ['ppl', 'per person lead']]),
+    ('get_performance_trend', 'Shows performance trend over time',
+     [['performance'], ['trend', 'over time']]),
+    ('get_division_comparison', 'Compares performance across divisions',
+     [['division'], ['performance', 'comparison']]),
+    ('get_highest_close_rate', 'Identifies agents with highest close rates',
+     [['highest'], ['close rate', 'conversion']]),
+    ('get_top_managers', 'Shows top performing managers based on team PPL',
+     [['best', 'top', 'highest', 'best performing'], ['manager']]),
+    ('get_bottom_managers', 'Shows managers with the lowest team PPL',
+     [['worst', 'bottom', 'lowest', 'worst performing'], ['manager']]),
+    ('get_manager_ppl', 'Calculates average PPL by manager',
+     [['average'], ['team'], ['ppl'], ['manager']]),
+    ('get_manager_performance', 'Analyzes performance metrics by manager',
+     [['manager'], ['performance']])
+]
+
+DEFAULT_TIME_PERIOD = 30
+DEFAULT_LIMIT = 5
+
+LIMIT_PATTERNS = [re.compile(r'top (\d+)'), re.compile(r'(\d+) best')]
+
+
+def _vocabulary():
+    terms = set()
+    for table in (METRIC_TERMS, TARGET_TERMS, TIME_PERIOD_TERMS, DIVISION_TERMS,
+                  QUEUE_TERMS, COMPARISON_TERMS, SORT_TERMS):
+        for _, words in table:
+            terms.update(words)
+    for _, _, steps in QUERY_INTENTS:
+        for words in steps:
+            terms.update(words)
+    return terms
+
+
+def _trie_pattern(terms):
+    """
+    Regex alternation of the terms with common prefixes factored out
+
+    Longer continuations are tried first, so at any position the pattern
+    matches the longest term that starts there.
+    """
+    trie = {}
+    for term in terms:
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[''] = None
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        group = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            # A term ends here; the longer terms are tried first
+            return '(?:' + group + ')?'
+        return group
+
+    return build(trie)
+
+
+VOCABULARY = _vocabulary()
+
+# Zero-width scan: at every position, capture the longest term starting there
+TERM_SCANNER = re.compile('(?=(' + _trie_pattern(VOCABULARY) + '))')
+
+# Terms that are prefixes of each term (including itself); when a term matches
+# at a position, so do all of its prefixes
+IMPLIED_TERMS = {
+    term: [other for other in VOCABULARY if term.startswith(other)] for term in VOCABULARY
+}
+
+
+def scan_terms(text):
+    """
+    Find every vocabulary term in a lowercased text with one regex pass
+
+    Returns:
+        dict: term -> sorted list of the positions where it starts
+    """
+    found = {}
+    for match in TERM_SCANNER.finditer(text):
+        start = match.start()
+        for term in IMPLIED_TERMS[match.group(1)]:
+            found.setdefault(term, []).append(start)
+    return found
+
+
+def _first(table, found, default=None):
+    for value, words in table:
+        for word in words:
+            if word in found:
+                return value
+    return default
+
+
+def _matches_steps(steps, found, limit):
+    """Whether the steps' terms occur in order, each starting after the previous one ends"""
+    position = 0
+    for words in steps:
+        end = None
+        for word in words:
+            starts = found.get(word)
+            if not starts:
+                continue
+            index = bisect_left(starts, position)
+            if index < len(starts) and starts[index] + len(word) <= limit:
+                candidate = starts[index] + len(word)
+                end = candidate if end is None else min(end, candidate)
+        if end is None:
+            return False
+        position = end
+    return True
+
+
+def match_query_type(question, found=None):
+    """
+    Query type of a question, as the QUERY_INTENTS pattern checks decide it
+
+    Returns:
+        str: The query type, or None if no intent matches
+    """
+    lowered = question.lower()
+    if found is None:
+        found = scan_terms(lowered)
+    # The original patterns' .* did not cross newlines
+    limit = lowered.find('\n')
+    if limit == -1:
+        limit = len(lowered)
+    for query_type, _, steps in QUERY_INTENTS:
+        if _matches_steps(steps, found, limit):
+            return query_type
+    return None
+
+
+def parse_question(question, found=None):
+    """
+    Extract key information from a natural language question to generate a SQL query
+
+    Returns:
+        dict: The query_info consumed by generate_sql
+    """
+    question = question.lower()
+    if found is None:
+        found = scan_terms(question)
+
+    query_info = {
+        'target': _first(TARGET_TERMS, found, 'agents'),
+        'metric': _first(METRIC_TERMS, found, 'ppl'),
+        'filter_division': _first(DIVISION_TERMS, found),
+        'filter_manager': None,
+        'filter_queue': _first(QUEUE_TERMS, found),
+        'time_period': _first(TIME_PERIOD_TERMS, found, DEFAULT_TIME_PERIOD),
+        'comparison': _first(COMPARISON_TERMS, found),
+        'limit': DEFAULT_LIMIT,
+        'sort_direction': _first(SORT_TERMS, found, 'DESC')
+    }
+
+    # Comparing Charlotte with Austin compares divisions
+    if query_info['comparison'] == 'compare' and 'charlotte' in found and 'austin' in found:
+        query_info['target'] = 'divisions'
+        query_info['comparison'] = 'compare_divisions'
+
+    if 'top' in found or 'best' in found:
+        for pattern in LIMIT_PATTERNS:
+            limit_match = pattern.search(question)
+            if limit_match:
+                query_info['limit'] = int(limit_match.group(1))
+                break
+
+    return query_info
+
+
+def parse_intent(question):
+    """
+    Query type and query_info of a question from a single scan
+
+    Returns:
+        tuple: (query type or None, query_info dict)
+    """
+    found = scan_terms(question.lower())
+    return match_query_type(question, found), parse_question(question, found)
@@ -0,0 +1,214 @@
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+import requests
+from requests.adapters import HTTPAdapter
+from tenacity import Retrying, retry_if_exception_type, stop_after_attempt, wait_random_exponential
+
+logger = logging.getLogger(__name__)
+
+# Point at a local stub server to exercise the client without the real API
+ANTHROPIC_BASE_URL = os.environ.get('ANTHROPIC_BASE_URL', 'https://api.anthropic.com').rstrip('/')
+ANTHROPIC_VERSION = '2023-06-01'
+
+# Requests in flight to the API from one worker process; later callers wait for a slot
+LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', 4))
+
+# Seconds a caller waits for a slot before giving up
+LLM_QUEUE_TIMEOUT = float(os.environ.get('LLM_QUEUE_TIMEOUT', 30))
+
+# Attempts per call, including the first
+LLM_MAX_ATTEMPTS = int(os.environ.get('LLM_MAX_ATTEMPTS', 4))
+
+# Backoff between attempts: exponential with jitter from LLM_BACKOFF_BASE, never above LLM_MAX_BACKOFF
+LLM_BACKOFF_BASE = float(os.environ.get('LLM_BACKOFF_BASE', 0.5))
+LLM_MAX_BACKOFF = float(os.environ.get('LLM_MAX_BACKOFF', 20))
+
+LLM_TIMEOUT = float(os.environ.get('LLM_TIMEOUT', 30))
+
+_session = None
+_session_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+_backoff = wait_random_exponential(multiplier=LLM_BACKOFF_BASE, max=LLM_MAX_BACKOFF)
+
+
+class LLMError(Exception):
+    """Raised when the API call fails; status_code and body are set for HTTP errors"""
+
+    def __init__(self, message, status_code=None, body=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.body = body
+
+
+class RetryableError(LLMError):
+    """A 429 or 5xx response, retried after retry_after seconds when the API sent one"""
+
+    def __init__(self, message, status_code, body, retry_after=None):
+        super().__init__(message, status_code, body)
+        self.retry_after = retry_after
+
+
+def _get_session():
+    """Keep-alive session shared by this process, created on first use (after gunicorn forks)"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=LLM_MAX_CONCURRENCY))
+            session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=LLM_MAX_CONCURRENCY))
+            _session = session
+        return _session
+
+
+def _retry_after(response):
+    """Seconds from a Retry-After header (delta-seconds or HTTP date), or None"""
+    value = response.headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _wait(retry_state):
+    error = retry_state.outcome.exception()
+    retry_after = getattr(error, 'retry_after', None)
+    if retry_after is not None:
+        return min(retry_after, LLM_MAX_BACKOFF)
+    return _backoff(retry_state)
+
+
+def _post(payload, stream):
+    api_key = os.getenv('ANTHROPIC_API_KEY')
+    headers = {
+        'Content-Type': 'application/json',
+        'x-api-key': api_key,
+        'anthropic-version': ANTHROPIC_VERSION
+    }
+    response = _get_session().post(f'{ANTHROPIC_BASE_URL}/v1/messages', headers=headers, json=payload,
+                                   stream=stream, timeout=LLM_TIMEOUT)
+    if response.status_code == 200:
+        return response
+
+    body = response.text
+    response.close()
+    message = f'Anthropic API returned status code {response.status_code}'
+    if response.status_code == 429 or response.status_code >= 500:
+        logger.warning(f'{message}, retrying')
+        raise RetryableError(message, response.status_code, body, _retry_after(response))
+    raise LLMError(message, response.status_code, body)
+
+
+@contextmanager
+def _request(payload, stream):
+    """
+    Send a Messages API request, holding a concurrency slot until the response is closed
+
+    Connection errors, timeouts, 429 and 5xx responses are retried with
+    backoff; the slot is kept while waiting, so a throttled worker does not
+    let other requests through.
+
+    Yields:
+        tuple: (response, number of attempts made)
+    """
+    if not _slots.acquire(timeout=LLM_QUEUE_TIMEOUT):
+        raise LLMError('Too many AI requests in progress, please try again shortly')
+    try:
+        retrying = Retrying(
+            retry=retry_if_exception_type((RetryableError, requests.ConnectionError, requests.Timeout)),
+            stop=stop_after_attempt(LLM_MAX_ATTEMPTS),
+            wait=_wait,
+            reraise=True
+        )
+        for attempt in retrying:
+            with attempt:
+                response = _post(payload, stream)
+        try:
+            yield response, attempt.retry_state.attempt_number
+        finally:
+            response.close()
+    finally:
+        _slots.release()
+
+
+def _log_call(kind, started, attempts, usage, first_token=None):
+    latency = (time.monotonic() - started) * 1000
+    message = (f"Anthropic {kind} call: {latency:.0f} ms, {attempts} attempt(s), "
+               f"input_tokens={usage.get('input_tokens')}, output_tokens={usage.get('output_tokens')}")
+    if first_token is not None:
+        message += f", first token after {(first_token - started) * 1000:.0f} ms"
+    logger.info(message)
+
+
+def create_message(payload):
+    """
+    Call the Messages API and return the decoded response
+
+    Args:
+        payload (dict): Messages API request body
+
+    Returns:
+        dict: The API response
+
+    Raises:
+        LLMError: If the API returns an error, including after the last retry
+        requests.RequestException: If the API cannot be reached after the last retry
+    """
+    started = time.monotonic()
+    with _request(payload, stream=False) as (response, attempts):
+        result = response.json()
+    _log_call('messages', started, attempts, result.get('usage') or {})
+    return result
+
+
+def stream_message(payload):
+    """
+    Call the Messages API with stream: true
+
+    Args:
+        payload (dict): Messages API request body
+
+    Yields:
+        dict: Each server-sent event's data, up to and including message_stop
+
+    Raises:
+        LLMError: If the API returns an error, before or during the stream
+    """
+    started = time.monotonic()
+    usage, first_token, attempts = {}, None, 0
+    try:
+        with _request(dict(payload, stream=True), stream=True) as (response, attempts):
+            # The API sends UTF-8 but does not always name a charset
+            response.encoding = 'utf-8'
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+                event = json.loads(line[5:])
+                kind = event.get('type')
+                if kind == 'message_start':
+                    usage.update(event['message'].get('usage') or {})
+                elif kind == 'message_delta':
+                    usage.update(event.get('usage') or {})
+                elif kind == 'content_block_delta' and first_token is None:
+                    first_token = time.monotonic()
+                elif kind == 'error':
+                    error = event.get('error') or {}
+                    raise LLMError(f"Anthropic API stream error: {error.get('message', 'unknown error')}",
+                                   body=json.dumps(event))
+                yield event
+                if kind == 'message_stop':
+                    break
+    finally:
+        if attempts:
+            _log_call('streaming', started, attempts, usage, first_token)
@@ -0,0 +1,134 @@
+import re
+import threading
+from functools import lru_cache
+import pandas as pd
+from models import db, ManagerAlias
+
+# Common spellings and nicknames, in priority order; seeds the manager_alias table
+DEFAULT_ALIASES = [
+    ('Fred Holguin', 'Frederick Holguin'),
+    ('Fred', 'Frederick Holguin'),
+    ('Holguin', 'Frederick Holguin'),
+    ('Vince Blanchett', 'Vincent Blanchett'),
+    ('Vince', 'Vincent Blanchett'),
+    ('Blanchett', 'Vincent Blanchett'),
+    ('Pat Lewis', 'Patricia Lewis'),
+    ('Patty Lewis', 'Patricia Lewis'),
+    ('Pat', 'Patricia Lewis'),
+    ('Lewis', 'Patricia Lewis'),
+    ('Hajmahmoud', 'Nisrin Hajmahmoud'),
+    ('Nisrin', 'Nisrin Hajmahmoud')
+]
+
+_lock = threading.Lock()
+_matcher = None  # (compiled pattern, {alias: (priority, manager)})
+
+
+def seed_aliases():
+    """Insert the default aliases if the manager_alias table is empty"""
+    if ManagerAlias.query.first():
+        return
+    for priority, (alias, manager) in enumerate(DEFAULT_ALIASES):
+        db.session.add(ManagerAlias(alias=alias, manager=manager, priority=priority))
+    db.session.commit()
+    reload_aliases()
+
+
+def _load_aliases():
+    """Aliases from the database in priority order, falling back to the defaults"""
+    try:
+        rows = ManagerAlias.query.order_by(ManagerAlias.priority, ManagerAlias.id).all()
+        aliases = [(row.alias, row.manager) for row in rows]
+    except Exception as e:
+        print(f"Could not load manager aliases, using defaults: {str(e)}")
+        db.session.rollback()
+        aliases = []
+    return aliases or DEFAULT_ALIASES
+
+
+def _compile(aliases):
+    """
+    Build one matcher for all aliases
+
+    The alternation lists aliases in priority order inside a lookahead, so
+    finditer reports every position where an alias starts; at each position
+    the highest-priority alias wins. Taking the best priority over all matches
+    gives the same answer as checking each alias in order for a substring match.
+    """
+    lookup = {}
+    for priority, (alias, manager) in enumerate(aliases):
+        lookup.setdefault(alias.lower(), (priority, manager))
+    alternation = '|'.join(re.escape(alias) for alias in lookup)
+    return re.compile(f"(?=({alternation}))"), lookup
+
+
+def _get_matcher():
+    global _matcher
+    if _matcher is None:
+        with _lock:
+            if _matcher is None:
+                _matcher = _compile(_load_aliases())
+    return _matcher
+
+
+def reload_aliases():
+    """Recompile the matcher from the manager_alias table and drop memoized names"""
+    global _matcher
+    with _lock:
+        _matcher = None
+    _normalize.cache_clear()
+
+
+@lru_cache(maxsize=4096)
+def _normalize(name):
+    pattern, lookup = _get_matcher()
+    lowered = name.lower()
+    best = None
+    for match in pattern.finditer(lowered):
+        candidate = lookup[match.group(1)]
+        if best is None or candidate[0] < best[0]:
+            best = candidate
+    return best[1] if best else name
+
+
+def normalize_manager_name(name):
+    """Map common spellings and nicknames of a manager to the full name"""
+    if pd.isna(name) or not name:
+        return ''
+    # Convert to string in case it's not and normalize case
+    return _normalize(str(name).strip().title())
+
+
+def normalize_managers(series):
+    """Normalize a column of manager names, matching each distinct value once"""
+    mapping = {value: normalize_manager_name(value) for value in series.unique()}
+    return series.map(mapping)
+
+
+def count_managers(df, agent_column, manager_column):
+    """
+    Manager counts per agent for one frame
+
+    Returns:
+        DataFrame: Indexed by (agent, manager) with 'count' and 'first_row'
+            (the first index label where the pair appears, used to break ties)
+    """
+    return df.assign(_row=df.index).groupby([agent_column, manager_column], sort=False)['_row'].agg(
+        count='size', first_row='min'
+    )
+
+
+def merge_manager_counts(counts, more):
+    """Combine two count_managers() results"""
+    if counts is None:
+        return more
+    return pd.concat([counts, more]).groupby(level=[0, 1], sort=False).agg({'count': 'sum', 'first_row': 'min'})
+
+
+def most_common_managers(counts):
+    """The mode manager per agent; ties go to the manager seen first in the file"""
+    if counts is None or counts.empty:
+        return {}
+    ranked = counts.sort_values(['count', 'first_row'], ascending=[False, True])
+    top = ranked[~ranked.index.get_level_values(0).duplicated()]
+    return dict(zip(top.index.get_level_values(0), top.index.get_level_values(1)))
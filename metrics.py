@@ -0,0 +1,84 @@
+import numpy as np
+
+# PPL thresholds used by every status bucket, SQL filter and AI prompt
+TARGET_PPL = 164
+BREAK_EVEN_PPL = 130
+
+# Working days used to project annual compensation
+DAYS_PER_YEAR = 250
+
+# Status labels indexed by status code (see status_codes)
+STATUS_LABELS = ('Below Break Even', 'Break Even', 'Above Target')
+BELOW_BREAK_EVEN, BREAK_EVEN, ABOVE_TARGET = range(3)
+
+
+def calculate_ppl(close_rate, place_rate, avg_premium):
+    """Placed Premium per Lead for scalars or arrays of rates (in percent) and premiums"""
+    return (close_rate / 100) * (place_rate / 100) * avg_premium
+
+
+def performance_status(ppl):
+    """Status label for a single PPL value"""
+    if ppl >= TARGET_PPL:
+        return STATUS_LABELS[ABOVE_TARGET]
+    elif ppl >= BREAK_EVEN_PPL:
+        return STATUS_LABELS[BREAK_EVEN]
+    return STATUS_LABELS[BELOW_BREAK_EVEN]
+
+
+def status_codes(ppl):
+    """
+    Status code per PPL value: 0 below break-even, 1 break-even, 2 above target
+
+    Args:
+        ppl (array-like): PPL values
+
+    Returns:
+        ndarray: Integer codes, usable as indexes into STATUS_LABELS
+    """
+    return np.searchsorted([BREAK_EVEN_PPL, TARGET_PPL], np.asarray(ppl, dtype=float), side='right')
+
+
+def bucket_counts(ppl):
+    """Number of values in each status bucket, keyed like the dashboard stats"""
+    ppl = np.asarray(ppl, dtype=float)
+    above_target = int(np.count_nonzero(ppl >= TARGET_PPL))
+    below_break_even = int(np.count_nonzero(ppl < BREAK_EVEN_PPL))
+    return {
+        'above_target': above_target,
+        'at_break_even': int(ppl.size) - above_target - below_break_even,
+        'below_break_even': below_break_even
+    }
+
+
+def compute_metrics(close_rate, place_rate, avg_premium, leads_taken, days_per_year=DAYS_PER_YEAR):
+    """
+    Derived metrics for many performance rows in one vectorized pass
+
+    Matches DailyPerformance.calculate_ppl(), calculate_daily_premium(),
+    calculate_annual_comp() and get_performance_status() row by row.
+
+    Args:
+        close_rate (array-like): Close rates in percent
+        place_rate (array-like): Place rates in percent
+        avg_premium (array-like): Average premium per sale
+        leads_taken (array-like): Leads per day
+        days_per_year (int): Working days used for the annual projection
+
+    Returns:
+        dict: 'ppl', 'daily_premium', 'annual_comp' (float arrays) and
+            'status' (status codes, see status_codes)
+    """
+    close_rate = np.asarray(close_rate, dtype=float)
+    place_rate = np.asarray(place_rate, dtype=float)
+    avg_premium = np.asarray(avg_premium, dtype=float)
+    leads_taken = np.asarray(leads_taken, dtype=float)
+
+    ppl = calculate_ppl(close_rate, place_rate, avg_premium)
+    daily_premium = leads_taken * ppl
+    return {
+        'ppl': ppl,
+        'daily_premium': daily_premium,
+        'annual_comp': daily_premium * days_per_year,
+        'status': status_codes(ppl)
+    }
@@ -1,5 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 from datetime import datetime
+from metrics import DAYS_PER_YEAR, performance_status
 
 db = SQLAlchemy()
 
@@ -12,10 +14,20 @@ class Agent(db.Model):
     queue_type = db.Column(db.String(50), nullable=False)  # 'training' or 'performance'
     is_active = db.Column(db.Boolean, default=True)  # Track if agent is currently active
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    last_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    last_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    change_seq = db.Column(db.BigInteger, index=True)  # Stamped on every insert/update (see sequences.py)
 
 class DailyPerformance(db.Model):
     __tablename__ = 'daily_performance'
+    __table_args__ = (
+        # One record per agent per day; also serves agent_id lookups
+        db.Index('ix_daily_performance_agent_date', 'agent_id', 'date', unique=True),
+        db.Index('ix_daily_performance_date', 'date'),
+        # Range scans for PPL bucket counts and above-target / below-break-even filters
+        db.Index('ix_daily_performance_date_ppl', 'date', 'placed_premium_per_lead'),
+        db.Index('ix_daily_performance_ppl', 'placed_premium_per_lead'),
+        db.Index('ix_daily_performance_total_premium', 'total_daily_premium'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.Date, nullable=False)
     agent_id = db.Column(db.Integer, db.ForeignKey('agent.id'), nullable=False)
@@ -26,7 +38,7 @@ class DailyPerformance(db.Model):
     avg_premium = db.Column(db.Float, nullable=False)
     place_rate = db.Column(db.Float, nullable=False)
     
-    # Calculated Fields
+    # Calculated Fields (kept in sync on every write; read these instead of recomputing)
     placed_premium_per_lead = db.Column(db.Float)
     total_daily_premium = db.Column(db.Float)
     
@@ -35,6 +47,9 @@ class DailyPerformance(db.Model):
     talk_time_minutes = db.Column(db.Integer)
     notes = db.Column(db.Text)
 
+    # Value of the 'performance' change sequence when the row was last written
+    change_seq = db.Column(db.BigInteger, index=True)
+
     def calculate_ppl(self):
         """Calculate Placed Premium per Lead"""
         return (self.close_rate / 100) * (self.place_rate / 100) * self.avg_premium
@@ -43,7 +58,7 @@ class DailyPerformance(db.Model):
         """Calculate total daily premium"""
         return self.leads_taken * self.calculate_ppl()
 
-    def calculate_annual_comp(self, days_per_year=250):
+    def calculate_annual_comp(self, days_per_year=DAYS_PER_YEAR):
         """Calculate projected annual compensation"""
         daily_ppl = self.calculate_ppl()
         daily_revenue = daily_ppl * self.leads_taken
@@ -52,13 +67,100 @@ class DailyPerformance(db.Model):
 
     def get_performance_status(self):
         """Get performance status based on PPL"""
-        ppl = self.calculate_ppl()
-        if ppl >= 164:
-            return "Above Target"
-        elif ppl >= 130:
-            return "Break Even"
-        else:
-            return "Below Break Even"
+        return performance_status(self.calculate_ppl())
+
+@event.listens_for(DailyPerformance, 'before_insert')
+@event.listens_for(DailyPerformance, 'before_update')
+def _set_derived_fields(mapper, connection, target):
+    """Fill the calculated fields for ORM writes (bulk writes go through ingest.py)"""
+    target.placed_premium_per_lead = target.calculate_ppl()
+    target.total_daily_premium = target.calculate_daily_premium()
+
+class RollupMetrics:
+    """Summed metrics shared by the performance rollup tables"""
+    row_count = db.Column(db.Integer, nullable=False, default=0)
+    leads_sum = db.Column(db.Float, nullable=False, default=0)
+    close_rate_sum = db.Column(db.Float, nullable=False, default=0)
+    place_rate_sum = db.Column(db.Float, nullable=False, default=0)
+    avg_premium_sum = db.Column(db.Float, nullable=False, default=0)
+    ppl_sum = db.Column(db.Float, nullable=False, default=0)
+    total_premium_sum = db.Column(db.Float, nullable=False, default=0)
+    
+    # PPL bucket counts
+    above_target = db.Column(db.Integer, nullable=False, default=0)
+    at_break_even = db.Column(db.Integer, nullable=False, default=0)
+    below_break_even = db.Column(db.Integer, nullable=False, default=0)
+
+class AgentDailyRollup(RollupMetrics, db.Model):
+    __tablename__ = 'agent_daily_rollup'
+    agent_id = db.Column(db.Integer, db.ForeignKey('agent.id'), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+
+class ManagerDailyRollup(RollupMetrics, db.Model):
+    __tablename__ = 'manager_daily_rollup'
+    manager = db.Column(db.String(100), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+
+class DivisionDailyRollup(RollupMetrics, db.Model):
+    __tablename__ = 'division_daily_rollup'
+    division = db.Column(db.String(100), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+
+class DailyRollup(RollupMetrics, db.Model):
+    __tablename__ = 'daily_rollup'
+    date = db.Column(db.Date, primary_key=True)
+
+class ChangeSequence(db.Model):
+    """Named counters that write transactions advance; committed values only ever grow"""
+    __tablename__ = 'change_sequence'
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+
+class ChangeLog(db.Model):
+    """Deletes for the change feed; rows that still exist are found by their change_seq"""
+    __tablename__ = 'change_log'
+    id = db.Column(db.Integer, primary_key=True)
+    seq = db.Column(db.BigInteger, nullable=False, index=True)
+    entity = db.Column(db.String(20), nullable=False)  # 'agent' or 'performance'
+    operation = db.Column(db.String(20), nullable=False)  # 'delete' (one row) or 'reset' (every row)
+    entity_id = db.Column(db.Integer)  # Deleted row id; NULL for resets
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ManagerAlias(db.Model):
+    __tablename__ = 'manager_alias'
+    id = db.Column(db.Integer, primary_key=True)
+    alias = db.Column(db.String(100), unique=True, nullable=False)  # matched as a case-insensitive substring
+    manager = db.Column(db.String(100), nullable=False)
+    priority = db.Column(db.Integer, nullable=False, default=0)  # lower wins when several aliases match
+
+class ImportJob(db.Model):
+    __tablename__ = 'import_job'
+    id = db.Column(db.String(32), primary_key=True)
+    filename = db.Column(db.String(255), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, completed, failed
+    rows_read = db.Column(db.Integer, default=0)
+    rows_imported = db.Column(db.Integer, default=0)
+    error_count = db.Column(db.Integer, default=0)
+    errors = db.Column(db.Text)  # JSON list of row error messages
+    message = db.Column(db.Text)
+    manager_changes = db.Column(db.Text)  # JSON list
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    filepath = db.Column(db.String(500))  # Saved upload, deleted when the job finishes
+    heartbeat_at = db.Column(db.DateTime)  # Last time the worker touched the job
+
+class AIAnswerCache(db.Model):
+    """Stored AI insight answers, keyed by the parsed question intent and the data it was given"""
+    __tablename__ = 'ai_answer_cache'
+    key = db.Column(db.String(64), primary_key=True)
+    query_type = db.Column(db.String(50))
+    answer = db.Column(db.Text, nullable=False)
+    chart_data = db.Column(db.Text)  # JSON
+    hits = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
 
 class APIKey(db.Model):
     __tablename__ = 'api_key'
@@ -0,0 +1,182 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import date
+from functools import wraps
+from flask import request, make_response
+
+# Data scopes; every write path bumps the versions of the scopes it changes
+AGENTS = 'agents'
+PERFORMANCE = 'performance'
+
+RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 256))
+
+# Upper bound on entry age. With the in-process backend each gunicorn worker has
+# its own version counters, so this also bounds how long another worker's
+# write can go unnoticed; set RESPONSE_CACHE_REDIS_URL to share both.
+RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 60))
+
+RESPONSE_CACHE_REDIS_URL = os.environ.get('RESPONSE_CACHE_REDIS_URL')
+
+# Response headers stored with the body and replayed on cache hits
+CACHED_HEADERS = ('Last-Modified', 'X-Next-Cursor', 'Link')
+
+
+class LocalBackend:
+    """In-process LRU of cached responses and data version counters"""
+
+    def __init__(self, size):
+        self.size = size
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.counters = {}
+
+    def versions(self, scopes):
+        with self.lock:
+            return [self.counters.get(scope, 0) for scope in scopes]
+
+    def bump(self, scopes):
+        with self.lock:
+            for scope in scopes:
+                self.counters[scope] = self.counters.get(scope, 0) + 1
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class RedisBackend:
+    """Cached responses and version counters shared by all workers through Redis"""
+
+    prefix = 'response_cache:'
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def versions(self, scopes):
+        values = self.client.mget([f"{self.prefix}version:{scope}" for scope in scopes])
+        return [int(value or 0) for value in values]
+
+    def bump(self, scopes):
+        pipe = self.client.pipeline()
+        for scope in scopes:
+            pipe.incr(f"{self.prefix}version:{scope}")
+        pipe.execute()
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return json.loads(value) if value else None
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, json.dumps(value), ex=ttl)
+
+    def clear(self):
+        keys = [key for key in self.client.scan_iter(f"{self.prefix}*") if b':version:' not in key]
+        if keys:
+            self.client.delete(*keys)
+
+
+def _create_backend():
+    if RESPONSE_CACHE_REDIS_URL:
+        try:
+            return RedisBackend(RESPONSE_CACHE_REDIS_URL)
+        except ImportError:
+            print("RESPONSE_CACHE_REDIS_URL is set but the redis package is not installed; using the in-process cache")
+    return LocalBackend(RESPONSE_CACHE_SIZE)
+
+
+backend = _create_backend()
+
+
+def bump_data_version(*scopes):
+    """Invalidate cached responses that depend on any of the given scopes"""
+    try:
+        backend.bump(scopes or (AGENTS, PERFORMANCE))
+    except Exception as e:
+        # Never fail a write because the cache is unavailable
+        print(f"Error bumping data version: {str(e)}")
+        backend.clear()
+
+
+def _cache_key():
+    """Endpoint plus the normalized filter set (sorted, blank values dropped)"""
+    args = sorted((name, value.strip()) for name, values in request.args.lists() for value in values if value.strip())
+    # Default date ranges are relative to today, so entries roll over at midnight
+    raw = json.dumps([request.path, args, date.today().isoformat()])
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def cached_response(*scopes):
+    """
+    Cache a GET endpoint's JSON response per filter set
+
+    Entries are tagged with the current versions of the given data scopes and
+    ignored once any of them changes. Responses carry an ETag, so a client
+    sending a matching If-None-Match gets a 304 without the body.
+
+    Args:
+        *scopes (str): Data scopes the response depends on
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            key = _cache_key()
+            try:
+                versions = backend.versions(scopes)
+                entry = backend.get(key)
+            except Exception as e:
+                print(f"Response cache unavailable: {str(e)}")
+                versions, entry = None, None
+
+            if entry and versions is not None and entry['versions'] == versions:
+                response = make_response(entry['body'])
+                response.mimetype = entry['mimetype']
+                response.headers.update(entry.get('headers', {}))
+                response.headers['X-Cache'] = 'HIT'
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code == 200 and versions is not None:
+                    body = response.get_data(as_text=True)
+                    entry = {
+                        'versions': versions,
+                        'etag': hashlib.sha1(body.encode()).hexdigest(),
+                        'body': body,
+                        'mimetype': response.mimetype,
+                        'headers': {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers}
+                    }
+                    try:
+                        backend.set(key, entry, RESPONSE_CACHE_TTL)
+                    except Exception as e:
+                        print(f"Error storing cached response: {str(e)}")
+                response.headers['X-Cache'] = 'MISS'
+
+            if response.status_code == 200:
+                response.set_etag(entry['etag'] if entry else hashlib.sha1(response.get_data()).hexdigest())
+                # Let browsers keep the body but revalidate before reuse
+                response.headers['Cache-Control'] = 'no-cache'
+                response = response.make_conditional(request)
+            return response
+        return decorated_function
+    return decorator
@@ -0,0 +1,117 @@
+import gzip
+from functools import wraps
+from flask import request, make_response
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Responses smaller than this are sent uncompressed
+COMPRESS_MIN_SIZE = 1024
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider that serializes with orjson
+
+    Output matches the default provider: keys are sorted and dates, decimals
+    and UUIDs go through the same default() hook. Values orjson cannot encode
+    (e.g. integers wider than 64 bits) fall back to the standard encoder.
+    """
+
+    options = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME if orjson else 0
+
+    def dumps(self, obj, **kwargs):
+        options = self.options
+        if kwargs.get('indent'):
+            options |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=self.default, option=options).decode()
+        except (TypeError, orjson.JSONEncodeError):
+            return super().dumps(obj, **kwargs)
+
+
+def install_json_provider(app):
+    """Use orjson for jsonify() when it is installed"""
+    if orjson is not None:
+        app.json = OrjsonProvider(app)
+
+
+def wants_columnar():
+    """True when the client asked for format=columnar"""
+    return request.args.get('format') == 'columnar'
+
+
+def columnar_series(dates, columns):
+    """
+    Struct-of-arrays form of a daily series
+
+    Dates are sent once as a base date plus integer day offsets, and every
+    metric as one array, instead of repeating the keys on each row.
+
+    Args:
+        dates (list): Row dates
+        columns (dict): Metric name -> list of values, aligned with dates
+
+    Returns:
+        dict: {'base_date': 'YYYY-MM-DD' or None, 'day_offsets': [...], **columns}
+    """
+    if not dates:
+        return {'base_date': None, 'day_offsets': [], **columns}
+    base = min(dates)
+    base_ordinal = base.toordinal()
+    return {
+        'base_date': base.isoformat(),
+        'day_offsets': [day.toordinal() - base_ordinal for day in dates],
+        **columns
+    }
+
+
+def _encode(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+def compressed(f):
+    """
+    Compress an endpoint's response with brotli or gzip when the client accepts it
+
+    Brotli is used when the brotli package is installed and preferred by
+    Accept-Encoding. ETags are weakened, since the compressed bytes differ
+    from the identity representation.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        response = make_response(f(*args, **kwargs))
+        if response.status_code != 200 or response.direct_passthrough or 'Content-Encoding' in response.headers:
+            return response
+
+        response.vary.add('Accept-Encoding')
+        accepted = request.accept_encodings
+        candidates = (['br'] if brotli is not None else []) + ['gzip']
+        encoding = max(candidates, key=lambda name: accepted[name]) if accepted else None
+        if not encoding or not accepted[encoding]:
+            return response
+
+        body = response.get_data()
+        if len(body) < COMPRESS_MIN_SIZE:
+            return response
+
+        response.set_data(_encode(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+    return decorated_function
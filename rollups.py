@@ -0,0 +1,134 @@
+from sqlalchemy import func, case, and_, select, insert, delete, distinct
+from models import (
+    db, Agent, DailyPerformance,
+    AgentDailyRollup, ManagerDailyRollup, DivisionDailyRollup, DailyRollup
+)
+from aggregations import ppl_expression
+from metrics import TARGET_PPL, BREAK_EVEN_PPL
+
+# Each rollup table with the columns it is grouped by (besides date)
+ROLLUP_SCOPES = [
+    (AgentDailyRollup, [DailyPerformance.agent_id]),
+    (ManagerDailyRollup, [Agent.manager]),
+    (DivisionDailyRollup, [Agent.division]),
+    (DailyRollup, [])
+]
+
+METRIC_COLUMNS = [
+    'row_count', 'leads_sum', 'close_rate_sum', 'place_rate_sum', 'avg_premium_sum',
+    'ppl_sum', 'total_premium_sum', 'above_target', 'at_break_even', 'below_break_even'
+]
+
+# Number of dates refreshed per DELETE/INSERT statement
+REFRESH_BATCH_SIZE = 500
+
+
+def _metric_expressions():
+    """Aggregate expressions over daily_performance, in METRIC_COLUMNS order"""
+    # Rows not yet backfilled fall back to the calculation instead of a NULL sum
+    ppl = func.coalesce(DailyPerformance.placed_premium_per_lead, ppl_expression())
+    total_premium = func.coalesce(DailyPerformance.total_daily_premium, DailyPerformance.leads_taken * ppl_expression())
+    return [
+        func.count(DailyPerformance.id),
+        func.sum(DailyPerformance.leads_taken),
+        func.sum(DailyPerformance.close_rate),
+        func.sum(DailyPerformance.place_rate),
+        func.sum(DailyPerformance.avg_premium),
+        func.sum(ppl),
+        func.sum(total_premium),
+        func.sum(case((ppl >= TARGET_PPL, 1), else_=0)),
+        func.sum(case((and_(ppl >= BREAK_EVEN_PPL, ppl < TARGET_PPL), 1), else_=0)),
+        func.sum(case((ppl < BREAK_EVEN_PPL, 1), else_=0))
+    ]
+
+
+def _populate(model, keys, date_filter=None):
+    """INSERT ... SELECT the grouped metrics for one rollup table"""
+    query = select(*keys, DailyPerformance.date, *_metric_expressions()).select_from(
+        DailyPerformance.__table__.join(Agent.__table__, DailyPerformance.agent_id == Agent.id)
+    )
+    if date_filter is not None:
+        query = query.where(date_filter)
+    query = query.group_by(*keys, DailyPerformance.date)
+
+    target_columns = [key.key for key in keys] + ['date'] + METRIC_COLUMNS
+    db.session.execute(insert(model).from_select(target_columns, query))
+
+
+def refresh_rollups(dates):
+    """
+    Recompute every rollup table for the given dates
+
+    Called by the write paths inside their own transaction (before commit), so
+    the rollups always match daily_performance once the write is committed.
+
+    Args:
+        dates (iterable): Dates whose performance rows were inserted, updated or deleted
+    """
+    dates = sorted(set(dates))
+    for i in range(0, len(dates), REFRESH_BATCH_SIZE):
+        batch = dates[i:i + REFRESH_BATCH_SIZE]
+        for model, keys in ROLLUP_SCOPES:
+            db.session.execute(delete(model).where(model.date.in_(batch)))
+            _populate(model, keys, DailyPerformance.date.in_(batch))
+
+
+def refresh_agent_rollups(agent_ids):
+    """Recompute the rollups for every date an agent has data (e.g. after a manager or division change)"""
+    if not agent_ids:
+        return
+    dates = db.session.query(distinct(DailyPerformance.date)).filter(
+        DailyPerformance.agent_id.in_(list(agent_ids))
+    ).all()
+    refresh_rollups(row[0] for row in dates)
+
+
+def clear_rollups():
+    """Delete all rollup rows (used when performance data is reset)"""
+    for model, _ in ROLLUP_SCOPES:
+        db.session.execute(delete(model))
+
+
+def rebuild_rollups():
+    """
+    Rebuild all rollup tables from daily_performance (for backfills)
+
+    Returns:
+        int: Number of performance rows covered by the rebuilt rollups
+    """
+    clear_rollups()
+    for model, keys in ROLLUP_SCOPES:
+        _populate(model, keys)
+    db.session.commit()
+    return db.session.query(func.coalesce(func.sum(DailyRollup.row_count), 0)).scalar()
+
+
+def _totals(model, *filters):
+    """Sum every metric column of a rollup table over the rows matching filters"""
+    row = db.session.query(
+        *[func.coalesce(func.sum(getattr(model, column)), 0).label(column) for column in METRIC_COLUMNS]
+    ).filter(*filters).one()
+    return dict(row._mapping)
+
+
+def summarize_days(start_date, end_date):
+    """
+    Totals for all agents over a date range, read from the per-day rollup
+
+    Returns:
+        dict: Summed metrics (see METRIC_COLUMNS) plus 'total_agents'
+    """
+    totals = _totals(DailyRollup, DailyRollup.date.between(start_date, end_date))
+    totals['total_agents'] = db.session.query(
+        func.count(distinct(AgentDailyRollup.agent_id))
+    ).filter(AgentDailyRollup.date.between(start_date, end_date)).scalar()
+    return totals
+
+
+def summarize_agent(agent_id, start_date, end_date):
+    """Totals for one agent over a date range, read from the per-agent rollup"""
+    return _totals(
+        AgentDailyRollup,
+        AgentDailyRollup.agent_id == agent_id,
+        AgentDailyRollup.date.between(start_date, end_date)
+    )
@@ -0,0 +1,103 @@
+import time
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from models import db, Agent, DailyPerformance, ChangeSequence
+
+# Advanced by every transaction that writes daily_performance or agent rows,
+# so it also orders the change feed across both tables
+PERFORMANCE_SEQUENCE = 'performance'
+
+# Set to the current time (in ms) whenever performance rows are deleted in bulk
+PERFORMANCE_RESET = 'performance_reset'
+
+# Tables whose rows carry the PERFORMANCE_SEQUENCE value of the transaction that last wrote them
+STAMPED_MODELS = (Agent, DailyPerformance)
+
+# Session.info flag: the transaction wrote rows that are waiting for their change_seq
+PENDING_KEY = 'change_seq_pending'
+
+
+def next_value(name=PERFORMANCE_SEQUENCE):
+    """
+    Advance a change sequence inside the current transaction
+
+    The counter row stays locked until the transaction ends, so concurrent
+    writers commit their values in increasing order: once a reader has seen
+    value N, every row stamped with a value <= N is already visible. Call it
+    as late as possible; row writes use mark_pending instead.
+
+    Returns:
+        int: The new value
+    """
+    table = ChangeSequence.__table__
+    stmt = table.update().where(table.c.name == name).values(value=table.c.value + 1).returning(table.c.value)
+    row = db.session.execute(stmt).first()
+    if row is None:
+        # First use of this sequence
+        try:
+            with db.session.begin_nested():
+                db.session.execute(table.insert().values(name=name, value=0))
+        except IntegrityError:
+            pass  # Created concurrently
+        row = db.session.execute(stmt).one()
+    return row.value
+
+
+def mark_reset():
+    """Record that performance rows were deleted outside the normal write paths"""
+    table = ChangeSequence.__table__
+    value = int(time.time() * 1000)
+    updated = db.session.execute(table.update().where(table.c.name == PERFORMANCE_RESET).values(value=value))
+    if not updated.rowcount:
+        db.session.execute(table.insert().values(name=PERFORMANCE_RESET, value=value))
+
+
+def mark_pending():
+    """
+    Record that the current transaction wrote agent or performance rows with change_seq NULL
+
+    They are stamped with the next sequence value just before the transaction
+    commits (see _stamp_pending), so the counter row is locked only for the
+    stamping UPDATEs and the commit, not for the whole transaction.
+    """
+    db.session.info[PENDING_KEY] = True
+
+
+@event.listens_for(db.session, 'before_flush')
+def _mark_changed_rows(session, flush_context, instances):
+    """Leave change_seq NULL on new and modified agents and performance rows until commit"""
+    changed = [obj for obj in session.new if isinstance(obj, STAMPED_MODELS)]
+    changed += [obj for obj in session.dirty if isinstance(obj, STAMPED_MODELS) and session.is_modified(obj)]
+    for obj in changed:
+        obj.change_seq = None
+    if changed:
+        session.info[PENDING_KEY] = True
+
+
+@event.listens_for(db.session, 'before_commit')
+def _stamp_pending(session):
+    """Give every row the transaction wrote the next change sequence value"""
+    if session.in_nested_transaction():
+        return  # A savepoint is being released; the outer transaction stamps
+    session.flush()
+    if not session.info.pop(PENDING_KEY, False):
+        return
+    change_seq = next_value()
+    for model in STAMPED_MODELS:
+        table = model.__table__
+        values = {'change_seq': change_seq}
+        if 'last_updated' in table.c:
+            # Stamping is not an edit
+            values['last_updated'] = table.c.last_updated
+        session.execute(table.update().where(table.c.change_seq.is_(None)).values(**values))
+
+
+@event.listens_for(db.session, 'after_transaction_end')
+def _clear_pending(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(PENDING_KEY, None)
+
+
+def current_values():
+    """All change sequence values with a single query"""
+    return {row.name: row.value for row in db.session.query(ChangeSequence.name, ChangeSequence.value)}
@@ -0,0 +1,77 @@
+import os
+import sqlite3
+import importlib
+from datetime import date, timedelta
+
+import pytest
+
+# Tables as the original schema created them: no change_seq columns, no indexes,
+# and calculated fields left NULL by the sample data script
+BASELINE_SCHEMA = """
+CREATE TABLE agent (
+    id INTEGER NOT NULL PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    division VARCHAR(100) NOT NULL,
+    manager VARCHAR(100) NOT NULL,
+    queue_type VARCHAR(50) NOT NULL,
+    is_active BOOLEAN,
+    created_at DATETIME,
+    last_updated DATETIME
+);
+CREATE TABLE daily_performance (
+    id INTEGER NOT NULL PRIMARY KEY,
+    date DATE NOT NULL,
+    agent_id INTEGER NOT NULL REFERENCES agent (id),
+    leads_taken FLOAT NOT NULL,
+    close_rate FLOAT NOT NULL,
+    avg_premium FLOAT NOT NULL,
+    place_rate FLOAT NOT NULL,
+    placed_premium_per_lead FLOAT,
+    total_daily_premium FLOAT,
+    sales_made INTEGER,
+    talk_time_minutes INTEGER,
+    notes TEXT
+);
+"""
+
+AGENTS = 3
+DAYS = 5
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    """
+    The app module on a database created by the original schema, after init_db
+
+    app binds its database when first imported, so every test that needs the
+    app shares this one.
+    """
+    path = tmp_path_factory.mktemp('db') / 'baseline.db'
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    today = date.today()
+    for agent_id in range(1, AGENTS + 1):
+        conn.execute(
+            "INSERT INTO agent (id, name, division, manager, queue_type, is_active, created_at, last_updated) "
+            "VALUES (?, ?, 'Austin Call Center', 'Mario Herrera', 'Performance', 1, '2024-01-01', '2024-01-01')",
+            (agent_id, f'Agent {agent_id}')
+        )
+        for offset in range(DAYS):
+            # The first day is stored twice, as the pre-upsert import could
+            copies = 2 if offset == 0 else 1
+            for _ in range(copies):
+                conn.execute(
+                    "INSERT INTO daily_performance (date, agent_id, leads_taken, close_rate, avg_premium, place_rate) "
+                    "VALUES (?, ?, 8, 20, 1200, 60)",
+                    ((today - timedelta(days=offset)).isoformat(), agent_id)
+                )
+    conn.commit()
+    conn.close()
+
+    os.environ['RENDER'] = '1'
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    app_module = importlib.import_module('app')
+    app_module.init_db()
+    # A second start finds nothing left to migrate
+    app_module.init_db()
+    return app_module
@@ -0,0 +1,31 @@
+from datetime import datetime
+
+MANAGER = 'Listing Manager'
+
+
+def test_deactivated_agent_invalidates_filtered_listing(app_module):
+    with app_module.app.app_context():
+        db = app_module.db
+        # Older than the toggle below, so the change is visible at HTTP-date (1 second) resolution
+        agents = [
+            app_module.Agent(name=name, division='AUS', manager=MANAGER, queue_type='performance',
+                             is_active=True, last_updated=datetime(2024, 1, 1))
+            for name in ('Listing One', 'Listing Two')
+        ]
+        db.session.add_all(agents)
+        db.session.commit()
+        agent_id = agents[0].id
+
+    client = app_module.app.test_client()
+    url = f'/api/agents?manager={MANAGER}&active_only=true'
+    first = client.get(url)
+    assert first.status_code == 200
+    assert len(first.get_json()) == 2
+    assert client.get(url, headers={'If-Modified-Since': first.headers['Last-Modified']}).status_code == 304
+
+    # The agent left the active-only listing; the one still in it did not change
+    assert client.post(f'/api/agents/{agent_id}/toggle_active').status_code == 200
+
+    second = client.get(url, headers={'If-Modified-Since': first.headers['Last-Modified']})
+    assert second.status_code == 200
+    assert [agent['name'] for agent in second.get_json()] == ['Listing Two']
@@ -0,0 +1,109 @@
+from datetime import date
+
+import pytest
+from flask import Flask
+
+from models import db, Agent, DailyPerformance
+from ingest import bulk_upsert_performance, with_derived_fields, ingest_performance_batch
+from importer import run_import
+from sequences import current_values, PERFORMANCE_SEQUENCE
+
+IMPORT_OPTIONS = {
+    'auto_create_agents': True,
+    'agent_division': 'AUS',
+    'agent_manager': 'Mario Herrera',
+    'agent_queue': 'performance',
+    'update_existing_info': False
+}
+
+
+@pytest.fixture
+def session(tmp_path):
+    # A bare app on its own database, so these writes do not touch the upgrade tests' data
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{tmp_path / "import.db"}'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield db.session
+        db.session.remove()
+
+
+def make_agent(session):
+    agent = Agent(name='Alice Smith', division='AUS', manager='Mario Herrera', queue_type='performance')
+    session.add(agent)
+    session.flush()
+    return agent
+
+
+def test_rejected_row_does_not_fail_its_chunk(session):
+    agent = make_agent(session)
+    records = [
+        with_derived_fields({'agent_id': agent.id, 'date': date(2024, 1, day), 'leads_taken': 8.0,
+                             'close_rate': 20.0, 'place_rate': 60.0, 'avg_premium': 1200.0})
+        for day in range(1, 8)
+    ]
+    records[3]['leads_taken'] = None
+
+    failures = bulk_upsert_performance(records, chunk_size=4)
+    session.commit()
+
+    assert [position for position, _ in failures] == [3]
+    assert 'INSERT' not in failures[0][1]
+    assert session.query(DailyPerformance).count() == 6
+
+
+def test_import_reports_unusable_talk_time_per_row(session, tmp_path):
+    path = tmp_path / 'export.csv'
+    path.write_text(
+        'date,agent_name,leads_taken,close_rate,place_rate,avg_premium,talk_time_minutes\n'
+        '2024-02-01,Alice Smith,8,20,60,1200,30\n'
+        '2024-02-02,Alice Smith,8,20,60,1200,inf\n'
+        '2024-02-03,Alice Smith,8,20,60,1200,1e400\n'
+        '2024-02-04,Alice Smith,8,20,60,1200,\n'
+        '2024-02-05,Alice Smith,8,20,60,1200,99999999999\n'
+    )
+
+    result = run_import(str(path), IMPORT_OPTIONS)
+
+    assert result['errors'] == [f'Row {row}: Invalid talk_time_minutes value' for row in (2, 3, 5)]
+    stored = {row.date.day: row.talk_time_minutes for row in session.query(DailyPerformance)}
+    assert stored == {1: 30, 4: None}
+
+
+def test_batch_rejects_non_finite_values_per_record(session):
+    agent = make_agent(session)
+    items = [
+        {'date': f'2024-03-0{day}', 'agent_id': agent.id, 'leads_taken': 8,
+         'close_rate': 20, 'place_rate': 60, 'avg_premium': 1200}
+        for day in range(1, 4)
+    ]
+    items[1]['leads_taken'] = float('nan')
+    items[2]['talk_time_minutes'] = float('inf')
+
+    results, dates = ingest_performance_batch(items)
+    session.commit()
+
+    assert [result['status'] for result in results] == ['created', 'error', 'error']
+    assert results[1]['error'] == 'Invalid value: leads_taken must be a finite number'
+    assert results[2]['error'].startswith('Invalid value:')
+    assert dates == {date(2024, 3, 1)}
+    assert session.query(DailyPerformance).count() == 1
+
+
+def test_change_seq_is_claimed_at_commit(session):
+    agent = make_agent(session)
+    records = [
+        with_derived_fields({'agent_id': agent.id, 'date': date(2024, 4, day), 'leads_taken': 8.0,
+                             'close_rate': 20.0, 'place_rate': 60.0, 'avg_premium': 1200.0})
+        for day in range(1, 4)
+    ]
+
+    bulk_upsert_performance(records)
+    # Nothing has touched (and locked) the counter yet
+    assert PERFORMANCE_SEQUENCE not in current_values()
+    session.commit()
+
+    change_seq = current_values()[PERFORMANCE_SEQUENCE]
+    assert {row.change_seq for row in session.query(DailyPerformance)} == {change_seq}
+    assert session.get(Agent, agent.id).change_seq == change_seq
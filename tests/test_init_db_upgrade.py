@@ -0,0 +1,27 @@
+import pytest
+
+from conftest import AGENTS, DAYS
+
+
+def test_upgrade_removes_duplicates_and_creates_indexes(app_module):
+    with app_module.app.app_context():
+        db = app_module.db
+        assert db.session.query(app_module.DailyPerformance).count() == AGENTS * DAYS
+        indexes = {index['name'] for index in db.inspect(db.engine).get_indexes('daily_performance')}
+        assert {index.name for index in app_module.DailyPerformance.__table__.indexes} <= indexes
+
+
+def test_upgrade_backfills_calculated_fields(app_module):
+    with app_module.app.app_context():
+        rows = app_module.db.session.query(app_module.DailyPerformance).all()
+        assert all(row.placed_premium_per_lead == pytest.approx(144.0) for row in rows)
+        assert all(row.total_daily_premium == pytest.approx(8 * 144.0) for row in rows)
+        assert all(row.change_seq is not None for row in rows)
+
+
+def test_upgrade_builds_rollups(app_module):
+    with app_module.app.app_context():
+        db = app_module.db
+        from models import AgentDailyRollup, DailyRollup
+        assert db.session.query(db.func.sum(AgentDailyRollup.row_count)).scalar() == AGENTS * DAYS
+        assert db.session.query(db.func.sum(DailyRollup.ppl_sum)).scalar() == pytest.approx(AGENTS * DAYS * 144.0)
@@ -0,0 +1,144 @@
+from datetime import timedelta
+import numpy as np
+from models import db, Agent, AgentDailyRollup, ManagerDailyRollup, DivisionDailyRollup, DailyRollup
+
+# Rollup table and grouping column for each group_by value
+GROUP_SCOPES = {
+    'none': (DailyRollup, None),
+    'agent': (AgentDailyRollup, AgentDailyRollup.agent_id),
+    'manager': (ManagerDailyRollup, ManagerDailyRollup.manager),
+    'division': (DivisionDailyRollup, DivisionDailyRollup.division)
+}
+
+DEFAULT_WINDOWS = [7]
+
+# Longest rolling window, in days
+MAX_WINDOW = 365
+
+# Rolling metrics: name -> the rollup sum it averages over row_count
+ROLLING_METRICS = {
+    'ppl': 'ppl_sum',
+    'close_rate': 'close_rate_sum',
+    'place_rate': 'place_rate_sum'
+}
+
+
+class TrendError(ValueError):
+    """Raised for an unknown group_by or an invalid window"""
+
+
+def parse_windows(value):
+    """
+    Read a window parameter such as "7" or "7,14,30"
+
+    Returns:
+        list: Distinct window lengths in days, in ascending order
+
+    Raises:
+        TrendError: If a window is not an integer between 1 and MAX_WINDOW
+    """
+    if not value:
+        return DEFAULT_WINDOWS
+    try:
+        windows = sorted({int(part) for part in value.split(',') if part.strip()})
+    except ValueError:
+        raise TrendError('window must be a comma-separated list of integers')
+    if not windows or windows[0] < 1 or windows[-1] > MAX_WINDOW:
+        raise TrendError(f'window must be between 1 and {MAX_WINDOW} days')
+    return windows
+
+
+def rolling_trend(group_by, windows, start_date, end_date, agent_ids=None, label=None):
+    """
+    Rolling averages of PPL, close rate and place rate for every day in a range
+
+    Reads the daily rollup for the grouping once, covering the range plus the
+    longest window's lead-in. Each group's daily sums are laid out on a dense
+    day grid and every window is a difference of cumulative sums, so any
+    number of windows costs one query and a few array operations. Averages
+    are weighted by record count, like the dashboard's average PPL; days whose
+    window has no records are None.
+
+    Args:
+        group_by (str): 'none', 'agent', 'manager' or 'division'
+        windows (list): Window lengths in days
+        start_date (date): First day reported (inclusive)
+        end_date (date): Last day reported (inclusive)
+        agent_ids (list, optional): Only these agents (group_by='agent')
+        label (callable, optional): Maps a group key to its display label; groups
+            with the same label are combined (e.g. division codes)
+
+    Returns:
+        dict: {
+            'dates': ['YYYY-MM-DD', ...],
+            'series': [{'key', 'label', 'rolling': {window: {metric: [...]}}}, ...]
+        }
+    """
+    if group_by not in GROUP_SCOPES:
+        raise TrendError(f'group_by must be one of: {", ".join(GROUP_SCOPES)}')
+    model, key = GROUP_SCOPES[group_by]
+
+    first = start_date - timedelta(days=max(windows) - 1)
+    lead_in = (start_date - first).days
+    days = (end_date - first).days + 1
+    dates = [(start_date + timedelta(days=offset)).isoformat() for offset in range(days - lead_in)]
+
+    sums = [model.row_count] + [getattr(model, column) for column in ROLLING_METRICS.values()]
+    query = db.session.query(*([key] if key is not None else []), model.date, *sums).filter(
+        model.date.between(first, end_date)
+    )
+    if group_by == 'agent':
+        query = query.join(Agent, Agent.id == key).add_columns(Agent.name)
+        if agent_ids:
+            query = query.filter(key.in_(agent_ids))
+    if key is not None:
+        query = query.order_by(key)
+    rows = query.all()
+
+    if key is None:
+        keys, labels = [None], [None]
+        group_index = np.zeros(len(rows), dtype=np.int64)
+    else:
+        if group_by == 'agent':
+            names = {row[0]: row.name for row in rows}
+            label = label or names.get
+        label = label or (lambda value: value)
+        # Combine groups that share a display label; keep the first key seen for each
+        labels, keys, group_index = [], [], np.empty(len(rows), dtype=np.int64)
+        positions = {}
+        for index, row in enumerate(rows):
+            group_label = label(row[0])
+            if group_label not in positions:
+                positions[group_label] = len(labels)
+                labels.append(group_label)
+                keys.append(row[0])
+            group_index[index] = positions[group_label]
+
+    offset_column = 0 if key is None else 1
+    offsets = np.array([(row[offset_column] - first).days for row in rows], dtype=np.int64)
+
+    # grid[m, g, d]: sum m (row_count, then each metric) for group g on day d
+    grid = np.zeros((len(sums), len(labels), days))
+    for m in range(len(sums)):
+        values = np.array([row[offset_column + 1 + m] or 0 for row in rows], dtype=np.float64)
+        np.add.at(grid[m], (group_index, offsets), values)
+
+    cumulative = np.concatenate([np.zeros(grid.shape[:2] + (1,)), grid.cumsum(axis=2)], axis=2)
+    reported = np.arange(lead_in, days) + 1
+
+    series = [{'key': group_key, 'label': group_label, 'rolling': {}} for group_key, group_label in zip(keys, labels)]
+    for window in windows:
+        window_sums = cumulative[:, :, reported] - cumulative[:, :, np.maximum(reported - window, 0)]
+        counts = window_sums[0]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            averages = {
+                metric: np.where(counts > 0, window_sums[m + 1] / counts, np.nan)
+                for m, metric in enumerate(ROLLING_METRICS)
+            }
+        for g, entry in enumerate(series):
+            entry['rolling'][str(window)] = {
+                metric: [None if np.isnan(value) else value for value in values[g].tolist()]
+                for metric, values in averages.items()
+            }
+
+    return {'dates': dates, 'series': series}